@@ -13,4 +13,131 @@ if not BOT_TOKEN:
     raise RuntimeError("BOT_TOKEN is not set")
 
 if not TRAVELPAYOUTS_TOKEN:
-    raise RuntimeError("TRAVELPAYOUTS_TOKEN is not set")
\ No newline at end of file
+    raise RuntimeError("TRAVELPAYOUTS_TOKEN is not set")
+
+# Планировщик: базовый интервал цикла и границы адаптивного интервала
+# проверки маршрута (секунды)
+CHECK_INTERVAL_SECONDS = int(os.getenv("CHECK_INTERVAL_SECONDS", "600"))
+ROUTE_CHECK_INTERVAL_MIN = int(os.getenv("ROUTE_CHECK_INTERVAL_MIN", "600"))
+ROUTE_CHECK_INTERVAL_MAX = int(os.getenv("ROUTE_CHECK_INTERVAL_MAX", "21600"))
+# Бюджет запросов к Travelpayouts в час — общий для равномерного режима и квоты
+API_CALLS_PER_HOUR = int(os.getenv("API_CALLS_PER_HOUR", "3600"))
+# Равномерный режим: проверки подписок распределяются по всему циклу,
+# цикл растягивается, если запросов больше, чем позволяет бюджет API в час
+SCHEDULER_PACING = os.getenv("SCHEDULER_PACING", "0").lower() in ("1", "true", "yes")
+# Учёт квоты: запросы к API считаются, и планировщик укладывается в
+# API_CALLS_PER_HOUR вместе с поисками пользователей, растягивая цикл (не более
+# чем в API_QUOTA_MAX_STRETCH раз) и сужая окна дат подписок; доля бюджета
+# оставлена поискам пользователей
+API_QUOTA_ENABLED = os.getenv("API_QUOTA_ENABLED", "0").lower() in ("1", "true", "yes")
+# Как часто процесс сбрасывает свои запросы в общий учёт квоты в БД (секунды)
+API_QUOTA_SYNC_SECONDS = float(os.getenv("API_QUOTA_SYNC_SECONDS", "10"))
+API_QUOTA_INTERACTIVE_SHARE = float(os.getenv("API_QUOTA_INTERACTIVE_SHARE", "0.2"))
+API_QUOTA_MAX_STRETCH = float(os.getenv("API_QUOTA_MAX_STRETCH", "3"))
+# Сколько ждать завершения текущей проверки подписки при остановке бота (секунды)
+SHUTDOWN_TIMEOUT_SECONDS = float(os.getenv("SHUTDOWN_TIMEOUT_SECONDS", "60"))
+# Режим дайджеста: уведомления пользователя копятся не дольше N секунд
+# (и отправляются не позже конца цикла проверки)
+DIGEST_WINDOW_SECONDS = float(os.getenv("DIGEST_WINDOW_SECONDS", "300"))
+# Режим main.py: all — бот и планировщик в одном процессе, bot — только бот
+# (планировщик запускается отдельно: python scheduler_main.py, уведомления
+# передаются через очередь notification_outbox в БД)
+RUN_MODE = os.getenv("RUN_MODE", "all").lower()
+# Очередь уведомлений: период проверки ботом (секунды) и число попыток отправки
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "2"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+
+# Адрес Travelpayouts API (для нагрузочных тестов — локальный фейковый сервер)
+TRAVELPAYOUTS_API_URL = os.getenv(
+    "TRAVELPAYOUTS_API_URL", "https://api.travelpayouts.com/aviasales/v3/prices_for_dates"
+)
+
+# Запись/воспроизведение трафика Travelpayouts для офлайн-бенчмарков:
+# API_CASSETTE_MODE = record | replay (пусто — выключено),
+# API_CASSETTE_LATENCY = recorded (с записанной задержкой) | zero
+API_CASSETTE_MODE = os.getenv("API_CASSETTE_MODE", "").lower()
+API_CASSETTE_PATH = os.getenv("API_CASSETTE_PATH", "cassettes/travelpayouts.jsonl.gz")
+API_CASSETTE_LATENCY = os.getenv("API_CASSETTE_LATENCY", "recorded").lower()
+
+# Сторож event loop: при задержке больше N мс в лог пишется стек блокирующего
+# кода (0 — выключен), не чаще раза в LOOP_WATCHDOG_REPORT_SECONDS секунд
+LOOP_WATCHDOG_MS = float(os.getenv("LOOP_WATCHDOG_MS", "0"))
+LOOP_WATCHDOG_REPORT_SECONDS = float(os.getenv("LOOP_WATCHDOG_REPORT_SECONDS", "60"))
+
+# Travelpayouts API: таймаут запроса, повторы с экспоненциальной задержкой
+# и circuit breaker (секунды / количество)
+API_TIMEOUT_SECONDS = float(os.getenv("API_TIMEOUT_SECONDS", "10"))
+API_MAX_RETRIES = int(os.getenv("API_MAX_RETRIES", "3"))
+API_BACKOFF_BASE = float(os.getenv("API_BACKOFF_BASE", "0.5"))
+API_BACKOFF_MAX = float(os.getenv("API_BACKOFF_MAX", "8"))
+API_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("API_CIRCUIT_FAILURE_THRESHOLD", "5"))
+API_CIRCUIT_RESET_SECONDS = float(os.getenv("API_CIRCUIT_RESET_SECONDS", "120"))
+
+# Снимок цены в меню редактирования подписки считается устаревшим через N секунд
+PRICE_SNAPSHOT_MAX_AGE = int(os.getenv("PRICE_SNAPSHOT_MAX_AGE", "3600"))
+
+# Сколько подписок показывать на одной странице списка
+SUBS_PAGE_SIZE = int(os.getenv("SUBS_PAGE_SIZE", "5"))
+
+# Сессии результатов поиска (листание/сортировка без повторных запросов к API)
+SEARCH_SESSION_TTL = int(os.getenv("SEARCH_SESSION_TTL", "1800"))
+SEARCH_SESSION_MAX_USERS = int(os.getenv("SEARCH_SESSION_MAX_USERS", "1000"))
+SEARCH_SESSION_MAX_OFFERS = int(os.getenv("SEARCH_SESSION_MAX_OFFERS", "150"))
+SEARCH_RESULTS_PAGE_SIZE = int(os.getenv("SEARCH_RESULTS_PAGE_SIZE", "3"))
+# Повторное нажатие с теми же параметрами в течение N секунд не запускает второй поиск
+SEARCH_DEBOUNCE_SECONDS = float(os.getenv("SEARCH_DEBOUNCE_SECONDS", "5"))
+
+# Кэш ответов Travelpayouts в памяти (общий для поиска, «куда угодно» и планировщика)
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "300"))
+RESPONSE_CACHE_MAX = int(os.getenv("RESPONSE_CACHE_MAX", "20000"))
+# Копия кэша на диске для «тёплого» рестарта (пустой путь — отключить)
+# и период фоновой записи на диск (секунды)
+RESPONSE_CACHE_DB = os.getenv("RESPONSE_CACHE_DB", "response_cache.db")
+RESPONSE_CACHE_FLUSH_SECONDS = float(os.getenv("RESPONSE_CACHE_FLUSH_SECONDS", "30"))
+# Таблица минимальных цен по маршруту и дню из всех ответов API: файл SQLite
+# (пустой путь — только в памяти) и сколько часов цена считается актуальной
+PRICE_TABLE_DB = os.getenv("PRICE_TABLE_DB", "route_prices.db")
+PRICE_TABLE_MAX_AGE_HOURS = float(os.getenv("PRICE_TABLE_MAX_AGE_HOURS", "24"))
+# Сколько маршрутов держать в памяти (давно не обновлявшиеся вытесняются первыми)
+PRICE_TABLE_MAX_ROUTES = int(os.getenv("PRICE_TABLE_MAX_ROUTES", "5000"))
+# История наблюдений цен в той же БД (дни) и аналитика по ней для подсказок
+# целевой цены (нужен numpy): окно наблюдений (дни), период пересчёта (секунды),
+# минимум разных дат вылета с наблюдениями по маршруту
+PRICE_HISTORY_DAYS = float(os.getenv("PRICE_HISTORY_DAYS", "90"))
+ANALYTICS_WINDOW_DAYS = float(os.getenv("ANALYTICS_WINDOW_DAYS", "30"))
+ANALYTICS_REFRESH_SECONDS = float(os.getenv("ANALYTICS_REFRESH_SECONDS", "3600"))
+ANALYTICS_MIN_DAYS = int(os.getenv("ANALYTICS_MIN_DAYS", "10"))
+
+# Поиск «куда угодно»: направления-кандидаты и число одновременных запросов
+ANYWHERE_DESTINATIONS = [
+    code.strip().upper()
+    for code in os.getenv(
+        "ANYWHERE_DESTINATIONS",
+        "LED,AER,KZN,SVX,OVB,KRR,MRV,KGD,IST,AYT,DXB,SHJ,AUH,DOH,TBS,EVN,BAK,TAS,SKD,ALA,"
+        "FRU,DYU,MSQ,CAI,HRG,SSH,BKK,HKT,SGN,CXR,DPS,MLE,BJS,SHA,GOI,BEG,TIV,LCA,HAV,MOW",
+    ).split(",")
+    if code.strip()
+]
+ANYWHERE_CONCURRENCY = int(os.getenv("ANYWHERE_CONCURRENCY", "5"))
+
+# Окно дат подписки по умолчанию (± дней) и планировщик запросов:
+# месячный запрос вместо подневных, только если окно покрывает не меньше
+# этой доли оставшихся дней месяца (он отдаёт лучшие цены всего месяца)
+DEFAULT_FLEX_DAYS = int(os.getenv("DEFAULT_FLEX_DAYS", "7"))
+MONTH_QUERY_MIN_COVERAGE = float(os.getenv("MONTH_QUERY_MIN_COVERAGE", "0.9"))
+MONTH_QUERY_LIMIT = int(os.getenv("MONTH_QUERY_LIMIT", "200"))
+# Если месячный ответ обрезан лимитом, дни окна без вариантов добираются
+# подневными запросами — не больше стольких на месяц (входит в оценку запросов)
+MONTH_REFETCH_MAX_DAYS = int(os.getenv("MONTH_REFETCH_MAX_DAYS", "3"))
+# Окно дат поиска пользователя (± дней) — отдельно от окна подписок:
+# туда-обратно стоит вдвое больше запросов, поэтому окно меньше
+SEARCH_FLEX_DAYS_ROUND_TRIP = int(os.getenv("SEARCH_FLEX_DAYS_ROUND_TRIP", "5"))
+SEARCH_FLEX_DAYS_ONE_WAY = int(os.getenv("SEARCH_FLEX_DAYS_ONE_WAY", "7"))
+
+# Логирование: text — как раньше; structured — строки key=value, запись на диск
+# в отдельном потоке и только доля LOG_SAMPLE_RATE частых записей (на каждый
+# запрос к API и каждую подписку). Токены вырезаются из логов в обоих режимах.
+LOG_MODE = os.getenv("LOG_MODE", "text").lower()
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.01"))
+LOG_FILE = os.getenv("LOG_FILE", "")
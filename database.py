@@ -1,7 +1,9 @@
 # database.py
 import sqlite3
 from datetime import datetime
-from typing import Optional, List, Dict
+from typing import Optional, Iterable, Iterator, List, Dict, Tuple
+
+from config import DEFAULT_FLEX_DAYS
 
 DB_NAME = "subscriptions.db"
 
@@ -15,7 +17,7 @@ def init_db() -> None:
     """
     with _conn() as conn:
         cursor = conn.cursor()
-        cursor.execute("""
+        cursor.execute(f"""
             CREATE TABLE IF NOT EXISTS subscriptions (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 user_id INTEGER NOT NULL,
@@ -28,6 +30,12 @@ def init_db() -> None:
                 threshold_is_manual INTEGER DEFAULT 1,     -- 1 = manual, 0 = dynamic (use current)
                 last_notified_price REAL DEFAULT NULL,
                 last_notified_at TIMESTAMP DEFAULT NULL,
+                last_price REAL DEFAULT NULL,              -- снимок последней лучшей цены из планировщика
+                last_price_at TIMESTAMP DEFAULT NULL,
+                last_offer_summary TEXT DEFAULT NULL,
+                flex_days INTEGER DEFAULT {DEFAULT_FLEX_DAYS},  -- окно дат: ± дней от depart_date
+                window_month TEXT DEFAULT NULL,            -- либо «любая дата месяца» YYYY-MM
+                last_checked_at TIMESTAMP DEFAULT NULL,    -- когда планировщик последний раз проверил подписку
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
@@ -47,9 +55,75 @@ def init_db() -> None:
             cursor.execute("ALTER TABLE subscriptions ADD COLUMN last_notified_price REAL DEFAULT NULL")
         if "last_notified_at" not in cols:
             cursor.execute("ALTER TABLE subscriptions ADD COLUMN last_notified_at TIMESTAMP DEFAULT NULL")
+        if "last_price" not in cols:
+            cursor.execute("ALTER TABLE subscriptions ADD COLUMN last_price REAL DEFAULT NULL")
+        if "last_price_at" not in cols:
+            cursor.execute("ALTER TABLE subscriptions ADD COLUMN last_price_at TIMESTAMP DEFAULT NULL")
+        if "last_offer_summary" not in cols:
+            cursor.execute("ALTER TABLE subscriptions ADD COLUMN last_offer_summary TEXT DEFAULT NULL")
+        if "flex_days" not in cols:
+            cursor.execute(f"ALTER TABLE subscriptions ADD COLUMN flex_days INTEGER DEFAULT {DEFAULT_FLEX_DAYS}")
+        if "window_month" not in cols:
+            cursor.execute("ALTER TABLE subscriptions ADD COLUMN window_month TEXT DEFAULT NULL")
+        if "last_checked_at" not in cols:
+            cursor.execute("ALTER TABLE subscriptions ADD COLUMN last_checked_at TIMESTAMP DEFAULT NULL")
+
+        # Настройки пользователя (режим уведомлений)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS user_settings (
+                user_id INTEGER PRIMARY KEY,
+                digest INTEGER DEFAULT 0                   -- 1 = уведомления одним сообщением за цикл
+            )
+        """)
+
+        # Очередь уведомлений: планировщик в отдельном процессе пишет сюда,
+        # процесс бота отправляет и удаляет
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS notification_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                parse_mode TEXT DEFAULT NULL,
+                attempts INTEGER DEFAULT 0,
+                next_attempt_at REAL DEFAULT 0,            -- unix-время следующей попытки отправки
+                last_error TEXT DEFAULT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        # Запросы к API по минутам и источникам (планировщик / поиски пользователей):
+        # общий учёт квоты для бота и планировщика в разных процессах
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS api_usage (
+                minute INTEGER NOT NULL,                   -- unix-время // 60
+                source TEXT NOT NULL,
+                calls INTEGER NOT NULL,
+                PRIMARY KEY (minute, source)
+            )
+        """)
+        # Бот и планировщик могут работать в разных процессах: WAL позволяет
+        # читать базу, пока другой процесс пишет
+        cursor.execute("PRAGMA journal_mode=WAL")
+
+        # Индекс для постраничного (keyset) списка подписок пользователя
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_subscriptions_user_id ON subscriptions (user_id, id)"
+        )
         conn.commit()
 
-def add_subscription(
+# Поля подписки, которые задаёт пользователь (импорт/экспорт, add_subscription)
+SUBSCRIPTION_FIELDS = (
+    "user_id", "origin", "destination",
+    "depart_date", "return_date",
+    "passengers", "threshold", "threshold_is_manual",
+    "flex_days", "window_month",
+)
+
+_INSERT_SUBSCRIPTION_SQL = f"""
+    INSERT INTO subscriptions ({", ".join(SUBSCRIPTION_FIELDS)})
+    VALUES ({", ".join("?" for _ in SUBSCRIPTION_FIELDS)})
+"""
+
+def normalize_subscription(
     user_id: int,
     origin: str,
     destination: str,
@@ -57,8 +131,11 @@ def add_subscription(
     return_date: str | None,
     passengers: int,
     threshold: float | None = None,
-    threshold_is_manual: int = 1
-) -> int:
+    threshold_is_manual: int = 1,
+    flex_days: int = DEFAULT_FLEX_DAYS,
+    window_month: str | None = None
+) -> tuple:
+    """Значения для INSERT в порядке SUBSCRIPTION_FIELDS (ValueError — строку не сохранить)."""
     # --- input sanitization (last defense) ---
     try:
         passengers = int(passengers)
@@ -77,28 +154,87 @@ def add_subscription(
         s = str(return_date).strip()
         return_to_store = None if s in ("0", "00", "", "None") else s.split(" ")[0]
 
+    try:
+        flex_days = max(0, int(flex_days))
+    except Exception:
+        flex_days = DEFAULT_FLEX_DAYS
+    window_month = str(window_month)[:7] if window_month else None
+
+    return (
+        user_id,
+        origin,
+        destination,
+        depart_to_store,
+        return_to_store,
+        passengers,
+        threshold,
+        int(bool(threshold_is_manual)),
+        flex_days,
+        window_month
+    )
+
+def add_subscription(
+    user_id: int,
+    origin: str,
+    destination: str,
+    depart_date: str,
+    return_date: str | None,
+    passengers: int,
+    threshold: float | None = None,
+    threshold_is_manual: int = 1,
+    flex_days: int = DEFAULT_FLEX_DAYS,
+    window_month: str | None = None
+) -> int:
+    values = normalize_subscription(
+        user_id, origin, destination, depart_date, return_date, passengers,
+        threshold, threshold_is_manual, flex_days, window_month
+    )
     with _conn() as conn:
         cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO subscriptions (
-                user_id, origin, destination,
-                depart_date, return_date,
-                passengers, threshold, threshold_is_manual
-            )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            user_id,
-            origin,
-            destination,
-            depart_to_store,
-            return_to_store,
-            passengers,
-            threshold,
-            int(bool(threshold_is_manual))
-        ))
+        cursor.execute(_INSERT_SUBSCRIPTION_SQL, values)
         conn.commit()
         return cursor.lastrowid
 
+def add_subscriptions_bulk(rows: Iterable[tuple], batch_size: int = 5000) -> int:
+    """
+    Массовая вставка уже нормализованных строк (normalize_subscription):
+    executemany пачками по batch_size, одна транзакция на пачку.
+    Возвращает число вставленных подписок.
+    """
+    inserted = 0
+    with _conn() as conn:
+        cursor = conn.cursor()
+        for batch in _batches(rows, batch_size):
+            cursor.executemany(_INSERT_SUBSCRIPTION_SQL, batch)
+            conn.commit()
+            inserted += len(batch)
+    return inserted
+
+def _batches(rows: Iterable[tuple], size: int) -> Iterator[List[tuple]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def iter_subscriptions(fetch_size: int = 1000) -> Iterator[Dict]:
+    """Все подписки (поля SUBSCRIPTION_FIELDS) потоком: в памяти не больше fetch_size строк."""
+    conn = _conn()
+    try:
+        conn.row_factory = sqlite3.Row
+        cursor = conn.execute(f"SELECT {', '.join(SUBSCRIPTION_FIELDS)} FROM subscriptions ORDER BY id")
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(row)
+    finally:
+        conn.close()
+
 def update_subscription_threshold(sub_id: int, threshold: float, threshold_is_manual: Optional[int] = None) -> None:
     threshold = int(threshold)
     with _conn() as conn:
@@ -112,6 +248,15 @@ def update_subscription_threshold(sub_id: int, threshold: float, threshold_is_ma
             )
         conn.commit()
 
+def update_subscription_window(sub_id: int, flex_days: int, window_month: Optional[str] = None) -> None:
+    with _conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE subscriptions SET flex_days = ?, window_month = ? WHERE id = ?",
+            (max(0, int(flex_days)), window_month, sub_id)
+        )
+        conn.commit()
+
 def set_last_notified(sub_id: int, price: float) -> None:
     price = int(price)
     with _conn() as conn:
@@ -122,6 +267,26 @@ def set_last_notified(sub_id: int, price: float) -> None:
         )
         conn.commit()
 
+def set_price_snapshot(sub_id: int, price: Optional[float], summary: Optional[str]) -> None:
+    """Сохраняет последнюю лучшую цену подписки (для мгновенного показа в меню редактирования)."""
+    with _conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE subscriptions SET last_price = ?, last_price_at = ?, last_offer_summary = ? WHERE id = ?",
+            (int(price) if price else None, datetime.utcnow().isoformat(), summary, sub_id)
+        )
+        conn.commit()
+
+def touch_price_snapshot(sub_id: int) -> None:
+    """Цена не изменилась — обновляем только время снимка."""
+    with _conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE subscriptions SET last_price_at = ? WHERE id = ?",
+            (datetime.utcnow().isoformat(), sub_id)
+        )
+        conn.commit()
+
 def get_subscription_by_id(sub_id: int) -> Optional[Dict]:
     with _conn() as conn:
         conn.row_factory = sqlite3.Row
@@ -138,6 +303,44 @@ def get_user_subscriptions(user_id: int) -> List[Dict]:
         rows = cursor.fetchall()
         return [dict(row) for row in rows]
 
+def get_user_subscriptions_page(
+    user_id: int,
+    after_id: Optional[int] = None,
+    before_id: Optional[int] = None,
+    limit: int = 5
+) -> Tuple[List[Dict], bool, bool]:
+    """
+    Страница подписок пользователя по ключу (user_id, id), без OFFSET.
+    after_id — следующая страница после этого id, before_id — предыдущая перед ним.
+    Возвращает (подписки по возрастанию id, есть_предыдущая, есть_следующая).
+    """
+    with _conn() as conn:
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        if before_id is not None:
+            cursor.execute(
+                "SELECT * FROM subscriptions WHERE user_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                (user_id, before_id, limit + 1)
+            )
+            rows = cursor.fetchall()
+            has_prev = len(rows) > limit
+            return [dict(row) for row in reversed(rows[:limit])], has_prev, True
+
+        cursor.execute(
+            "SELECT * FROM subscriptions WHERE user_id = ? AND id > ? ORDER BY id LIMIT ?",
+            (user_id, after_id if after_id is not None else -1, limit + 1)
+        )
+        rows = cursor.fetchall()
+        has_next = len(rows) > limit
+        return [dict(row) for row in rows[:limit]], after_id is not None, has_next
+
+def get_user_subscriptions_count(user_id: int) -> int:
+    with _conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM subscriptions WHERE user_id = ?", (user_id,))
+        row = cursor.fetchone()
+        return int(row[0]) if row else 0
+
 def get_all_subscriptions() -> List[Dict]:
     with _conn() as conn:
         conn.row_factory = sqlite3.Row
@@ -146,6 +349,119 @@ def get_all_subscriptions() -> List[Dict]:
         rows = cursor.fetchall()
         return [dict(row) for row in rows]
 
+def get_subscriptions_for_check() -> List[Dict]:
+    """Все подписки, давно не проверявшиеся — первыми (никогда не проверявшиеся — в самом начале)."""
+    with _conn() as conn:
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT * FROM subscriptions "
+            "ORDER BY last_checked_at IS NOT NULL, last_checked_at, id"
+        )
+        rows = cursor.fetchall()
+        return [dict(row) for row in rows]
+
+def mark_subscriptions_checked(sub_ids: List[int]) -> None:
+    """Чекпоинт цикла планировщика: отметка времени проверки пачкой подписок."""
+    if not sub_ids:
+        return
+    checked_at = datetime.utcnow().isoformat()
+    with _conn() as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            "UPDATE subscriptions SET last_checked_at = ? WHERE id = ?",
+            [(checked_at, sub_id) for sub_id in sub_ids]
+        )
+        conn.commit()
+
+def get_user_digest(user_id: int) -> bool:
+    with _conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT digest FROM user_settings WHERE user_id = ?", (user_id,))
+        row = cursor.fetchone()
+        return bool(row and row[0])
+
+def set_user_digest(user_id: int, enabled: bool) -> None:
+    with _conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO user_settings (user_id, digest) VALUES (?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET digest = excluded.digest",
+            (user_id, int(bool(enabled)))
+        )
+        conn.commit()
+
+def get_digest_users() -> set:
+    """Пользователи, получающие уведомления дайджестом (читается раз за цикл)."""
+    with _conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT user_id FROM user_settings WHERE digest = 1")
+        return {row[0] for row in cursor.fetchall()}
+
+def enqueue_notification(user_id: int, text: str, parse_mode: Optional[str] = None) -> int:
+    with _conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO notification_outbox (user_id, text, parse_mode) VALUES (?, ?, ?)",
+            (user_id, text, parse_mode)
+        )
+        conn.commit()
+        return cursor.lastrowid
+
+def get_pending_notifications(now: float, limit: int = 50) -> List[Dict]:
+    """Уведомления, которым пора отправляться, в порядке постановки в очередь."""
+    with _conn() as conn:
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT * FROM notification_outbox WHERE next_attempt_at <= ? ORDER BY id LIMIT ?",
+            (now, limit)
+        )
+        return [dict(row) for row in cursor.fetchall()]
+
+def delete_notification(notification_id: int) -> None:
+    with _conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM notification_outbox WHERE id = ?", (notification_id,))
+        conn.commit()
+
+def defer_notification(notification_id: int, error: str, next_attempt_at: float) -> None:
+    with _conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE notification_outbox SET attempts = attempts + 1, last_error = ?, next_attempt_at = ? "
+            "WHERE id = ?",
+            (error[:500], next_attempt_at, notification_id)
+        )
+        conn.commit()
+
+def get_pending_notifications_count() -> int:
+    with _conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM notification_outbox")
+        return cursor.fetchone()[0]
+
+def add_api_usage(counts: Dict[Tuple[int, str], int], keep_since_minute: int) -> None:
+    """Прибавляет запросы {(минута, источник): число} и удаляет минуты раньше keep_since_minute."""
+    with _conn() as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            "INSERT INTO api_usage (minute, source, calls) VALUES (?, ?, ?) "
+            "ON CONFLICT (minute, source) DO UPDATE SET calls = calls + excluded.calls",
+            [(minute, source, calls) for (minute, source), calls in counts.items()]
+        )
+        cursor.execute("DELETE FROM api_usage WHERE minute < ?", (keep_since_minute,))
+        conn.commit()
+
+def get_api_usage(since_minute: int) -> Dict[str, int]:
+    """Запросы к API по источникам начиная с минуты since_minute (все процессы)."""
+    with _conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT source, SUM(calls) FROM api_usage WHERE minute >= ? GROUP BY source", (since_minute,)
+        )
+        return {source: int(calls) for source, calls in cursor.fetchall()}
+
 def delete_subscription(sub_id: int) -> None:
     with _conn() as conn:
         cursor = conn.cursor()
@@ -0,0 +1,69 @@
+# handlers/admin.py
+from aiogram import Router
+from aiogram.types import Message
+from aiogram.filters import Command
+
+from config import ADMIN_ID, RUN_MODE
+from database import get_pending_notifications_count
+from services.metrics import metrics, process_rss_mb
+from services.quota import api_quota, INTERACTIVE
+from services.search_tasks import search_tasks
+from services.travelpayouts import response_cache
+
+router = Router()
+
+
+def _fmt(value, unit: str = "", digits: int = 1) -> str:
+    return "—" if value is None else f"{value:.{digits}f}{unit}"
+
+
+def _quota_line() -> str:
+    if not api_quota.enabled:
+        return ""
+    return (
+        f"Квота: {api_quota.used()}/{api_quota.per_hour} за час "
+        f"(поиски пользователей: {api_quota.used(INTERACTIVE)}), "
+        f"бюджет планировщика {int(api_quota.scheduler_budget())}/ч\n"
+    )
+
+
+def stats_text() -> str:
+    """
+    Сводка метрик процесса для администратора. При RUN_MODE=bot планировщик
+    работает в другом процессе — его метрик здесь нет.
+    """
+    lookups = response_cache.hits + response_cache.misses
+    hit_rate = response_cache.hits / lookups * 100 if lookups else None
+    return (
+        "📊 <b>Статистика бота</b>\n\n"
+        f"<b>Планировщик</b>{' (отдельный процесс)' if RUN_MODE == 'bot' else ''}\n"
+        f"Цикл: последний {_fmt(metrics.last('scheduler.cycle_seconds'), ' с')}, "
+        f"средний {_fmt(metrics.mean('scheduler.cycle_seconds'), ' с')}\n"
+        f"Проверено подписок: {metrics.count('scheduler.checked', 3600) / 60:.1f}/мин за час\n\n"
+        "<b>Travelpayouts API</b>\n"
+        f"Запросов за час: {metrics.count('api.calls', 3600)}, "
+        f"ошибок: {metrics.count('api.errors', 3600)}\n"
+        f"Запросов в полёте: {int(metrics.gauge('api.in_flight'))}, "
+        f"активных поисков: {len(search_tasks)}\n"
+        f"{_quota_line()}"
+        f"Кэш ответов: {_fmt(hit_rate, '%')} попаданий ({response_cache.hits}/{lookups})\n\n"
+        "<b>Уведомления</b>\n"
+        f"Отправлено за час: {metrics.count('notifications.sent', 3600)}, "
+        f"в очереди дайджестов: {int(metrics.gauge('notifications.pending'))}, "
+        f"в очереди outbox: {get_pending_notifications_count()}\n\n"
+        "<b>Процесс</b>\n"
+        f"Задержка event loop: p50 {_fmt(metrics.percentile('loop.lag_ms', 0.5), ' мс')}, "
+        f"p99 {_fmt(metrics.percentile('loop.lag_ms', 0.99), ' мс')}, "
+        f"макс. {_fmt(metrics.max('loop.lag_ms'), ' мс')}, "
+        f"зависаний за час: {metrics.count('loop.stalls', 3600)}\n"
+        f"Память (RSS): {process_rss_mb():.1f} МБ"
+    )
+
+
+@router.message(Command("stats"))
+async def stats_handler(message: Message):
+    # Команда доступна только администратору; остальным бот не отвечает
+    if not ADMIN_ID or str(message.from_user.id) != str(ADMIN_ID):
+        return
+    await api_quota.sync()
+    await message.answer(stats_text(), parse_mode="HTML")
@@ -1,4 +1,6 @@
 # handlers/search.py
+import asyncio
+
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, ReplyKeyboardRemove
 from aiogram.fsm.context import FSMContext
@@ -10,21 +12,59 @@ from ui.keyboards import (
     trip_type_keyboard, 
     search_results_keyboard, 
     navigation_menu, 
-    start_inline_menu
+    start_inline_menu,
+    location_suggestions_keyboard,
+    anywhere_month_keyboard,
+    anywhere_results_keyboard,
+    ANYWHERE_BUTTON,
 )
 from services.travelpayouts import (
     search_round_trip_fixed_stay,
     search_flights_for_dates,
+    search_anywhere,
     get_airline_name,
+    price_table,
+)
+from services.iata import is_code_format, is_known_location, location_name, resolve_location
+from services.autocomplete import similar_codes, suggest_locations, normalize_query
+from services.fetch_planner import window_dates
+from services.search_tasks import search_tasks
+from services.search_sessions import (
+    SearchSession,
+    compact_one_way,
+    compact_round_trip,
+    search_sessions,
+)
+from config import (
+    SEARCH_SESSION_MAX_OFFERS,
+    SEARCH_RESULTS_PAGE_SIZE,
+    ANYWHERE_DESTINATIONS,
+    DEFAULT_FLEX_DAYS,
+    SEARCH_FLEX_DAYS_ROUND_TRIP,
+    SEARCH_FLEX_DAYS_ONE_WAY,
 )
 
 router = Router()
 
+FETCH_FAILED_TEXT = "⚠️ Сервис поиска билетов временно недоступен. Попробуйте позже."
+# Рейтинг «куда угодно»: сколько направлений показывать и как часто обновлять сообщение (с)
+ANYWHERE_TOP = 10
+ANYWHERE_EDIT_INTERVAL = 1.5
+SEARCH_IN_PROGRESS_TEXT = "⏳ Поиск уже идёт…"
+RESULTS_OUTDATED_TEXT = "Результаты устарели — повторите поиск."
+UNKNOWN_CODE_TEXT = "⚠️ Кода {code} нет в справочнике городов и аэропортов — проверьте, нет ли опечатки."
+UNKNOWN_LOCATION_TEXT = "⚠️ «{text}» не найден в справочнике городов и аэропортов. Введите название города или код IATA еще раз:"
+
+def _preview_line(price: int, day) -> str:
+    """Цена из таблицы уже известных цен — показывается, пока идёт живой поиск."""
+    return f"\n💡 Недавно видели от {price} RUB (вылет {day:%d.%m}), уточняю…"
+
 # --- ОБРАБОТКА НАВИГАЦИИ (Глобальная для этого роутера) ---
 
 @router.message(F.text == "🏠 В начало")
 async def home_button(message: Message, state: FSMContext):
     """Сброс всего и возврат к стартовому меню"""
+    search_tasks.cancel(message.from_user.id)
     await state.clear()
     await message.answer(
         "🏠 Вы вернулись в главное меню.", 
@@ -47,7 +87,7 @@ async def back_button(message: Message, state: FSMContext):
     elif current_state == SearchStates.passengers:
         data = await state.get_data()
         origin = data.get('origin', '???')
-        await message.answer(f"Вылет из: {origin}\nКуда летим? (IATA, например DXB)", reply_markup=navigation_menu())
+        await message.answer(f"Вылет из: {origin}\nКуда летим? (IATA, например DXB)", reply_markup=navigation_menu(anywhere=True))
         await state.set_state(SearchStates.destination)
         
     elif current_state == SearchStates.trip_type:
@@ -72,36 +112,181 @@ async def back_button(message: Message, state: FSMContext):
 
 @router.callback_query(F.data == "start_search")
 async def start_search(callback: CallbackQuery, state: FSMContext):
+    search_tasks.cancel(callback.from_user.id)
     await state.clear()
     await callback.answer()
     await callback.message.answer(
-        "🛫 Начинаем поиск!\n\nОткуда вылетаем? (Код IATA, например MOW или LED)",
+        "🛫 Начинаем поиск!\n\nОткуда вылетаем? (Город или код IATA, например Москва или LED)",
         reply_markup=navigation_menu()
     )
     await state.set_state(SearchStates.origin)
 
 # --- ШАГИ ПОИСКА ---
 
+async def _accept_origin(message: Message, state: FSMContext, code: str):
+    await state.update_data(origin=code)
+    await message.answer(
+        f"✅ Откуда: {location_name(code)}\n\nКуда летим? (город или IATA, например DXB, либо «{ANYWHERE_BUTTON}»)",
+        reply_markup=navigation_menu(anywhere=True)
+    )
+    await state.set_state(SearchStates.destination)
+
+async def _accept_destination(message: Message, state: FSMContext, code: str):
+    await state.update_data(destination=code)
+    await message.answer(f"✅ Куда: {location_name(code)}\n\nСколько пассажиров? (1–9)", reply_markup=navigation_menu())
+    await state.set_state(SearchStates.passengers)
+
+async def _confirm_unknown_code(message: Message, field: str, code: str):
+    """Кода нет в справочнике: варианты на одну опечатку и кнопка подтверждения."""
+    similar = similar_codes(code)
+    text = UNKNOWN_CODE_TEXT.format(code=code)
+    if similar:
+        text += "\nВозможно, вы имели в виду один из вариантов ниже."
+    text += f"\nЕсли код верный, подтвердите его кнопкой «Да, именно {code}» или введите город ещё раз."
+    await message.answer(text, reply_markup=location_suggestions_keyboard(similar, field, confirm_code=code))
+
+async def _resolve_location_input(message: Message, field: str):
+    """
+    Возвращает код IATA, если ввод однозначен (известный код заглавными буквами
+    или единственное точное совпадение по названию). Иначе предлагает варианты
+    кнопками и возвращает None. Код из трёх латинских букв, которого нет в
+    справочнике, без явного подтверждения не принимается: опечатка стоила бы
+    целого окна запросов к API.
+    """
+    text = message.text.strip()
+    if is_code_format(text) and text.isupper():
+        if is_known_location(text):
+            return text
+        await _confirm_unknown_code(message, field, text)
+        return None
+
+    matches = suggest_locations(text)
+    if len(matches) == 1 and normalize_query(text) in (
+        matches[0].code.lower(), normalize_query(matches[0].name_ru), normalize_query(matches[0].name_en)
+    ):
+        return matches[0].code
+
+    if not matches and is_code_format(text):
+        await _confirm_unknown_code(message, field, text.upper())
+        return None
+
+    if not matches:
+        await message.answer(
+            UNKNOWN_LOCATION_TEXT.format(text=text),
+            reply_markup=navigation_menu(anywhere=field == "destination")
+        )
+        return None
+
+    await message.answer("🔎 Выберите вариант:", reply_markup=location_suggestions_keyboard(matches, field))
+    return None
+
 @router.message(SearchStates.origin)
 async def set_origin(message: Message, state: FSMContext):
-    code = message.text.strip().upper()
-    if len(code) != 3:
-        await message.answer("⚠️ Код должен состоять из 3 букв (например, MOW). Попробуйте еще раз:", reply_markup=navigation_menu())
+    code = await _resolve_location_input(message, "origin")
+    if code:
+        await _accept_origin(message, state, code)
+
+@router.message(SearchStates.destination, F.text == ANYWHERE_BUTTON)
+async def choose_anywhere(message: Message, state: FSMContext):
+    await message.answer(
+        "🌍 Ищем самые дешёвые направления. Выберите месяц вылета:",
+        reply_markup=anywhere_month_keyboard(datetime.now().date())
+    )
+
+@router.callback_query(SearchStates.destination, F.data.startswith("anywhere:"))
+async def run_anywhere_search(callback: CallbackQuery, state: FSMContext):
+    """
+    Рейтинг направлений по минимальной цене на месяц. Результаты приходят
+    по мере ответов API, сообщение обновляется не чаще раза в ANYWHERE_EDIT_INTERVAL.
+    """
+    month = callback.data.split(":")[1]
+    data = await state.get_data()
+    origin = data.get("origin")
+    key = ("anywhere", origin, month)
+    if search_tasks.is_duplicate(callback.from_user.id, key):
+        await callback.answer(SEARCH_IN_PROGRESS_TEXT)
+        return
+    await callback.answer()
+    if not origin:
+        await callback.message.answer("⚠️ Сначала укажите город вылета.", reply_markup=navigation_menu())
+        return
+
+    await search_tasks.run(callback.from_user.id, key, lambda: _run_anywhere(callback, origin, month))
+
+async def _run_anywhere(callback: CallbackQuery, origin: str, month: str):
+    status = await callback.message.answer(f"🔎 Ищу направления из {location_name(origin)} на {month}…")
+    best = {}  # направление -> минимальная цена
+    done = 0
+    total = len([d for d in dict.fromkeys(ANYWHERE_DESTINATIONS) if d != origin])
+    failed = 0
+    last_edit = 0.0
+
+    async for dest, result in search_anywhere(origin, month, ANYWHERE_DESTINATIONS):
+        done += 1
+        if result.failed:
+            failed += 1
+        prices = [float(r["price"]) for r in result if r.get("price")]
+        if prices:
+            best[dest] = int(min(prices))
+
+        now = asyncio.get_running_loop().time()
+        if best and now - last_edit >= ANYWHERE_EDIT_INTERVAL and done < total:
+            last_edit = now
+            try:
+                await status.edit_text(_anywhere_text(origin, month, best, done, total), parse_mode="HTML")
+            except Exception:
+                pass
+
+    if not best:
+        text = FETCH_FAILED_TEXT if failed == total else "😔 Ничего не найдено на этот месяц."
+        await status.edit_text(text)
         return
-    
-    await state.update_data(origin=code)
-    await message.answer(f"✅ Откуда: {code}\n\nКуда летим? (IATA, например DXB)", reply_markup=navigation_menu())
-    await state.set_state(SearchStates.destination)
+
+    ranking = sorted(best.items(), key=lambda kv: kv[1])[:ANYWHERE_TOP]
+    await status.edit_text(
+        _anywhere_text(origin, month, best, done, total) + "\nВыберите направление для поиска по датам:",
+        parse_mode="HTML",
+        reply_markup=anywhere_results_keyboard(
+            [(code, _short_location_name(code), price) for code, price in ranking]
+        )
+    )
+
+@router.callback_query(SearchStates.destination, F.data.startswith("anywhere_pick:"))
+async def pick_anywhere_destination(callback: CallbackQuery, state: FSMContext):
+    code = callback.data.split(":")[1]
+    await callback.answer()
+    await _accept_destination(callback.message, state, code)
+
+def _short_location_name(code: str) -> str:
+    loc = resolve_location(code)
+    return loc.name_ru if loc else code
+
+def _anywhere_text(origin: str, month: str, best: dict, done: int, total: int) -> str:
+    lines = [f"🌍 <b>Куда дешевле всего из {location_name(origin)} ({month})</b>"]
+    if done < total:
+        lines.append(f"Проверено направлений: {done}/{total}…")
+    lines.append("")
+    for i, (code, price) in enumerate(sorted(best.items(), key=lambda kv: kv[1])[:ANYWHERE_TOP], 1):
+        lines.append(f"{i}. {_short_location_name(code)} ({code}) — от <b>{price} RUB</b>")
+    return "\n".join(lines) + "\n"
 
 @router.message(SearchStates.destination)
 async def set_destination(message: Message, state: FSMContext):
-    code = message.text.strip().upper()
-    if len(code) != 3:
-        await message.answer("⚠️ Код должен состоять из 3 букв. Попробуйте еще раз:", reply_markup=navigation_menu())
-        return
-    await state.update_data(destination=code)
-    await message.answer("Сколько пассажиров? (1–9)", reply_markup=navigation_menu())
-    await state.set_state(SearchStates.passengers)
+    code = await _resolve_location_input(message, "destination")
+    if code:
+        await _accept_destination(message, state, code)
+
+@router.callback_query(SearchStates.origin, F.data.startswith("ac:origin:"))
+async def pick_origin(callback: CallbackQuery, state: FSMContext):
+    code = callback.data.split(":")[2]
+    await callback.answer()
+    await _accept_origin(callback.message, state, code)
+
+@router.callback_query(SearchStates.destination, F.data.startswith("ac:destination:"))
+async def pick_destination(callback: CallbackQuery, state: FSMContext):
+    code = callback.data.split(":")[2]
+    await callback.answer()
+    await _accept_destination(callback.message, state, code)
 
 @router.message(SearchStates.passengers)
 async def set_passengers(message: Message, state: FSMContext):
@@ -173,43 +358,44 @@ async def set_return_date(callback: CallbackQuery, callback_data: SimpleCalendar
         return
 
     stay_days = (return_date - data["depart_date"]).days
+    key = ("round", data["origin"], data["destination"], data["depart_date"], return_date, data["passengers"])
+    if search_tasks.is_duplicate(callback.from_user.id, key):
+        await callback.answer(SEARCH_IN_PROGRESS_TEXT)
+        return
+
+    preview = ""
+    known = price_table.cheapest_round_trip(
+        data["origin"], data["destination"],
+        window_dates(data["depart_date"], SEARCH_FLEX_DAYS_ROUND_TRIP), return_date - data["depart_date"],
+    )
+    if known:
+        preview = _preview_line(known[1] * data["passengers"], known[0])
     
     await callback.message.answer(
         f"🔎 Ищу билеты {data['origin']} → {data['destination']}\n"
         f"📆 Туда-обратно ({stay_days} дней)\n"
+        + preview
     )
     
-    offers = await search_round_trip_fixed_stay(
+    # Новый поиск пользователя отменяет этот (None) вместе с запросами к API
+    offers = await search_tasks.run(callback.from_user.id, key, lambda: search_round_trip_fixed_stay(
         origin=data["origin"],
         destination=data["destination"],
         depart_date=data["depart_date"],
         return_date=return_date,
         passengers=data["passengers"],
-        days_flex=5,
-    )
-    
+        days_flex=SEARCH_FLEX_DAYS_ROUND_TRIP,
+        limit=SEARCH_SESSION_MAX_OFFERS,
+    ))
+    if offers is None:
+        return
     
     if not offers:
-        await callback.message.answer("😔 Ничего не найдено.", reply_markup=ReplyKeyboardRemove())
+        text = FETCH_FAILED_TEXT if offers.failed else "😔 Ничего не найдено."
+        await callback.message.answer(text, reply_markup=ReplyKeyboardRemove())
         await callback.message.answer("Главное меню:", reply_markup=start_inline_menu())
         return
 
-    offers.sort(key=lambda x: x["total_price"])
-    current_price = offers[0]["total_price"]
-    
-    text = "🔁 <b>Лучшие варианты (туда-обратно):</b>\n\n"
-    for o in offers[:3]:
-        out = o["outbound"]
-        inn = o["inbound"]
-        airline_name = get_airline_name(out.get('airline', ''))
-        
-        text += (
-            f"🛫 {out['origin']} → {out['destination']} {out.get('departure_at','')[:10]}\n"
-            f"🛬 {inn['origin']} → {inn['destination']} {inn.get('departure_at','')[:10]}\n"
-            f"🏢 {airline_name}\n"
-            f"💰 <b>{o['total_price']} RUB</b>\n\n"
-        )
-        
     await callback.message.answer("✅ Результаты поиска:", reply_markup=ReplyKeyboardRemove())
     
     await state.update_data(sub_params={
@@ -217,75 +403,135 @@ async def set_return_date(callback: CallbackQuery, callback_data: SimpleCalendar
         "destination": data["destination"],
         "depart": data["depart_date"],
         "return": return_date,
-        "passengers": data["passengers"]
+        "passengers": data["passengers"],
+        "flex_days": DEFAULT_FLEX_DAYS
     })
 
-    await callback.message.answer(
-        text,
-        parse_mode="HTML",
-        reply_markup=search_results_keyboard(
-            origin=data["origin"],
-            dest=data["destination"],
-            depart=data["depart_date"],
-            ret=return_date,
-            passengers=data["passengers"],
-            current_price=current_price
-        )
+    session = SearchSession(
+        data["origin"], data["destination"], data["depart_date"], return_date,
+        data["passengers"], compact_round_trip(offers),
     )
+    search_sessions.put(callback.from_user.id, session)
+    text, kb = _render_session(session)
+    await callback.message.answer(text, parse_mode="HTML", reply_markup=kb)
 
 
 async def perform_search_one_way(callback: CallbackQuery, state: FSMContext, data: dict):
-    from datetime import timedelta
+    key = ("one_way", data["origin"], data["destination"], data["depart_date"], data["passengers"])
+    if search_tasks.is_duplicate(callback.from_user.id, key):
+        await callback.answer(SEARCH_IN_PROGRESS_TEXT)
+        return
+
+    base_date = data["depart_date"]
+    search_dates = window_dates(base_date, SEARCH_FLEX_DAYS_ONE_WAY)
+
+    preview = ""
+    known = price_table.cheapest(data["origin"], data["destination"], search_dates)
+    if known:
+        preview = _preview_line(known[1].price * data["passengers"], known[0])
 
     await callback.message.answer(
         f"🔎 Ищу билеты {data['origin']} → {data['destination']}\n"
-        f"📆 Дата: {data['depart_date']} ± 7 дней\n"
+        f"📆 Дата: {data['depart_date']} ± {SEARCH_FLEX_DAYS_ONE_WAY} дней\n"
         f"👥 Пассажиры: {data['passengers']}"
+        + preview
     )
 
-    base_date = data["depart_date"]
-    search_dates = [base_date + timedelta(days=d) for d in range(-7, 8)]
-
-    results = await search_flights_for_dates(
+    # Новый поиск пользователя отменяет этот (None) вместе с запросами к API
+    results = await search_tasks.run(callback.from_user.id, key, lambda: search_flights_for_dates(
         origin=data['origin'],
         destination=data['destination'],
         dates=search_dates,
         limit_per_day=5
-    )
+    ))
+    if results is None:
+        return
     
     if not results:
-        await callback.message.answer("😔 Билеты не найдены.", reply_markup=ReplyKeyboardRemove())
+        text = FETCH_FAILED_TEXT if results.failed else "😔 Билеты не найдены."
+        await callback.message.answer(text, reply_markup=ReplyKeyboardRemove())
         await callback.message.answer("Главное меню:", reply_markup=start_inline_menu())
         return
 
-    results.sort(key=lambda x: float(x.get("price", 999999)))
-
-    best = results[0]
-    raw_price = float(best.get("price", 0))
-    current_price = int(raw_price * data["passengers"]) if raw_price > 0 else 0
-
     await callback.message.answer("✅ Результаты поиска:", reply_markup=ReplyKeyboardRemove())
 
-    text = "✈️ <b>Лучшие варианты (в одну сторону):</b>\n\n"
-    for ticket in results[:3]:
-        price = int(float(ticket.get("price", 0)) * data["passengers"])
-        airline_name = get_airline_name(ticket.get('airline', ''))
-        dep_time = ticket.get('departure_at', '')[:16].replace("T", " ")
+    session = SearchSession(
+        data["origin"], data["destination"], data["depart_date"], None,
+        data["passengers"], compact_one_way(results, data["passengers"]),
+    )
+    search_sessions.put(callback.from_user.id, session)
+    text, kb = _render_session(session)
+    await callback.message.answer(text, parse_mode="HTML", reply_markup=kb)
+
+def _format_leg(icon: str, leg) -> str:
+    dep_time = leg.departure_at[:16].replace("T", " ")
+    transfers = "прямой" if leg.transfers == 0 else f"пересадок: {leg.transfers}"
+    return f"{icon} {leg.origin} → {leg.destination} {dep_time} ({transfers})\n"
+
+def _render_session(session: SearchSession):
+    """Текст и клавиатура текущей страницы результатов — только из памяти, без API."""
+    page_offers, pages = session.page_of(SEARCH_RESULTS_PAGE_SIZE)
+    title = "🔁 <b>Варианты (туда-обратно)" if session.ret else "✈️ <b>Варианты (в одну сторону)"
+    text = f"{title}, стр. {session.page + 1}/{pages}:</b>\n\n"
+    if not page_offers:
+        text += "Нет вариантов под выбранный фильтр.\n"
+    for o in page_offers:
+        text += _format_leg("🛫", o.outbound)
+        if o.inbound:
+            text += _format_leg("🛬", o.inbound)
         text += (
-            f"🛫 {dep_time}\n"
-            f"🏢 {airline_name}\n"
-            f"💰 {price} RUB\n\n"
+            f"🏢 {get_airline_name(o.outbound.airline)}\n"
+            f"💰 <b>{o.total_price} RUB</b>\n\n"
         )
 
-    await callback.message.answer(
-        text,
-        parse_mode="HTML",
-        reply_markup=search_results_keyboard(
-            origin=data["origin"],
-            dest=data["destination"],
-            depart=data["depart_date"],
-            ret=None,
-            passengers=data["passengers"],
-            current_price=current_price
-        )
-    )
\ No newline at end of file
+    best_price = min((o.total_price for o in session.offers), default=0)
+    kb = search_results_keyboard(
+        origin=session.origin,
+        dest=session.destination,
+        depart=session.depart,
+        ret=session.ret,
+        passengers=session.passengers,
+        current_price=best_price,
+        view={
+            "sort": session.sort,
+            "direct_only": session.direct_only,
+            "page": session.page,
+            "pages": pages,
+        },
+        session_id=session.id,
+    )
+    return text, kb
+
+@router.callback_query(F.data.startswith("sr:"))
+async def search_results_view(callback: CallbackQuery):
+    """
+    Листание, сортировка и фильтр результатов из сессии поиска.
+    callback_data: sr:<действие>[:<аргумент>]:<id сессии> — кнопки сообщения
+    с результатами прошлого поиска отвечают «результаты устарели».
+    """
+    parts = callback.data.split(":")
+    action = parts[1] if len(parts) > 1 else ""
+    if action == "noop":
+        await callback.answer()
+        return
+    session = search_sessions.get(callback.from_user.id, parts[-1] if len(parts) > 2 else "")
+    if session is None:
+        await callback.answer(RESULTS_OUTDATED_TEXT, show_alert=True)
+        return
+
+    if action == "sort" and len(parts) > 2:
+        session.sort = parts[2]
+        session.page = 0
+    elif action == "direct":
+        session.direct_only = not session.direct_only
+        session.page = 0
+    elif action == "page" and len(parts) > 2 and parts[2].lstrip("-").isdigit():
+        session.page = int(parts[2])
+
+    text, kb = _render_session(session)
+    await callback.answer()
+    try:
+        await callback.message.edit_text(text, parse_mode="HTML", reply_markup=kb)
+    except Exception:
+        # «message is not modified» при нажатии на уже активную кнопку
+        pass
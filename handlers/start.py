@@ -5,11 +5,13 @@ from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 
 from ui.keyboards import start_inline_menu
+from services.search_tasks import search_tasks
 
 router = Router()
 
 @router.message(Command("start"))
 async def start_handler(message: Message, state: FSMContext):
+    search_tasks.cancel(message.from_user.id)
     await state.clear()
     await message.answer(
         "✈️ <b>Добро пожаловать!</b>\n\n"
@@ -21,6 +23,7 @@ async def start_handler(message: Message, state: FSMContext):
 
 @router.callback_query(lambda c: c.data == "go_home")
 async def go_home_callback(callback: CallbackQuery, state: FSMContext):
+    search_tasks.cancel(callback.from_user.id)
     await state.clear()
     await callback.message.answer(
         "🏠 Главное меню:",
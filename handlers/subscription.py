@@ -1,4 +1,5 @@
 # handlers/subscription.py
+import asyncio
 import logging
 from datetime import datetime
 
@@ -11,24 +12,43 @@ from aiogram.types import (
 )
 from aiogram.fsm.context import FSMContext
 
+from config import PRICE_SNAPSHOT_MAX_AGE, SUBS_PAGE_SIZE, DEFAULT_FLEX_DAYS
 from database import (
     add_subscription,
-    get_user_subscriptions,
+    get_subscription_by_id,
+    get_user_subscriptions_page,
+    get_user_subscriptions_count,
     delete_subscription,
     update_subscription_threshold,
+    update_subscription_window,
+    set_price_snapshot,
+    get_user_digest,
+    set_user_digest,
 )
 from ui.keyboards import subscriptions_keyboard, threshold_options_keyboard, start_inline_menu
 from ui.states import SubscriptionStates
-from services.travelpayouts import (
-    search_round_trip_fixed_stay,
-    search_flights_for_dates,
+from services.scheduler import (
+    fetch_subscription_offers,
+    pick_best_offer,
+    offer_summary,
+    subscription_window,
+    subscription_dates,
+    calls_per_check,
 )
+from services.fetch_planner import describe_window
+from services.price_analytics import price_analytics
+from services.quota import api_quota
+from services.search_sessions import search_sessions
 
 # Initialize logger
 logger = logging.getLogger(__name__)
 
 router = Router()
 
+# Варианты окна дат в меню редактирования подписки (± дней); "month" — любая дата месяца вылета
+WINDOW_OPTIONS = (1, 3, 7, 14)
+WINDOW_MONTH = "month"
+
 # --- Helpers ---
 
 def uncompact_date(date_str: str) -> str:
@@ -94,6 +114,162 @@ def normalize_return_date_for_storage(value):
     except Exception:
         return None
 
+def _get_user_subscription(user_id: int, sub_id: int):
+    """Подписка по id, только если она принадлежит пользователю."""
+    sub = get_subscription_by_id(sub_id)
+    return sub if sub and sub["user_id"] == user_id else None
+
+def _snapshot_age_seconds(value):
+    """Возраст снимка цены в секундах (None — снимка нет или дата не разбирается)."""
+    if not value:
+        return None
+    try:
+        return (datetime.utcnow() - datetime.fromisoformat(str(value))).total_seconds()
+    except ValueError:
+        return None
+
+def _snapshot_text(sub) -> str:
+    if not sub.get("last_price"):
+        return "Текущая цена: ещё не проверялась"
+    age = _snapshot_age_seconds(sub.get("last_price_at"))
+    age_str = f"{int(age // 60)} мин назад" if age is not None else "время неизвестно"
+    summary = f" ({sub['last_offer_summary']})" if sub.get("last_offer_summary") else ""
+    return f"Текущая цена: {int(sub['last_price'])} RUB{summary}, проверено {age_str}"
+
+def _edit_sub_text(sub, near_price_line: str = "") -> str:
+    threshold = sub.get("threshold")
+    threshold_flag = sub.get("threshold_is_manual")
+    last_notified = sub.get("last_notified_price")
+
+    flag_text = "ручной" if threshold_flag else "динамический"
+    threshold_str = f"{threshold} RUB" if threshold else "—"
+    last_notified_str = f"{int(last_notified)} RUB" if last_notified else "—"
+
+    return (
+        f"Редактирование подписки:\n"
+        f"{sub['origin']} → {sub['destination']}\n"
+        f"Даты: {sub['depart_date']}" + (f" — {sub['return_date']}" if sub['return_date'] else "") + "\n"
+        f"Пассажиров: {sub['passengers']}\n"
+        f"Окно дат: {describe_window(*subscription_window(sub))}\n\n"
+        f"Установленный триггер: {threshold_str} ({flag_text})\n"
+        f"Последняя найденная цена: {last_notified_str}\n"
+        f"{_snapshot_text(sub)}\n"
+        + (f"{near_price_line}\n" if near_price_line else "")
+        + "\nВведите новую цену (или нажмите 'Использовать текущую цену'):"
+    )
+
+def _window_buttons(sub) -> list:
+    sub_id = sub["id"]
+    flex_days, window_month = subscription_window(sub)
+    buttons = []
+    for days in WINDOW_OPTIONS:
+        mark = "✅ " if not window_month and flex_days == days else ""
+        buttons.append(InlineKeyboardButton(text=f"{mark}±{days}", callback_data=f"sub_window:{sub_id}:{days}"))
+    mark = "✅ " if window_month else ""
+    buttons.append(InlineKeyboardButton(text=f"{mark}Весь месяц", callback_data=f"sub_window:{sub_id}:{WINDOW_MONTH}"))
+    return buttons
+
+def _edit_sub_keyboard(sub, current_price: int) -> InlineKeyboardMarkup:
+    sub_id = sub["id"]
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(
+            text=f"Использовать текущую цену: {int(current_price)} RUB",
+            callback_data=f"set_threshold_use:{sub_id}"
+        )],
+        [InlineKeyboardButton(
+            text="Ввести цену вручную",
+            callback_data=f"set_threshold_manual:{sub_id}"
+        )],
+        _window_buttons(sub),
+        [InlineKeyboardButton(text="Отмена", callback_data="subscribe_cancel")]
+    ])
+
+# Фоновые обновления снимков: sub_id -> task (не запускаем два обновления одной подписки)
+_snapshot_refreshes = {}
+
+def _schedule_snapshot_refresh(sub, call: CallbackQuery, state: FSMContext) -> None:
+    sub_id = sub["id"]
+    task = _snapshot_refreshes.get(sub_id)
+    if task and not task.done():
+        return
+    task = asyncio.create_task(_refresh_snapshot(sub, call, state))
+    _snapshot_refreshes[sub_id] = task
+    task.add_done_callback(lambda _: _snapshot_refreshes.pop(sub_id, None))
+
+# Окно фонового обновления снимка: дата подписки ± столько дней (полное окно
+# проверяет планировщик, здесь достаточно освежить цену около основной даты)
+SNAPSHOT_REFRESH_FLEX_DAYS = 1
+
+def _snapshot_refresh_sub(sub) -> dict:
+    """Подписка, суженная до окна фонового обновления (исходный словарь не меняется)."""
+    flex_days, _ = subscription_window(sub)
+    return dict(sub, flex_days=min(flex_days, SNAPSHOT_REFRESH_FLEX_DAYS), window_month=None)
+
+async def _refresh_snapshot(sub, call: CallbackQuery, state: FSMContext) -> None:
+    """
+    Обновляет цену около даты подписки. Если суженное окно совпадает с окном
+    подписки, это полноценный снимок: он сохраняется и становится текущей ценой.
+    Иначе цена только показывается отдельной строкой в меню — снимок по всему
+    окну (его пишет планировщик) она не подменяет.
+    """
+    sub_id = sub["id"]
+    try:
+        if not safe_parse_date(sub.get("depart_date")):
+            return
+        narrow = _snapshot_refresh_sub(sub)
+        if not api_quota.has_spare(calls_per_check(narrow)):
+            logger.info("snapshot refresh for sub %s skipped: API quota is tight", sub_id)
+            return
+        payload = await fetch_subscription_offers(narrow)
+        if payload.failed:
+            return
+        price, offer = pick_best_offer(narrow, payload)
+        full_window = subscription_dates(narrow) == subscription_dates(sub)
+        if full_window:
+            set_price_snapshot(sub_id, price, offer_summary(offer) if price else None)
+        if not price:
+            return
+
+        st = await state.get_data()
+        if st.get("edit_sub_id") != sub_id:
+            return
+        if full_window:
+            await state.update_data(current_price=price)
+            await call.message.edit_reply_markup(reply_markup=_edit_sub_keyboard(sub, price))
+            return
+        near_price_line = (
+            f"Около даты вылета ({describe_window(*subscription_window(narrow))}) сейчас: "
+            f"{int(price)} RUB ({offer_summary(offer)})"
+        )
+        sub = get_subscription_by_id(sub_id) or sub
+        await call.message.edit_text(
+            _edit_sub_text(sub, near_price_line),
+            parse_mode="HTML",
+            reply_markup=_edit_sub_keyboard(sub, st.get("current_price") or 0),
+        )
+    except Exception as e:
+        logger.warning("snapshot refresh for sub %s failed: %s", sub_id, e)
+
+async def _threshold_suggestions(sub_params: dict, current_price) -> list:
+    """Подсказки целевой цены по истории цен маршрута; при любой ошибке — без подсказок."""
+    try:
+        depart = safe_parse_date(uncompact_date(sub_params.get("depart") or "0"))
+        if not depart:
+            return []
+        # Ждать приходится только первый расчёт после старта — и не дольше пары секунд
+        await asyncio.wait_for(price_analytics.ensure_fresh(), timeout=2)
+        return price_analytics.suggestions(
+            sub_params["origin"],
+            sub_params["destination"],
+            depart,
+            safe_parse_date(normalize_return_date_for_storage(sub_params.get("return"))),
+            int(sub_params.get("passengers", 1)),
+            current_price=current_price,
+        )
+    except Exception as e:
+        logger.warning("threshold suggestions failed: %s", e)
+        return []
+
 # --- Handlers ---
 
 @router.callback_query(F.data.startswith("sub:"))
@@ -103,7 +279,11 @@ async def subscribe_handler(callback: CallbackQuery, state: FSMContext):
         logger.debug(f"subscribe_handler raw cb: {raw}")
 
         parts = raw.split(":")
-        # Expected: sub:<price>:<origin>:<dest>:<departYYYYMMDD>:<retYYYYMMDD or 0>:<passengers>
+        # Expected: sub:<price>:<origin>:<dest>:<departYYYYMMDD>:<retYYYYMMDD or 0>:<passengers>[:<session_id>]
+        # Кнопка из результатов прошлого поиска: состояние (sub_params) уже от другого поиска
+        if len(parts) > 7 and search_sessions.get(callback.from_user.id, parts[7]) is None:
+            await callback.answer("Результаты устарели — повторите поиск.", show_alert=True)
+            return
         price = int(float(parts[1])) if len(parts) > 1 and parts[1] else 0.0
         origin = parts[2] if len(parts) > 2 else None
         destination = parts[3] if len(parts) > 3 else None
@@ -176,13 +356,15 @@ async def subscribe_handler(callback: CallbackQuery, state: FSMContext):
         await state.update_data(sub_params=merged)
         await state.update_data(edit_sub_id=None)
 
+        suggestions = await _threshold_suggestions(merged, price)
         kb = threshold_options_keyboard(
             price,
             origin,
             destination,
             depart_date,
             return_date or "0",
-            merged.get("passengers", 1)
+            merged.get("passengers", 1),
+            suggestions,
         )
 
         await callback.answer()
@@ -198,8 +380,7 @@ async def cb_set_threshold_manual(call: CallbackQuery, state: FSMContext):
         if len(parts) == 2:
             # формат редактирования: set_threshold_manual:<sub_id>
             sub_id = int(parts[1])
-            subs = get_user_subscriptions(call.from_user.id)
-            sub = next((s for s in subs if s["id"] == sub_id), None)
+            sub = _get_user_subscription(call.from_user.id, sub_id)
             if not sub:
                 await call.answer("Подписка не найдена", show_alert=True)
                 return
@@ -243,13 +424,15 @@ async def cb_set_threshold_manual(call: CallbackQuery, state: FSMContext):
         logger.exception("cb_set_threshold_manual error: %s", e)
         await call.answer("Ошибка данных", show_alert=True)
 
-@router.callback_query(F.data.startswith("set_threshold_use:"))
+@router.callback_query(F.data.startswith("set_threshold_use:") | F.data.startswith("set_threshold_pick:"))
 async def cb_set_threshold_use(call: CallbackQuery, state: FSMContext):
     try:
         raw = call.data
         logger.debug(f"cb_set_threshold_use raw callback: {raw}")
 
         parts = raw.split(":")
+        # set_threshold_pick — цена из подсказок аналитики: фиксированный порог, не текущая цена
+        is_manual = 1 if parts[0] == "set_threshold_pick" else 0
         if len(parts) == 2:
             sub_id = int(parts[1])
             st = await state.get_data()
@@ -273,7 +456,7 @@ async def cb_set_threshold_use(call: CallbackQuery, state: FSMContext):
 
         if edit_id:
             logger.info(f"cb_set_threshold_use: updating sub {edit_id} -> price={price}")
-            update_subscription_threshold(edit_id, int(round(float(price))), threshold_is_manual=0)
+            update_subscription_threshold(edit_id, int(round(float(price))), threshold_is_manual=is_manual)
             await call.answer()
             await call.message.edit_text(f"✅ Целевая цена подписки обновлена: {int(price)} RUB", reply_markup=start_inline_menu())
             await state.clear()
@@ -285,12 +468,14 @@ async def cb_set_threshold_use(call: CallbackQuery, state: FSMContext):
             depart = sub_params["depart"]
             ret = sub_params["return"]
             passengers = int(sub_params.get("passengers", 1))
+            flex_days = sub_params.get("flex_days", DEFAULT_FLEX_DAYS)
         else:
             origin = parts[2]
             destination = parts[3]
             depart_raw = parts[4]
             ret_raw = parts[5]
             passengers = int(parts[6]) if len(parts) > 6 else 1
+            flex_days = DEFAULT_FLEX_DAYS
             
             depart = f"{depart_raw[:4]}-{depart_raw[4:6]}-{depart_raw[6:8]}" if depart_raw and depart_raw != "0" else None
             ret = f"{ret_raw[:4]}-{ret_raw[4:6]}-{ret_raw[6:8]}" if ret_raw and ret_raw != "0" else None
@@ -311,7 +496,8 @@ async def cb_set_threshold_use(call: CallbackQuery, state: FSMContext):
             return_date=clean_return,
             passengers=passengers,
             threshold=price,
-            threshold_is_manual=0
+            threshold_is_manual=is_manual,
+            flex_days=flex_days
         )
         await call.answer()
 
@@ -323,7 +509,7 @@ async def cb_set_threshold_use(call: CallbackQuery, state: FSMContext):
             route_text += f"\nDates: {ui_depart} — {ui_ret}"
         else:
             route_text += f"\nDate: {ui_depart}"
-        route_text += f"\n💰 Target: <b>{int(price)} RUB</b> (динамический)"
+        route_text += f"\n💰 Target: <b>{int(price)} RUB</b> ({'ручной' if is_manual else 'динамический'})"
 
         await call.message.edit_text(route_text, parse_mode="HTML", reply_markup=start_inline_menu())
         await state.clear()
@@ -380,7 +566,8 @@ async def process_manual_threshold(message: Message, state: FSMContext):
             return_date=clean_return, # Теперь тут либо 'YYYY-MM-DD', либо None
             passengers=clean_passengers,
             threshold=threshold,
-            threshold_is_manual=1
+            threshold_is_manual=1,
+            flex_days=sub_params.get("flex_days", DEFAULT_FLEX_DAYS)
         )
         
         await state.clear()
@@ -393,34 +580,27 @@ async def process_manual_threshold(message: Message, state: FSMContext):
         logger.exception("process_manual_threshold error: %s", e)
         await message.answer("Произошла ошибка при сохранении подписки.")
 
-@router.message(F.text.contains("Мои подписки"))
-@router.callback_query(F.data == "my_subs")
-async def list_subscriptions(event):
-    # Determine if it's a message or callback
-    if isinstance(event, CallbackQuery):
-        message = event.message
-        user_id = event.from_user.id
-        await event.answer()
-    else:
-        message = event
-        user_id = event.from_user.id
-
+async def _render_subscriptions_page(message: Message, user_id: int, edit: bool,
+                                     after_id=None, before_id=None):
+    """Рисует одну страницу списка: один индексированный запрос + COUNT(*)."""
     try:
-        subs = get_user_subscriptions(user_id)
+        total = get_user_subscriptions_count(user_id)
+        subs, has_prev, has_next = get_user_subscriptions_page(
+            user_id, after_id=after_id, before_id=before_id, limit=SUBS_PAGE_SIZE
+        ) if total else ([], False, False)
     except Exception as e:
         logger.error(f"Error getting subscriptions for {user_id}: {e}")
-        subs = []
+        total, subs, has_prev, has_next = 0, [], False, False
 
     if not subs:
         text = "📂 У вас нет активных подписок."
-        if isinstance(event, CallbackQuery):
+        if edit:
             await message.edit_text(text, reply_markup=start_inline_menu())
         else:
             await message.answer(text, reply_markup=start_inline_menu())
         return
 
-    lines = ["⭐ <b>Ваши подписки (нажмите ✏️ для редактирования):</b>\n"]
-    kb_buttons = []
+    lines = [f"⭐ <b>Ваши подписки ({total}), нажмите ✏️ для редактирования:</b>\n"]
     
     for s in subs:
         sub_id = s["id"]
@@ -442,29 +622,57 @@ async def list_subscriptions(event):
             "—\n"
         )
 
-        # InlineKeyboardButton is imported at the top, so this should work fine
-        kb_buttons.append([
-            InlineKeyboardButton(text=f"✏️ Редактировать {sub_id}", callback_data=f"edit_sub:{sub_id}"),
-            InlineKeyboardButton(text="❌ Удалить", callback_data=f"del_sub:{sub_id}")
-        ])
-
-    kb_buttons.append([InlineKeyboardButton(text="🔙 Главное меню", callback_data="go_home")])
-    kb = InlineKeyboardMarkup(inline_keyboard=kb_buttons)
-
+    kb = subscriptions_keyboard(subs, has_prev=has_prev, has_next=has_next, digest=get_user_digest(user_id))
     full_text = "\n".join(lines)
     
-    if isinstance(event, CallbackQuery):
+    if edit:
         await message.edit_text(full_text, parse_mode="HTML", reply_markup=kb)
     else:
         await message.answer(full_text, parse_mode="HTML", reply_markup=kb)
 
+@router.message(F.text.contains("Мои подписки"))
+@router.callback_query(F.data == "my_subs")
+async def list_subscriptions(event):
+    # Determine if it's a message or callback
+    if isinstance(event, CallbackQuery):
+        await event.answer()
+        await _render_subscriptions_page(event.message, event.from_user.id, edit=True)
+    else:
+        await _render_subscriptions_page(event, event.from_user.id, edit=False)
+
+@router.callback_query(F.data.startswith("subs_page:"))
+async def subscriptions_page(callback: CallbackQuery):
+    try:
+        _, direction, anchor = callback.data.split(":")
+        anchor_id = int(anchor)
+    except ValueError:
+        await callback.answer("Ошибка навигации", show_alert=True)
+        return
+
+    await callback.answer()
+    if direction == "prev":
+        await _render_subscriptions_page(callback.message, callback.from_user.id, edit=True, before_id=anchor_id)
+    else:
+        await _render_subscriptions_page(callback.message, callback.from_user.id, edit=True, after_id=anchor_id)
+
+@router.callback_query(F.data == "toggle_digest")
+async def toggle_digest(callback: CallbackQuery):
+    """Переключает режим уведомлений: по одному сообщению или дайджестом за цикл проверки."""
+    user_id = callback.from_user.id
+    enabled = not get_user_digest(user_id)
+    set_user_digest(user_id, enabled)
+    await callback.answer(
+        "Уведомления будут приходить одним сообщением за цикл проверки" if enabled
+        else "Уведомления будут приходить по одному"
+    )
+    await _render_subscriptions_page(callback.message, user_id, edit=True)
+
 @router.callback_query(F.data.startswith("edit_sub:"))
 async def edit_sub_handler(call: CallbackQuery, state: FSMContext):
     try:
         sub_id_str = call.data.split(":")[1]
         sub_id = int(sub_id_str)
-        subs = get_user_subscriptions(call.from_user.id)
-        sub = next((s for s in subs if s["id"] == sub_id), None)
+        sub = _get_user_subscription(call.from_user.id, sub_id)
         
         if not sub:
             await call.answer("Подписка не найдена", show_alert=True)
@@ -478,34 +686,12 @@ async def edit_sub_handler(call: CallbackQuery, state: FSMContext):
             "passengers": sub["passengers"]
         })
 
-        # Calculate current price for reference
-        current_price = 0
-        try:
-            d_obj = safe_parse_date(sub.get("depart_date"))
-            r_obj = safe_parse_date(sub.get("return_date"))
-            
-            if r_obj:
-                offers = await search_round_trip_fixed_stay(
-                    origin=sub["origin"],
-                    destination=sub["destination"],
-                    depart_date=d_obj,
-                    return_date=r_obj,
-                    passengers=sub["passengers"],
-                    days_flex=1
-                )
-                if offers:
-                    current_price = min(o["total_price"] for o in offers if o.get("total_price"))
-            elif d_obj:
-                results = await search_flights_for_dates(
-                    origin=sub["origin"],
-                    destination=sub["destination"],
-                    dates=[d_obj],
-                    limit_per_day=3
-                )
-                if results:
-                    current_price = int(float(results[0].get("price", 0)) * sub["passengers"])
-        except Exception:
-            current_price = 0
+        # Цена для кнопки берётся из снимка планировщика — без запросов к API.
+        # Устаревший или отсутствующий снимок обновляем в фоне.
+        current_price = int(sub["last_price"]) if sub.get("last_price") else 0
+        snapshot_age = _snapshot_age_seconds(sub.get("last_price_at"))
+        if snapshot_age is None or snapshot_age > PRICE_SNAPSHOT_MAX_AGE:
+            _schedule_snapshot_refresh(sub, call, state)
 
         if not current_price:
             if sub.get("last_notified_price"):
@@ -515,42 +701,48 @@ async def edit_sub_handler(call: CallbackQuery, state: FSMContext):
                 
         await state.update_data(current_price=current_price)
         
-        threshold = sub.get("threshold")
-        threshold_flag = sub.get("threshold_is_manual")
-        last_notified = sub.get("last_notified_price")
-
-        flag_text = "ручной" if threshold_flag else "динамический"
-        threshold_str = f"{threshold} RUB" if threshold else "—"
-        last_notified_str = f"{int(last_notified)} RUB" if last_notified else "—"
-
-        edit_text = (
-            f"Редактирование подписки:\n"
-            f"{sub['origin']} → {sub['destination']}\n"
-            f"Даты: {sub['depart_date']}" + (f" — {sub['return_date']}" if sub['return_date'] else "") + "\n"
-            f"Пассажиров: {sub['passengers']}\n\n"
-            f"Установленный триггер: {threshold_str} ({flag_text})\n"
-            f"Последняя найденная цена: {last_notified_str}\n\n"
-            "Введите новую цену (или нажмите 'Использовать текущую цену'):"
+        await call.message.edit_text(
+            _edit_sub_text(sub), parse_mode="HTML", reply_markup=_edit_sub_keyboard(sub, current_price)
         )
-
-        kb = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(
-                text=f"Использовать текущую цену: {int(current_price)} RUB",
-                callback_data=f"set_threshold_use:{sub_id}"
-            )],
-            [InlineKeyboardButton(
-                text="Ввести цену вручную",
-                callback_data=f"set_threshold_manual:{sub_id}"
-            )],
-            [InlineKeyboardButton(text="Отмена", callback_data="subscribe_cancel")]
-        ])
-
-        await call.message.edit_text(edit_text, parse_mode="HTML", reply_markup=kb)
         await call.answer()
     except Exception as e:
         await call.answer("Ошибка редактирования", show_alert=True)
         logger.exception("edit_sub_handler error: %s", e)
 
+@router.callback_query(F.data.startswith("sub_window:"))
+async def sub_window_handler(call: CallbackQuery, state: FSMContext):
+    """Меняет окно дат подписки: ± N дней от даты вылета или любая дата месяца вылета."""
+    try:
+        _, sub_id_str, value = call.data.split(":", 2)
+        sub = _get_user_subscription(call.from_user.id, int(sub_id_str))
+        if not sub:
+            await call.answer("Подписка не найдена", show_alert=True)
+            return
+
+        flex_days, _ = subscription_window(sub)
+        if value == WINDOW_MONTH:
+            depart = uncompact_date(sub["depart_date"])
+            if not depart:
+                await call.answer("Ошибка: не указана дата вылета", show_alert=True)
+                return
+            window_month = depart[:7]
+        else:
+            flex_days = int(value)
+            if flex_days not in WINDOW_OPTIONS:
+                await call.answer("Некорректное окно", show_alert=True)
+                return
+            window_month = None
+
+        update_subscription_window(sub["id"], flex_days, window_month)
+        sub = get_subscription_by_id(sub["id"])
+        st = await state.get_data()
+        current_price = st.get("current_price") or 0
+        await call.message.edit_reply_markup(reply_markup=_edit_sub_keyboard(sub, current_price))
+        await call.answer(f"Окно дат: {describe_window(flex_days, window_month)}")
+    except Exception as e:
+        logger.exception("sub_window_handler error: %s", e)
+        await call.answer("Ошибка изменения окна", show_alert=True)
+
 @router.callback_query(F.data.startswith("del_sub:"))
 async def del_sub_handler(callback: CallbackQuery):
     try:
@@ -558,8 +750,7 @@ async def del_sub_handler(callback: CallbackQuery):
         delete_subscription(sub_id)
         await callback.answer("Подписка удалена")
         
-        subs = get_user_subscriptions(callback.from_user.id)
-        if not subs:
+        if not get_user_subscriptions_count(callback.from_user.id):
             await callback.message.edit_text("Список подписок пуст.", reply_markup=start_inline_menu())
         else:
             # Re-render list
@@ -1,20 +1,44 @@
 # main.py
 import asyncio
 import logging
+from typing import List, Optional
 from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
 
-from config import BOT_TOKEN, ADMIN_ID
+from config import (
+    BOT_TOKEN,
+    ADMIN_ID,
+    RESPONSE_CACHE_FLUSH_SECONDS,
+    API_QUOTA_SYNC_SECONDS,
+    SHUTDOWN_TIMEOUT_SECONDS,
+    RUN_MODE,
+    LOOP_WATCHDOG_MS,
+    LOOP_WATCHDOG_REPORT_SECONDS,
+    TRAVELPAYOUTS_TOKEN,
+    LOG_MODE,
+    LOG_LEVEL,
+    LOG_SAMPLE_RATE,
+    LOG_FILE,
+)
 from handlers.start import router as start_router
 from handlers.search import router as search_router
 from handlers.subscription import router as sub_router
+from handlers.admin import router as admin_router
 from services.scheduler import check_subscriptions_task
+from services.autocomplete import build_index
+from services.travelpayouts import response_cache, price_table
+from services.metrics import run_loop_lag_probe
+from services.loop_watchdog import LoopWatchdog
+from services.log_setup import setup_logging
+from services.outbox import run_outbox_drainer
+from services.price_analytics import price_analytics
+from services.quota import api_quota
 from database import init_db, get_subscriptions_count
 from ui.keyboards import start_inline_menu
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+setup_logging(
+    LOG_MODE, LOG_LEVEL, LOG_SAMPLE_RATE, LOG_FILE or None,
+    secrets=(BOT_TOKEN, TRAVELPAYOUTS_TOKEN),
 )
 logger = logging.getLogger(__name__)
 
@@ -40,24 +64,82 @@ async def on_startup(bot: Bot):
     except Exception as e:
         logger.error(f"Failed to send startup message: {e}")
 
+async def on_shutdown(bot: Bot, scheduler_stop: asyncio.Event,
+                      scheduler_task: Optional[asyncio.Task], background_tasks: List[asyncio.Task],
+                      watchdog: Optional[LoopWatchdog] = None):
+    """Плавная остановка: дожидаемся текущей проверки подписки и сохраняем состояние."""
+    scheduler_stop.set()
+    if scheduler_task is not None:
+        logger.info("Shutting down: waiting for in-flight scheduler checks...")
+        try:
+            await asyncio.wait_for(scheduler_task, timeout=SHUTDOWN_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            logger.warning("Scheduler did not stop in time, cancelling")
+            scheduler_task.cancel()
+        except Exception as e:
+            logger.error(f"Scheduler task failed: {e}")
+
+    for task in background_tasks:
+        task.cancel()
+    if watchdog is not None:
+        watchdog.stop()
+    written = await response_cache.flush()
+    logger.info(f"Response cache flushed to disk: {written} entries")
+    written = await price_table.flush()
+    logger.info(f"Price table flushed to disk: {written} route-days")
+    await bot.session.close()
+
 async def run_bot():
     init_db()
+    # Индекс автодополнения городов строится один раз (единицы миллисекунд)
+    build_index()
     
+    # Кэш ответов API и таблица цен с диска — в пуле потоков, до первых запросов
+    await asyncio.gather(response_cache.preload(), price_table.preload())
+
     bot = Bot(token=BOT_TOKEN)
     dp = Dispatcher(storage=MemoryStorage())
 
     dp.include_router(start_router)
     dp.include_router(search_router)
     dp.include_router(sub_router)
+    dp.include_router(admin_router)
 
-    # Запускаем задачу планировщика
-    asyncio.create_task(check_subscriptions_task(bot))
+    # Запускаем задачу планировщика (RUN_MODE=bot — он работает отдельным процессом)
+    scheduler_stop = asyncio.Event()
+    scheduler_task = None
+    if RUN_MODE == "bot":
+        logger.info("Bot-only mode: scheduler runs separately (scheduler_main.py)")
+    else:
+        scheduler_task = asyncio.create_task(check_subscriptions_task(bot, scheduler_stop))
+    background_tasks = [
+        # Фоновое сохранение кэша ответов API и таблицы цен на диск
+        asyncio.create_task(response_cache.run_write_back(RESPONSE_CACHE_FLUSH_SECONDS)),
+        asyncio.create_task(price_table.run_write_back(RESPONSE_CACHE_FLUSH_SECONDS)),
+        # Уведомления от планировщика из отдельного процесса
+        asyncio.create_task(run_outbox_drainer(bot, scheduler_stop)),
+        # Общий с планировщиком учёт квоты API в БД
+        asyncio.create_task(api_quota.run_sync(API_QUOTA_SYNC_SECONDS)),
+        # Первый (полный) расчёт аналитики цен — до первого нажатия «Подписаться»
+        asyncio.create_task(price_analytics.ensure_fresh()),
+    ]
+    # Замер задержки event loop для /stats; сторож вдобавок ловит стек блокирующего кода
+    watchdog = None
+    if LOOP_WATCHDOG_MS > 0:
+        watchdog = LoopWatchdog(LOOP_WATCHDOG_MS, report_every=LOOP_WATCHDOG_REPORT_SECONDS)
+        watchdog.start()
+    else:
+        background_tasks.append(asyncio.create_task(run_loop_lag_probe()))
 
     # Уведомление о старте
     await on_startup(bot)
 
     logger.info("Starting polling...")
-    await dp.start_polling(bot)
+    try:
+        # Сессию бота закрываем сами — после того, как планировщик отправит последние уведомления
+        await dp.start_polling(bot, close_bot_session=False)
+    finally:
+        await on_shutdown(bot, scheduler_stop, scheduler_task, background_tasks, watchdog)
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,80 @@
+# scheduler_main.py
+"""
+Планировщик проверки подписок отдельным процессом. Бот при этом запускается
+с RUN_MODE=bot: процессы общаются только через БД — планировщик кладёт
+уведомления в очередь notification_outbox, бот их отправляет.
+Запуск: python scheduler_main.py
+"""
+import asyncio
+import logging
+import signal
+
+from config import (
+    BOT_TOKEN,
+    TRAVELPAYOUTS_TOKEN,
+    RESPONSE_CACHE_FLUSH_SECONDS,
+    API_QUOTA_SYNC_SECONDS,
+    LOOP_WATCHDOG_MS,
+    LOOP_WATCHDOG_REPORT_SECONDS,
+    LOG_MODE,
+    LOG_LEVEL,
+    LOG_SAMPLE_RATE,
+    LOG_FILE,
+)
+from database import init_db
+from services.loop_watchdog import LoopWatchdog
+from services.log_setup import setup_logging
+from services.outbox import OutboxSender
+from services.quota import api_quota
+from services.scheduler import check_subscriptions_task
+from services.travelpayouts import response_cache, price_table
+
+setup_logging(
+    LOG_MODE, LOG_LEVEL, LOG_SAMPLE_RATE, LOG_FILE or None,
+    secrets=(BOT_TOKEN, TRAVELPAYOUTS_TOKEN),
+)
+logger = logging.getLogger(__name__)
+
+
+async def run_scheduler():
+    init_db()
+    # Кэш ответов API и таблица цен с диска — в пуле потоков, до первого цикла проверки
+    await asyncio.gather(response_cache.preload(), price_table.preload())
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Windows: остановка по Ctrl+C через KeyboardInterrupt
+            pass
+
+    write_back_tasks = [
+        asyncio.create_task(response_cache.run_write_back(RESPONSE_CACHE_FLUSH_SECONDS)),
+        asyncio.create_task(price_table.run_write_back(RESPONSE_CACHE_FLUSH_SECONDS)),
+        asyncio.create_task(api_quota.run_sync(API_QUOTA_SYNC_SECONDS)),
+    ]
+    watchdog = None
+    if LOOP_WATCHDOG_MS > 0:
+        watchdog = LoopWatchdog(LOOP_WATCHDOG_MS, report_every=LOOP_WATCHDOG_REPORT_SECONDS)
+        watchdog.start()
+    logger.info("Starting standalone scheduler...")
+    try:
+        await check_subscriptions_task(OutboxSender(), stop)
+    finally:
+        for task in write_back_tasks:
+            task.cancel()
+        if watchdog is not None:
+            watchdog.stop()
+        written = await response_cache.flush()
+        logger.info(f"Response cache flushed to disk: {written} entries")
+        written = await price_table.flush()
+        logger.info(f"Price table flushed to disk: {written} route-days")
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(run_scheduler())
+    except KeyboardInterrupt:
+        logger.info("Scheduler stopped by user.")
@@ -0,0 +1,103 @@
+# services/autocomplete.py
+import logging
+import re
+import time
+from bisect import bisect_left
+from typing import List, Optional
+
+from services.iata import KIND_CITY, IataReference, Location, get_reference
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_SPLIT = re.compile(r"[\s\-()]+")
+
+
+def normalize_query(text: str) -> str:
+    return (text or "").strip().lower().replace("ё", "е")
+
+
+class PrefixIndex:
+    """
+    Префиксный индекс по названиям городов/аэропортов (RU/EN) и их кодам:
+    отсортированный массив ключей и параллельный массив кодов, поиск — bisect.
+    Каждое слово названия тоже ключ: «петербург» находит Санкт-Петербург.
+    """
+
+    def __init__(self, reference: IataReference):
+        self._reference = reference
+        pairs = set()
+        for loc in reference.locations.values():
+            pairs.add((loc.code.lower(), loc.code))
+            for name in (loc.name_ru, loc.name_en):
+                full = normalize_query(name)
+                pairs.add((full, loc.code))
+                for token in _TOKEN_SPLIT.split(full):
+                    if token:
+                        pairs.add((token, loc.code))
+        ordered = sorted(pairs)
+        self._keys = [k for k, _ in ordered]
+        self._codes = [c for _, c in ordered]
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def search(self, query: str, limit: int = 6) -> List[Location]:
+        prefix = normalize_query(query)
+        if not prefix:
+            return []
+        found = {}
+        i = bisect_left(self._keys, prefix)
+        while i < len(self._keys) and self._keys[i].startswith(prefix):
+            code = self._codes[i]
+            exact = self._keys[i] == prefix
+            found[code] = found.get(code, False) or exact
+            i += 1
+
+        locations = self._reference.locations
+
+        def rank(code: str):
+            loc = locations[code]
+            # точное совпадение, затем города раньше аэропортов, затем короткие названия
+            return (not found[code], loc.kind != KIND_CITY, len(loc.name_ru), code)
+
+        return [locations[c] for c in sorted(found, key=rank)[:limit]]
+
+
+_index: Optional[PrefixIndex] = None
+
+
+def build_index() -> PrefixIndex:
+    """Строит индекс (вызывается один раз при старте бота) и логирует время сборки."""
+    global _index
+    started = time.perf_counter()
+    _index = PrefixIndex(get_reference())
+    logger.info(
+        f"🔤 Индекс автодополнения построен: {len(_index)} ключей "
+        f"за {(time.perf_counter() - started) * 1000:.1f} мс"
+    )
+    return _index
+
+
+def suggest_locations(query: str, limit: int = 6) -> List[Location]:
+    index = _index or build_index()
+    return index.search(query, limit)
+
+
+def _one_typo_apart(a: str, b: str) -> bool:
+    """Коды одной длины, отличающиеся одной буквой или перестановкой соседних букв."""
+    diff = [i for i in range(len(a)) if a[i] != b[i]]
+    if len(diff) == 1:
+        return True
+    return len(diff) == 2 and diff[1] == diff[0] + 1 and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]]
+
+
+def similar_codes(code: str, limit: int = 5) -> List[Location]:
+    """Коды справочника на одну опечатку от code (для «возможно, вы имели в виду»)."""
+    code = code.upper()
+    reference = get_reference()
+    found = [
+        loc for loc in reference.locations.values()
+        if len(loc.code) == len(code) and loc.code != code and _one_typo_apart(loc.code, code)
+    ]
+    found.sort(key=lambda loc: (loc.kind != KIND_CITY, loc.code))
+    return found[:limit]
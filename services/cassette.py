@@ -0,0 +1,110 @@
+# services/cassette.py
+import asyncio
+import atexit
+import gzip
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+
+# Ключ записи: (origin, destination, departure_at, limit) — без токена
+CassetteKey = Tuple[str, str, str, int]
+
+
+class Recording(NamedTuple):
+    body: bytes
+    elapsed: float  # сколько секунд отвечал API при записи
+
+
+class Cassette:
+    """
+    Архив ответов Travelpayouts: gzip-файл со строками JSON
+    {"key": [...], "elapsed": 0.123, "body": "<тело ответа>"}.
+    В режиме record новые ответы копятся в памяти и дописываются в архив
+    пачками (отдельными gzip-блоками, в пуле потоков) и при выходе из процесса.
+    В режиме replay архив читается целиком при первом обращении; при
+    повторе ключа берётся последняя запись.
+    """
+
+    def __init__(self, path: str, mode: str, flush_every: int = 50):
+        if mode not in (MODE_RECORD, MODE_REPLAY):
+            raise ValueError(f"Неизвестный режим кассеты: {mode}")
+        self.path = path
+        self.mode = mode
+        self.flush_every = flush_every
+        self._recordings: Optional[Dict[CassetteKey, Recording]] = None
+        self._pending: List[str] = []
+        # Пачки пишутся из разных потоков пула — дописываем в архив по очереди
+        self._write_lock = threading.Lock()
+        if mode == MODE_RECORD:
+            atexit.register(self._flush_at_exit)
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == MODE_REPLAY
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == MODE_RECORD
+
+    def _load(self) -> Dict[CassetteKey, Recording]:
+        recordings: Dict[CassetteKey, Recording] = {}
+        if not os.path.exists(self.path):
+            logger.warning(f"📼 Кассета {self.path} не найдена — все запросы будут промахами")
+            return recordings
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                origin, destination, departure_at, limit = item["key"]
+                recordings[(origin, destination, departure_at, int(limit))] = Recording(
+                    item["body"].encode("utf-8"), float(item.get("elapsed", 0.0))
+                )
+        logger.info(f"📼 Кассета {self.path}: {len(recordings)} ответов")
+        return recordings
+
+    def lookup(self, key: CassetteKey) -> Optional[Recording]:
+        if self._recordings is None:
+            self._recordings = self._load()
+        return self._recordings.get(key)
+
+    async def record(self, key: CassetteKey, body: bytes, elapsed: float) -> None:
+        self._pending.append(json.dumps(
+            {"key": list(key), "elapsed": round(elapsed, 4), "body": body.decode("utf-8")},
+            ensure_ascii=False,
+        ))
+        if len(self._pending) >= self.flush_every:
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Дописывает накопленные ответы в архив в пуле потоков, не блокируя event loop."""
+        if not self._pending:
+            return
+        lines, self._pending = self._pending, []
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._write, lines)
+        except OSError as e:
+            logger.warning(f"📼 Не удалось дописать кассету {self.path}: {e}")
+            self._pending[:0] = lines
+
+    def _flush_at_exit(self) -> None:
+        # event loop к этому моменту уже остановлен — пишем синхронно
+        lines, self._pending = self._pending, []
+        if lines:
+            self._write(lines)
+
+    def _write(self, lines: List[str]) -> None:
+        with self._write_lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Каждая пачка — отдельный gzip-блок; gzip читает такие файлы как один поток
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
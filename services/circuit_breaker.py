@@ -0,0 +1,79 @@
+# services/circuit_breaker.py
+import logging
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Размыкает цепь после failure_threshold неудачных запросов подряд и
+    не пропускает трафик reset_timeout секунд. Затем переходит в полуоткрытое
+    состояние и пропускает один пробный запрос (остальные отклоняются, пока он
+    не завершится; зависший пробный запрос через reset_timeout заменяется новым):
+    успех замыкает цепь, неудача — снова размыкает.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = float(reset_timeout)
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_started_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == self.OPEN
+
+    def allow_request(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.OPEN:
+            return False
+        now = time.monotonic()
+        if self._probe_started_at is not None and now - self._probe_started_at < self.reset_timeout:
+            return False
+        self._probe_started_at = now
+        return True
+
+    def retry_after(self) -> float:
+        """Сколько секунд осталось до полуоткрытого состояния."""
+        if self._opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def record_success(self) -> None:
+        if self._opened_at is not None:
+            logger.info(f"🟢 Circuit '{self.name}': API снова отвечает, цепь замкнута")
+        self._failures = 0
+        self._opened_at = None
+        self._probe_started_at = None
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        state = self.state
+        if state == self.OPEN:
+            # Запоздавшие ответы запросов, начатых до размыкания, не продлевают паузу
+            return
+        if state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            logger.warning(
+                f"🔴 Circuit '{self.name}': {self._failures} ошибок подряд, "
+                f"запросы приостановлены на {int(self.reset_timeout)}с"
+            )
+            self._opened_at = time.monotonic()
+            self._probe_started_at = None
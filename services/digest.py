@@ -0,0 +1,62 @@
+# services/digest.py
+from typing import Dict, List, NamedTuple, Tuple
+
+# Максимальная длина текста сообщения Telegram
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+
+class Alert(NamedTuple):
+    """Сработавшее уведомление по подписке, ожидающее отправки в дайджесте."""
+    sub: dict
+    price: int
+    text: str
+
+
+class DigestBuffer:
+    """
+    Накопитель уведомлений по пользователям. Пользователь «созрел» для отправки,
+    когда с момента его первого уведомления прошло window секунд
+    (или в конце цикла планировщика — см. users()).
+    """
+
+    def __init__(self, window: float):
+        self.window = window
+        self._alerts: Dict[int, List[Alert]] = {}
+        self._first_at: Dict[int, float] = {}
+
+    def add(self, user_id: int, alert: Alert, now: float) -> None:
+        self._alerts.setdefault(user_id, []).append(alert)
+        self._first_at.setdefault(user_id, now)
+
+    def due_users(self, now: float) -> List[int]:
+        return [u for u, first in self._first_at.items() if now - first >= self.window]
+
+    def users(self) -> List[int]:
+        return list(self._alerts)
+
+    def pop(self, user_id: int) -> List[Alert]:
+        self._first_at.pop(user_id, None)
+        return self._alerts.pop(user_id, [])
+
+    def __len__(self) -> int:
+        return sum(len(a) for a in self._alerts.values())
+
+
+def split_digest(header: str, alerts: List[Alert], limit: int = TELEGRAM_MESSAGE_LIMIT) -> List[Tuple[str, List[Alert]]]:
+    """
+    Собирает уведомления в сообщения не длиннее limit: блоки не разрываются,
+    новое сообщение начинается, только когда следующий блок не помещается.
+    Возвращает (текст, уведомления в нём) — чтобы отметить отправленными ровно их.
+    """
+    messages: List[Tuple[str, List[Alert]]] = []
+    text, included = header, []
+    for alert in alerts:
+        block = "\n\n" + alert.text
+        if included and len(text) + len(block) > limit:
+            messages.append((text, included))
+            text, included = header, []
+        text += block
+        included.append(alert)
+    if included:
+        messages.append((text, included))
+    return messages
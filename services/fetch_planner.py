@@ -0,0 +1,94 @@
+# services/fetch_planner.py
+import calendar
+from datetime import date, timedelta
+from typing import Dict, List, NamedTuple, Optional, Set, Union
+
+from config import MONTH_QUERY_MIN_COVERAGE, MONTH_QUERY_LIMIT, MONTH_REFETCH_MAX_DAYS
+
+
+class FetchPlan(NamedTuple):
+    """
+    Набор запросов к API для окна дат: отдельные дни (day_dates) и целые месяцы
+    (months, 'YYYY-MM'). window — все даты окна, по ним фильтруются ответы месячных запросов.
+    """
+    day_dates: List[date]
+    months: List[str]
+    window: Set[str]
+
+    def window_days(self, month: str) -> List[str]:
+        """Даты окна в месяце 'YYYY-MM' по порядку."""
+        return sorted(w for w in self.window if w.startswith(month))
+
+    @property
+    def cost(self) -> int:
+        """Верхняя оценка числа запросов — с добором дней обрезанных месячных ответов."""
+        refetch = sum(min(MONTH_REFETCH_MAX_DAYS, len(self.window_days(m))) for m in self.months)
+        return len(self.day_dates) + len(self.months) + refetch
+
+
+def plan_window(
+    dates: List[date],
+    min_coverage: float = MONTH_QUERY_MIN_COVERAGE,
+    today: Optional[date] = None,
+) -> FetchPlan:
+    """
+    Для каждого месяца окна: по запросу на дату или один запрос на месяц.
+    Месячный запрос отдаёт самые дешёвые варианты всего месяца, а не по
+    limit_per_day на каждый день, — дни окна могли бы не попасть в ответ.
+    Поэтому он берётся, только когда окно покрывает не меньше min_coverage
+    оставшихся дней месяца (например, подписка на весь месяц).
+    """
+    by_month: Dict[str, List[date]] = {}
+    for d in sorted(set(dates)):
+        by_month.setdefault(d.strftime("%Y-%m"), []).append(d)
+
+    day_dates: List[date] = []
+    months: List[str] = []
+    for month, days in by_month.items():
+        remaining = len(month_dates(month, today))
+        if len(days) > 1 and len(days) >= min_coverage * remaining:
+            months.append(month)
+        else:
+            day_dates.extend(days)
+
+    window = {d.strftime("%Y-%m-%d") for ds in by_month.values() for d in ds}
+    return FetchPlan(day_dates, months, window)
+
+
+def month_limit(limit_per_day: int, days_in_window: int) -> int:
+    """Сколько записей просить у месячного запроса, чтобы покрыть окно."""
+    return max(limit_per_day, min(MONTH_QUERY_LIMIT, limit_per_day * days_in_window))
+
+
+def month_dates(month: str, today: Optional[date] = None) -> List[date]:
+    """Все ещё не прошедшие даты месяца 'YYYY-MM'."""
+    year, mon = int(month[:4]), int(month[5:7])
+    today = today or date.today()
+    days = calendar.monthrange(year, mon)[1]
+    return [d for d in (date(year, mon, day) for day in range(1, days + 1)) if d >= today]
+
+
+def window_dates(
+    anchor: Optional[date],
+    flex_days: int,
+    window_month: Optional[str] = None,
+    today: Optional[date] = None,
+) -> List[date]:
+    """
+    Даты окна подписки: «любая дата месяца» (window_month) либо anchor ± flex_days.
+    Прошедшие даты отбрасываются.
+    """
+    today = today or date.today()
+    if window_month:
+        return month_dates(window_month, today)
+    if anchor is None:
+        return []
+    flex_days = max(0, int(flex_days))
+    dates = [anchor + timedelta(days=shift) for shift in range(-flex_days, flex_days + 1)]
+    return [d for d in dates if d >= today]
+
+
+def describe_window(flex_days: Union[int, None], window_month: Optional[str] = None) -> str:
+    if window_month:
+        return f"весь {window_month}"
+    return f"±{int(flex_days or 0)} дн."
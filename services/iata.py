@@ -0,0 +1,120 @@
+# services/iata.py
+import logging
+import os
+import sys
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+REFERENCE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "data",
+    "iata_reference.tsv",
+)
+
+KIND_CITY = "C"
+KIND_AIRPORT = "A"
+KIND_AIRLINE = "L"
+
+
+class Location(NamedTuple):
+    """Город (в т.ч. мультиаэропортовый, например MOW) или аэропорт."""
+    kind: str
+    code: str
+    city_code: str
+    country: str
+    name_ru: str
+    name_en: str
+
+
+class Airline(NamedTuple):
+    code: str
+    country: str
+    name_ru: str
+    name_en: str
+
+
+class IataReference:
+    """
+    Таблицы поиска по справочнику. Записи — кортежи (NamedTuple),
+    повторяющиеся строки (страны, коды городов) интернированы.
+    """
+
+    def __init__(self, locations: Dict[str, Location], airlines: Dict[str, Airline]):
+        self.locations = locations
+        self.airlines = airlines
+        self._airports_by_city: Dict[str, List[str]] = {}
+        for loc in locations.values():
+            if loc.kind == KIND_AIRPORT:
+                self._airports_by_city.setdefault(loc.city_code, []).append(loc.code)
+
+    def airports_of(self, city_code: str) -> List[str]:
+        return self._airports_by_city.get(city_code, [])
+
+
+def load_reference(path: str = REFERENCE_PATH) -> IataReference:
+    locations: Dict[str, Location] = {}
+    airlines: Dict[str, Airline] = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            kind, code, city, country, name_ru, name_en = line.rstrip("\n").split("\t")
+            code = sys.intern(code)
+            country = sys.intern(country)
+            if kind == KIND_AIRLINE:
+                airlines[code] = Airline(code, country, name_ru, name_en)
+            else:
+                locations[code] = Location(sys.intern(kind), code, sys.intern(city), country, name_ru, name_en)
+    return IataReference(locations, airlines)
+
+
+_reference: Optional[IataReference] = None
+
+
+def get_reference() -> IataReference:
+    """Справочник загружается при первом обращении, а не при старте бота."""
+    global _reference
+    if _reference is None:
+        started = time.perf_counter()
+        _reference = load_reference()
+        logger.info(
+            f"📚 Справочник IATA загружен: {len(_reference.locations)} городов/аэропортов, "
+            f"{len(_reference.airlines)} авиакомпаний за {(time.perf_counter() - started) * 1000:.1f} мс"
+        )
+    return _reference
+
+
+def normalize_code(text: str) -> str:
+    return (text or "").strip().upper()
+
+
+def resolve_location(code: str) -> Optional[Location]:
+    return get_reference().locations.get(normalize_code(code))
+
+
+def is_known_location(code: str) -> bool:
+    return resolve_location(code) is not None
+
+
+def is_code_format(text: str) -> bool:
+    """Три латинские буквы — похоже на код IATA (справочник неполный, его не проверяем)."""
+    text = (text or "").strip()
+    return len(text) == 3 and text.isascii() and text.isalpha()
+
+
+def location_name(code: str) -> str:
+    """«Москва (MOW)», «Шереметьево, Москва (SVO)» или сам код, если его нет в справочнике."""
+    loc = resolve_location(code)
+    if loc is None:
+        return normalize_code(code)
+    if loc.kind == KIND_AIRPORT:
+        city = get_reference().locations.get(loc.city_code)
+        if city:
+            return f"{loc.name_ru}, {city.name_ru} ({loc.code})"
+    return f"{loc.name_ru} ({loc.code})"
+
+
+def resolve_airline(code: str) -> Optional[Airline]:
+    return get_reference().airlines.get(normalize_code(code))
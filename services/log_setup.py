@@ -0,0 +1,155 @@
+# services/log_setup.py
+import atexit
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+from collections.abc import Mapping
+from datetime import date
+from typing import Dict, Iterable, Optional
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+# Значения query-параметров, которые нельзя писать в лог
+_SECRET_PARAM = re.compile(r"((?:token|api_key|key)=)[^&\s\"']+", re.IGNORECASE)
+
+
+def sampled(**fields) -> dict:
+    """
+    extra для частых (на каждый запрос/подписку) записей: в structured-режиме
+    в лог попадает только доля LOG_SAMPLE_RATE таких записей.
+    """
+    return {"sample": True, "fields": fields}
+
+
+def kv(**fields) -> dict:
+    """extra со структурированными полями записи (key=value в structured-режиме)."""
+    return {"fields": fields}
+
+
+class RedactFilter(logging.Filter):
+    """Вырезает секреты (токены из config и token=... в URL) из текста записи."""
+
+    def __init__(self, secrets: Iterable[Optional[str]]):
+        super().__init__()
+        self.secrets = [s for s in secrets if s]
+
+    def redact(self, text: str) -> str:
+        for secret in self.secrets:
+            text = text.replace(secret, "***")
+        return _SECRET_PARAM.sub(r"\1***", text)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        message = self.redact(record.getMessage())
+        record.msg, record.args = message, None
+        fields = getattr(record, "fields", None)
+        if fields:
+            record.fields = {k: self.redact(str(v)) for k, v in fields.items()}
+        return True
+
+
+class SampleFilter(logging.Filter):
+    """Пропускает долю rate записей с extra=sampled(...); остальные — всегда."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "sample", False):
+            return True
+        return random.random() < self.rate
+
+
+class KeyValueFormatter(logging.Formatter):
+    """Строка лога: ts=... level=... logger=... msg="..." поле=значение ..."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        parts = [
+            f"ts={self.formatTime(record, '%Y-%m-%dT%H:%M:%S')}.{int(record.msecs):03d}",
+            f"level={record.levelname}",
+            f"logger={record.name}",
+            f"msg={_quote(record.getMessage())}",
+        ]
+        fields: Dict = getattr(record, "fields", None) or {}
+        parts.extend(f"{key}={_quote(value)}" for key, value in fields.items())
+        line = " ".join(parts)
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+def _quote(value) -> str:
+    text = str(value)
+    if not text or any(c in text for c in ' "=\n'):
+        return '"' + text.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+    return text
+
+
+# Аргументы, которые безопасно форматировать позже в другом потоке
+_IMMUTABLE_ARGS = (str, int, float, bool, bytes, type(None), date)
+
+
+def _frozen(args) -> bool:
+    # Единственный аргумент-словарь logging кладёт в args как есть
+    if isinstance(args, Mapping):
+        return False
+    return all(isinstance(value, _IMMUTABLE_ARGS) for value in args or ())
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler без форматирования в вызывающем потоке: запись с простыми
+    аргументами (строки, числа, даты) уходит в очередь как есть, сообщение
+    собирается (и редактируется) в потоке QueueListener. Записи с изменяемыми
+    аргументами (dict, list, объекты) форматируются сразу — к моменту записи
+    в потоке listener вызывающий код может их уже поменять.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if not _frozen(record.args):
+            record.msg, record.args = record.getMessage(), None
+        return record
+
+
+def _stop_listener(listener: logging.handlers.QueueListener) -> None:
+    # Повторный stop (уже остановлен вручную) в Python < 3.12 падает
+    if listener._thread is not None:
+        listener.stop()
+
+
+def setup_logging(
+    mode: str = "text",
+    level: str = "INFO",
+    sample_rate: float = 1.0,
+    log_file: Optional[str] = None,
+    secrets: Iterable[Optional[str]] = (),
+) -> Optional[logging.handlers.QueueListener]:
+    """
+    text — прежний режим: basicConfig, запись в потоке вызывающего кода.
+    structured — key=value строки, запись на диск в отдельном потоке через
+    QueueHandler/QueueListener, сэмплирование частых записей.
+    Секреты вырезаются в обоих режимах. Возвращает QueueListener
+    (structured; останавливается при выходе из процесса) или None.
+    """
+    target = logging.FileHandler(log_file, encoding="utf-8") if log_file else logging.StreamHandler(sys.stderr)
+    target.addFilter(RedactFilter(secrets))
+    root = logging.getLogger()
+    root.setLevel(getattr(logging, level.upper(), logging.INFO))
+
+    if mode != "structured":
+        target.setFormatter(logging.Formatter(LOG_FORMAT))
+        root.addHandler(target)
+        return None
+
+    target.setFormatter(KeyValueFormatter())
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    handler = _DeferredQueueHandler(log_queue)
+    handler.addFilter(SampleFilter(sample_rate))
+    root.addHandler(handler)
+    listener = logging.handlers.QueueListener(log_queue, target, respect_handler_level=True)
+    listener.start()
+    atexit.register(_stop_listener, listener)
+    return listener
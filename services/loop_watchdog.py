@@ -0,0 +1,95 @@
+# services/loop_watchdog.py
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Сколько последних замеров задержки хранить для перцентилей
+LAG_SAMPLES = 3000
+
+
+class LoopWatchdog:
+    """
+    Сторож event loop. Задача в самом loop каждые interval секунд отмечает
+    «пульс» и пишет задержку своего пробуждения в метрику loop.lag_ms.
+    Отдельный поток следит за пульсом: если loop не отвечает дольше
+    threshold_ms, поток снимает стек потока loop (sys._current_frames) —
+    это и есть блокирующий код — и пишет его в лог. Один отчёт на
+    зависание и не чаще раза в report_every секунд; остальные только
+    считаются (метрика loop.stalls).
+    """
+
+    def __init__(self, threshold_ms: float, interval: float = 0.1, report_every: float = 60.0):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval
+        self.report_every = report_every
+        self._beat = time.monotonic()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._last_report = float("-inf")
+        self._suppressed = 0
+
+    def start(self) -> None:
+        """Запускается из потока event loop."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._task = self._loop.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(f"🐕 Сторож event loop запущен (порог {self.threshold * 1000:.0f} мс)")
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _heartbeat(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self._beat = time.monotonic()
+            metrics.observe("loop.lag_ms", max(0.0, (loop.time() - expected) * 1000), samples=LAG_SAMPLES)
+
+    def _count_stall(self) -> None:
+        # Метрики не потокобезопасны (их читает /stats в loop) — счётчик меняем
+        # в самом loop: инкремент выполнится, когда loop отвиснет
+        try:
+            self._loop.call_soon_threadsafe(metrics.inc, "loop.stalls")
+        except RuntimeError:
+            pass  # loop уже закрыт
+
+    def _watch(self) -> None:
+        reported = False
+        while not self._stopped.wait(self.interval / 2):
+            stalled = time.monotonic() - self._beat - self.interval
+            if stalled < self.threshold:
+                reported = False
+                continue
+            if reported:
+                continue
+            reported = True
+            self._count_stall()
+            now = time.monotonic()
+            if now - self._last_report < self.report_every:
+                self._suppressed += 1
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "<стек недоступен>\n"
+            logger.warning(
+                f"🐢 Event loop заблокирован уже {stalled * 1000:.0f} мс "
+                f"(пропущено отчётов с прошлого раза: {self._suppressed}). Стек блокирующего кода:\n{stack}"
+            )
+            self._last_report = now
+            self._suppressed = 0
@@ -0,0 +1,117 @@
+# services/metrics.py
+import asyncio
+import resource
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+# Счётчики хранятся поминутными корзинами за последний час
+BUCKET_SECONDS = 60
+BUCKETS = 60
+
+
+class RollingCounter:
+    """Счётчик событий со скользящим окном (до часа), поминутные корзины."""
+
+    __slots__ = ("_buckets", "total")
+
+    def __init__(self):
+        self._buckets: Deque[list] = deque()  # [начало корзины, количество]
+        self.total = 0
+
+    def add(self, n: int = 1, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        start = now - now % BUCKET_SECONDS
+        if self._buckets and self._buckets[-1][0] == start:
+            self._buckets[-1][1] += n
+        else:
+            self._buckets.append([start, n])
+            while len(self._buckets) > BUCKETS:
+                self._buckets.popleft()
+        self.total += n
+
+    def count(self, window: float, now: Optional[float] = None) -> int:
+        now = time.monotonic() if now is None else now
+        return sum(c for start, c in self._buckets if start > now - window - BUCKET_SECONDS)
+
+
+class MetricsRegistry:
+    """
+    Метрики процесса в памяти: счётчики (inc), значения (set_gauge/add_gauge)
+    и последние наблюдения (observe). Читаются командой /stats.
+    """
+
+    def __init__(self, samples: int = 200):
+        self._samples = samples
+        self.counters: Dict[str, RollingCounter] = {}
+        self.gauges: Dict[str, float] = {}
+        self.observations: Dict[str, Deque[float]] = {}
+
+    def inc(self, name: str, n: int = 1) -> None:
+        counter = self.counters.get(name)
+        if counter is None:
+            counter = self.counters[name] = RollingCounter()
+        counter.add(n)
+
+    def count(self, name: str, window: float) -> int:
+        counter = self.counters.get(name)
+        return counter.count(window) if counter else 0
+
+    def set_gauge(self, name: str, value: float) -> None:
+        self.gauges[name] = value
+
+    def add_gauge(self, name: str, delta: float) -> None:
+        self.gauges[name] = self.gauges.get(name, 0) + delta
+
+    def gauge(self, name: str, default: float = 0) -> float:
+        return self.gauges.get(name, default)
+
+    def observe(self, name: str, value: float, samples: Optional[int] = None) -> None:
+        """samples — сколько последних наблюдений хранить (задаётся при первом вызове)."""
+        values = self.observations.get(name)
+        if values is None:
+            values = self.observations[name] = deque(maxlen=samples or self._samples)
+        values.append(value)
+
+    def last(self, name: str) -> Optional[float]:
+        values = self.observations.get(name)
+        return values[-1] if values else None
+
+    def mean(self, name: str) -> Optional[float]:
+        values = self.observations.get(name)
+        return sum(values) / len(values) if values else None
+
+    def max(self, name: str) -> Optional[float]:
+        values = self.observations.get(name)
+        return max(values) if values else None
+
+    def percentile(self, name: str, q: float) -> Optional[float]:
+        values = self.observations.get(name)
+        if not values:
+            return None
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+metrics = MetricsRegistry()
+
+
+def process_rss_mb() -> float:
+    """RSS процесса в МБ (без /proc — пиковый RSS)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def run_loop_lag_probe(interval: float = 0.5) -> None:
+    """Фоновая задача: насколько позже запланированного просыпается event loop (мс)."""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        metrics.observe("loop.lag_ms", max(0.0, (loop.time() - expected) * 1000))
@@ -0,0 +1,74 @@
+# services/outbox.py
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+
+from config import OUTBOX_POLL_SECONDS, OUTBOX_MAX_ATTEMPTS
+from database import (
+    enqueue_notification,
+    get_pending_notifications,
+    delete_notification,
+    defer_notification,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxSender:
+    """
+    Замена Bot для планировщика в отдельном процессе: send_message не ходит
+    в Telegram, а кладёт сообщение в очередь notification_outbox. Запись в
+    БД — и есть «доставка» для планировщика; отправляет её процесс бота.
+    """
+
+    async def send_message(self, chat_id: int, text: str, parse_mode: Optional[str] = None) -> int:
+        return enqueue_notification(chat_id, text, parse_mode)
+
+
+def _retry_delay(attempts: int) -> float:
+    return min(600.0, OUTBOX_POLL_SECONDS * (2 ** attempts))
+
+
+async def deliver_pending(bot: Bot, limit: int = 50) -> int:
+    """Отправляет уведомления из очереди, которым пора уйти. Возвращает число отправленных."""
+    sent = 0
+    for item in get_pending_notifications(time.time(), limit):
+        try:
+            await bot.send_message(chat_id=item["user_id"], text=item["text"], parse_mode=item["parse_mode"])
+        except TelegramRetryAfter as e:
+            # Лимит Telegram общий для всего бота — прекращаем проход до следующего
+            defer_notification(item["id"], str(e), time.time() + e.retry_after)
+            logger.warning(f"📮 Telegram просит подождать {e.retry_after}с, очередь уведомлений на паузе")
+            break
+        except TelegramForbiddenError as e:
+            # Пользователь заблокировал бота — повторять бессмысленно
+            delete_notification(item["id"])
+            logger.warning(f"📮 Уведомление #{item['id']} пользователю {item['user_id']} отброшено: {e}")
+            continue
+        except Exception as e:
+            if item["attempts"] + 1 >= OUTBOX_MAX_ATTEMPTS:
+                delete_notification(item["id"])
+                logger.error(f"📮 Уведомление #{item['id']} не отправлено за {OUTBOX_MAX_ATTEMPTS} попыток: {e}")
+            else:
+                defer_notification(item["id"], str(e), time.time() + _retry_delay(item["attempts"]))
+                logger.warning(f"📮 Ошибка отправки уведомления #{item['id']}, повтор позже: {e}")
+            continue
+        delete_notification(item["id"])
+        sent += 1
+    return sent
+
+
+async def run_outbox_drainer(bot: Bot, stop: Optional[asyncio.Event] = None) -> None:
+    """Фоновая задача бота: отправляет уведомления, поставленные планировщиком в очередь."""
+    while stop is None or not stop.is_set():
+        try:
+            sent = await deliver_pending(bot)
+            if sent:
+                logger.info(f"📮 Отправлено уведомлений из очереди: {sent}")
+        except Exception as e:
+            logger.exception(f"Ошибка обработки очереди уведомлений: {e}")
+        await asyncio.sleep(OUTBOX_POLL_SECONDS)
@@ -0,0 +1,44 @@
+# services/pacing.py
+import zlib
+from typing import Callable, Dict, List, NamedTuple
+
+
+def stable_offset(sub_id) -> float:
+    """Доля интервала [0, 1) для подписки: одна и та же между циклами и рестартами."""
+    return zlib.crc32(str(sub_id).encode()) / 2 ** 32
+
+
+class CyclePlan(NamedTuple):
+    """
+    Расписание цикла: длительность (секунды), смещение старта проверки каждой
+    подписки от начала цикла и ожидаемое число запросов к API.
+    """
+    cycle_seconds: float
+    offsets: Dict[int, float]
+    calls: int
+
+    @property
+    def calls_per_minute(self) -> float:
+        return self.calls * 60 / self.cycle_seconds if self.cycle_seconds else 0.0
+
+
+def plan_cycle(
+    subs: List[dict],
+    interval: float,
+    budget_per_hour: float,
+    cost: Callable[[dict], int],
+) -> CyclePlan:
+    """
+    Раскладывает проверки подписок по циклу. Цикл длится interval секунд, но
+    если запросов больше, чем позволяет бюджет API за это время, цикл
+    растягивается до calls / (budget_per_hour / 3600). Смещение каждой
+    подписки — хэш её id, поэтому нагрузка распределена по циклу равномерно,
+    а у каждой подписки свой постоянный «слот».
+    """
+    calls = sum(cost(sub) for sub in subs)
+    cycle = float(interval)
+    rate = budget_per_hour / 3600
+    if rate > 0 and calls / rate > cycle:
+        cycle = calls / rate
+    offsets = {sub.get('id'): stable_offset(sub.get('id')) * cycle for sub in subs}
+    return CyclePlan(cycle, offsets, calls)
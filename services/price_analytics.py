@@ -0,0 +1,282 @@
+# services/price_analytics.py
+"""
+Аналитика цен по истории наблюдений (route_price_history) для подсказок
+целевой цены. Все маршруты считаются разом на массивах NumPy: наблюдения
+один раз сортируются по (маршрут, цена), перцентили групп берутся
+индексами — без цикла по маршрутам. numpy — необязательная зависимость: без него
+подсказок просто нет.
+"""
+import asyncio
+import logging
+import time
+from datetime import date
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # подсказки целевой цены — необязательная функция
+    np = None
+
+from config import (
+    PRICE_TABLE_DB,
+    PRICE_HISTORY_DAYS,
+    ANALYTICS_WINDOW_DAYS,
+    ANALYTICS_REFRESH_SECONDS,
+    ANALYTICS_MIN_DAYS,
+)
+from services.price_table import PriceTableStore
+
+logger = logging.getLogger(__name__)
+
+Route = Tuple[str, str]
+
+# Границы корзин «за сколько дней до вылета» (дни): 0–7, 8–14, 15–30, 31–60, 61+
+LEAD_BUCKETS = (7, 14, 30, 60)
+# Сколько наблюдений нужно в группе (день недели / корзина), чтобы ей доверять
+MIN_GROUP_OBSERVATIONS = 3
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+class RouteStats(NamedTuple):
+    """
+    Цены маршрута за окно наблюдений (в одну сторону, на пассажира):
+    перцентили p10/p25/p50, поправки к медиане по дню недели вылета (7,
+    пн = 0) и по корзине срока до вылета (len(LEAD_BUCKETS) + 1).
+    """
+    observations: int
+    p10: float
+    p25: float
+    p50: float
+    weekday_factor: Tuple[float, ...]
+    lead_factor: Tuple[float, ...]
+
+    def factor(self, depart: date, today: date) -> float:
+        lead = max(0, (depart - today).days)
+        bucket = sum(lead > edge for edge in LEAD_BUCKETS)
+        return self.weekday_factor[depart.weekday()] * self.lead_factor[bucket]
+
+    def good_deal(self, depart: date, today: date) -> float:
+        """«Выгодная» цена на дату: p25 с поправкой на день недели и срок до вылета."""
+        return min(self.p50, max(self.p10, self.p25 * self.factor(depart, today)))
+
+
+class RouteStatsTable(NamedTuple):
+    """
+    Статистика всех маршрутов массивами (строка — номер маршрута).
+    RouteStats собирается только для запрошенного маршрута.
+    """
+    observations: "np.ndarray"     # (n_routes,)
+    eligible: "np.ndarray"         # (n_routes,) bool — хватает данных для подсказок
+    percentiles: "np.ndarray"      # (n_routes, 3): p10, p25, p50
+    weekday_factor: "np.ndarray"   # (n_routes, 7)
+    lead_factor: "np.ndarray"      # (n_routes, len(LEAD_BUCKETS) + 1)
+
+    def get(self, route_id: int) -> Optional[RouteStats]:
+        if not 0 <= route_id < len(self.eligible) or not self.eligible[route_id]:
+            return None
+        p10, p25, p50 = self.percentiles[route_id].tolist()
+        return RouteStats(
+            int(self.observations[route_id]), p10, p25, p50,
+            tuple(self.weekday_factor[route_id].tolist()), tuple(self.lead_factor[route_id].tolist()),
+        )
+
+
+def _sorted_quantiles(groups, values, n_groups: int, qs: Tuple[float, ...]):
+    """
+    Перцентили (nearest-rank снизу) values по группам groups ∈ [0, n_groups);
+    наблюдения уже упорядочены по (группа, значение). Возвращает
+    (массив n_groups × len(qs), NaN для пустых групп; размеры групп).
+    """
+    counts = np.bincount(groups, minlength=n_groups)
+    starts = np.cumsum(counts) - counts
+    has = counts > 0
+    out = np.full((n_groups, len(qs)), np.nan)
+    for j, q in enumerate(qs):
+        out[has, j] = values[starts[has] + np.floor(q * (counts[has] - 1)).astype(np.int64)]
+    return out, counts
+
+
+def _factors(routes, prices, group, n_groups: int, medians, n_routes: int):
+    """
+    Медиана по (маршрут, группа) / медиана маршрута; мало данных — 1.0.
+    Устойчивая сортировка по номеру группы (int8 — поразрядная, за линейное
+    время) сохраняет внутри группы порядок (маршрут, цена).
+    """
+    by_group = np.argsort(group.astype(np.int8), kind="stable")
+    keys = group[by_group] * n_routes + routes[by_group]
+    med, counts = _sorted_quantiles(keys, prices[by_group], n_groups * n_routes, (0.5,))
+    med, counts = med[:, 0].reshape(n_groups, n_routes).T, counts.reshape(n_groups, n_routes).T
+    ok = (counts >= MIN_GROUP_OBSERVATIONS) & (medians[:, None] > 0)
+    factors = np.ones((n_routes, n_groups))
+    factors[ok] = (med / medians[:, None])[ok]
+    return factors
+
+
+def compute_route_stats(
+    route_ids, prices, depart_ordinals, seen_at, n_routes: int, min_days: int = 10
+) -> RouteStatsTable:
+    """
+    Статистика по всем маршрутам сразу. Аргументы — параллельные массивы
+    наблюдений: номер маршрута, цена (целая), дата вылета (date.toordinal()),
+    время наблюдения (unix). Маршруты, где наблюдались цены меньше чем
+    min_days разных дат вылета, помечаются как недостаточные (eligible).
+    """
+    route_ids = np.asarray(route_ids, dtype=np.int64)
+    prices = np.asarray(prices, dtype=np.int64)
+    depart_ordinals = np.asarray(depart_ordinals, dtype=np.int64)
+    seen_ordinals = _EPOCH_ORDINAL + (np.asarray(seen_at, dtype=np.float64) // 86400).astype(np.int64)
+    if not len(route_ids):
+        return RouteStatsTable(
+            np.zeros(n_routes, np.int64), np.zeros(n_routes, bool), np.full((n_routes, 3), np.nan),
+            np.ones((n_routes, 7)), np.ones((n_routes, len(LEAD_BUCKETS) + 1)),
+        )
+
+    # Одна сортировка на все перцентили: по (маршрут, цена) одним целочисленным
+    # ключом; её порядок используют и p10/p25/p50, и поправки по дню недели / сроку
+    order = np.argsort(route_ids * (int(prices.max()) + 1) + prices)
+    routes_s = route_ids[order]
+    prices_s = prices[order].astype(np.float64)
+    depart_s = depart_ordinals[order]
+
+    percentiles, counts = _sorted_quantiles(routes_s, prices_s, n_routes, (0.1, 0.25, 0.5))
+    medians = percentiles[:, 2]
+    weekday = _factors(routes_s, prices_s, (depart_s - 1) % 7, 7, medians, n_routes)
+    lead_days = np.maximum(depart_s - seen_ordinals[order], 0)
+    lead = _factors(
+        routes_s, prices_s, np.searchsorted(np.array(LEAD_BUCKETS), lead_days, side="left"),
+        len(LEAD_BUCKETS) + 1, medians, n_routes,
+    )
+
+    # Число разных дат вылета маршрута: первые вхождения в отсортированных парах (маршрут, дата)
+    span = int(depart_ordinals.max() - depart_ordinals.min()) + 1
+    pairs = np.sort(route_ids * span + (depart_ordinals - depart_ordinals.min()))
+    first = np.concatenate(([True], pairs[1:] != pairs[:-1]))
+    day_counts = np.bincount(pairs[first] // span, minlength=n_routes)
+    return RouteStatsTable(counts, day_counts >= max(1, min_days), percentiles, weekday, lead)
+
+
+_HISTORY_DTYPE = None if np is None else np.dtype([
+    ("rowid", np.int64), ("route_id", np.int64), ("depart_day", np.int64),
+    ("price", np.int64), ("seen_at", np.float64),
+])
+
+
+class PriceAnalytics:
+    """
+    Статистика маршрутов по истории цен с периодическим пересчётом
+    (чтение истории и расчёт — в пуле потоков). История держится в памяти
+    массивом: при пересчёте с диска читаются только новые строки, старше
+    окна — отбрасываются. Подсказки целевой цены
+    для подписки: «редкая удача» (p10), «выгодно» (p25 с поправками),
+    «обычная цена» (медиана с поправками).
+    """
+
+    def __init__(self, store: Optional[PriceTableStore], window_days: float, refresh: float, min_days: int):
+        self.store = store
+        self.window_days = window_days
+        self.refresh = refresh
+        self.min_days = min_days
+        self._route_index: Dict[Route, int] = {}
+        self._table: Optional[RouteStatsTable] = None
+        self._computed_at = float("-inf")
+        self._refreshing: Optional[asyncio.Future] = None
+        self._rows = None  # np.ndarray _HISTORY_DTYPE; меняется только в _compute
+
+    @property
+    def enabled(self) -> bool:
+        return np is not None and self.store is not None
+
+    def _compute(self) -> Tuple[Dict[Route, int], RouteStatsTable]:
+        started = time.perf_counter()
+        since = time.time() - self.window_days * 86400
+        names = self.store.load_history_routes()
+        rows = self._rows if self._rows is not None else np.empty(0, dtype=_HISTORY_DTYPE)
+        last_rowid = int(rows["rowid"][-1]) if len(rows) else 0
+        # Новые строки истории — сразу в числовой массив, без промежуточных списков
+        new_rows = np.fromiter(self.store.load_history(since, last_rowid), dtype=_HISTORY_DTYPE)
+        rows = np.concatenate((rows[rows["seen_at"] >= since], new_rows))
+        self._rows = rows
+        loaded = time.perf_counter()
+        table = compute_route_stats(
+            rows["route_id"], rows["price"], rows["depart_day"], rows["seen_at"],
+            max(names, default=-1) + 1, self.min_days,
+        )
+        logger.info(
+            f"📈 Аналитика цен: {int(table.eligible.sum())}/{len(names)} маршрутов по {len(rows)} наблюдениям "
+            f"(новых {len(new_rows)}): чтение {(loaded - started) * 1000:.1f} мс, "
+            f"расчёт {(time.perf_counter() - loaded) * 1000:.1f} мс"
+        )
+        return {route: route_id for route_id, route in names.items()}, table
+
+    def _refreshed(self, future: asyncio.Future) -> None:
+        self._computed_at = time.monotonic()
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            logger.warning(f"Не удалось пересчитать аналитику цен: {future.exception()}")
+            return
+        self._route_index, self._table = future.result()
+
+    async def ensure_fresh(self) -> None:
+        """
+        Запускает пересчёт, если статистика устарела. Ждёт его только при
+        первом расчёте — дальше подсказки идут по прежней статистике, пока
+        новая считается в фоне.
+        """
+        if not self.enabled or time.monotonic() - self._computed_at < self.refresh:
+            return
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.get_running_loop().run_in_executor(None, self._compute)
+            self._refreshing.add_done_callback(self._refreshed)
+        if self._table is None:
+            await asyncio.wait([self._refreshing])
+
+    def route_stats(self, origin: str, destination: str) -> Optional[RouteStats]:
+        route_id = self._route_index.get((origin, destination))
+        if self._table is None or route_id is None:
+            return None
+        return self._table.get(route_id)
+
+    def suggestions(
+        self,
+        origin: str,
+        destination: str,
+        depart: date,
+        return_date: Optional[date] = None,
+        passengers: int = 1,
+        current_price: Optional[float] = None,
+        today: Optional[date] = None,
+    ) -> List[Tuple[str, int]]:
+        """
+        (подпись, целевая цена на всех пассажиров), по возрастанию цены.
+        Для туда-обратно — сумма по обоим направлениям. Пороги не ниже
+        текущей цены не предлагаются: уведомление сработало бы сразу.
+        """
+        today = today or date.today()
+        legs = [(self.route_stats(origin, destination), depart)]
+        if return_date:
+            legs.append((self.route_stats(destination, origin), return_date))
+        if any(stats is None for stats, _ in legs):
+            return []
+
+        levels = (
+            ("💎 Редкая удача", lambda s, d: s.p10),
+            ("🔥 Выгодно", lambda s, d: s.good_deal(d, today)),
+            ("📊 Обычная цена", lambda s, d: s.p50 * s.factor(d, today)),
+        )
+        result = []
+        for label, level in levels:
+            price = int(round(sum(level(stats, d) for stats, d in legs) * max(1, passengers), -1))
+            if current_price and price >= current_price:
+                continue
+            if price > 0 and all(price != p for _, p in result):
+                result.append((label, price))
+        return sorted(result, key=lambda item: item[1])
+
+
+price_analytics = PriceAnalytics(
+    PriceTableStore(PRICE_TABLE_DB, PRICE_HISTORY_DAYS) if PRICE_TABLE_DB else None,
+    window_days=ANALYTICS_WINDOW_DAYS,
+    refresh=ANALYTICS_REFRESH_SECONDS,
+    min_days=ANALYTICS_MIN_DAYS,
+)
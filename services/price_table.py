@@ -0,0 +1,282 @@
+# services/price_table.py
+import asyncio
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Route = Tuple[str, str]
+
+# Как часто (секунды) update() вычищает из памяти прошедшие дни и устаревшие цены
+PRUNE_INTERVAL = 600
+
+
+class DayPrice(NamedTuple):
+    price: int
+    airline: str
+    seen_at: float  # когда цена получена от API (time.time())
+
+
+class PriceTableStore:
+    """
+    Копия таблицы минимальных цен на диске (SQLite): после рестарта бот
+    сразу знает цены, которые видел раньше. Каждая новая цена дня (не
+    совпадающая с уже сохранённой) пишется в историю наблюдений
+    (route_price_history, не старше history_days дней) — по ней строится
+    аналитика цен. В истории маршрут — номер из price_history_routes, дата
+    вылета — date.toordinal(): столбцы читаются сразу в числовые массивы.
+    Методы синхронные.
+    """
+
+    def __init__(self, path: str, history_days: float = 90):
+        self.path = path
+        self.history_days = history_days
+
+    def _conn(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS route_day_prices (
+                origin TEXT NOT NULL,
+                destination TEXT NOT NULL,
+                day TEXT NOT NULL,
+                price INTEGER NOT NULL,
+                airline TEXT,
+                seen_at REAL NOT NULL,
+                PRIMARY KEY (origin, destination, day)
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS price_history_routes (
+                id INTEGER PRIMARY KEY,
+                origin TEXT NOT NULL,
+                destination TEXT NOT NULL,
+                UNIQUE (origin, destination)
+            )
+        """)
+        cols = [row[1] for row in conn.execute("PRAGMA table_info(route_price_history)")]
+        if "day" in cols:
+            # Прежний формат (строка на каждый сброс на диск, день строкой) — собран заново
+            conn.execute("DROP TABLE route_price_history")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS route_price_history (
+                route_id INTEGER NOT NULL,
+                depart_day INTEGER NOT NULL,    -- date.toordinal()
+                price INTEGER NOT NULL,
+                seen_at REAL NOT NULL
+            )
+        """)
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_route_price_history_seen_at ON route_price_history (seen_at)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_route_price_history_route ON route_price_history (route_id, seen_at)"
+        )
+        return conn
+
+    def load(self, min_day: str, min_seen_at: float) -> List[Tuple[Route, str, DayPrice]]:
+        with self._conn() as conn:
+            rows = conn.execute(
+                "SELECT origin, destination, day, price, airline, seen_at FROM route_day_prices "
+                "WHERE day >= ? AND seen_at >= ?",
+                (min_day, min_seen_at),
+            ).fetchall()
+        return [((o, d), day, DayPrice(price, airline or "", seen_at)) for o, d, day, price, airline, seen_at in rows]
+
+    def write(self, entries: List[Tuple[Route, str, DayPrice]], min_day: str) -> None:
+        with self._conn() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO price_history_routes (origin, destination) VALUES (?, ?)",
+                {route for route, _, _ in entries},
+            )
+            # В историю — только изменившиеся цены: повторные проверки того же
+            # дня не должны перевешивать в перцентилях (до INSERT OR REPLACE ниже)
+            conn.executemany(
+                "INSERT INTO route_price_history (route_id, depart_day, price, seen_at) "
+                "SELECT id, ?, ?, ? FROM price_history_routes WHERE origin = ? AND destination = ? "
+                "AND NOT EXISTS (SELECT 1 FROM route_day_prices "
+                "WHERE origin = ? AND destination = ? AND day = ? AND price = ?)",
+                [
+                    (date.fromisoformat(day).toordinal(), p.price, p.seen_at, o, d, o, d, day, p.price)
+                    for (o, d), day, p in entries
+                ],
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO route_day_prices "
+                "(origin, destination, day, price, airline, seen_at) VALUES (?, ?, ?, ?, ?, ?)",
+                [(o, d, day, p.price, p.airline, p.seen_at) for (o, d), day, p in entries],
+            )
+            conn.execute("DELETE FROM route_day_prices WHERE day < ?", (min_day,))
+            conn.execute(
+                "DELETE FROM route_price_history WHERE seen_at < ?",
+                (time.time() - self.history_days * 86400,),
+            )
+            conn.commit()
+
+    def load_history_routes(self) -> Dict[int, Route]:
+        with self._conn() as conn:
+            return {route_id: (o, d) for route_id, o, d in conn.execute(
+                "SELECT id, origin, destination FROM price_history_routes"
+            )}
+
+    def load_history(self, since: float, after_rowid: int = 0) -> Iterator[Tuple[int, int, int, int, float]]:
+        """
+        Наблюдения (rowid, route_id, depart_day, price, seen_at) с момента since,
+        записанные после after_rowid (история только дописывается), — потоком.
+        """
+        conn = self._conn()
+        try:
+            # +seen_at: читаем по rowid подряд, а не через индекс seen_at вразброс
+            cursor = conn.execute(
+                "SELECT rowid, route_id, depart_day, price, seen_at FROM route_price_history "
+                "WHERE rowid > ? AND +seen_at >= ? ORDER BY rowid",
+                (after_rowid, since),
+            )
+            while True:
+                rows = cursor.fetchmany(10000)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            conn.close()
+
+
+class PriceTable:
+    """
+    Самая дешёвая известная цена в одну сторону на каждый (откуда, куда, день),
+    по последнему ответу API на этот день. Обновляется из каждого ответа
+    _fetch — и поисков пользователей, и планировщика. Цены старше max_age
+    секунд не используются. Ответ на окно дат — по словарю на маршрут,
+    без запросов к API. Все методы, кроме preload/flush, работают только
+    с памятью; сохранённые цены подгружаются с диска при старте (preload).
+    В памяти не больше max_routes маршрутов (вытесняются давно не
+    обновлявшиеся); прошедшие дни и цены старше max_age периодически удаляются.
+    """
+
+    def __init__(self, max_age: float, store: Optional[PriceTableStore] = None, max_routes: int = 5000):
+        self.max_age = max_age
+        self.store = store
+        self.max_routes = max_routes
+        self._routes: "OrderedDict[Route, Dict[str, DayPrice]]" = OrderedDict()
+        self._dirty: Dict[Tuple[Route, str], DayPrice] = {}
+        self._loaded = store is None
+        self._pruned_at = time.time()
+
+    async def preload(self) -> None:
+        """Подгружает сохранённые цены с диска в пуле потоков (один раз, при старте)."""
+        if self._loaded:
+            return
+        self._loaded = True
+        loop = asyncio.get_running_loop()
+        try:
+            rows = await loop.run_in_executor(
+                None, self.store.load, date.today().isoformat(), time.time() - self.max_age
+            )
+        except sqlite3.Error as e:
+            logger.warning(f"Не удалось загрузить таблицу цен с диска: {e}")
+            return
+        for route, day, entry in rows:
+            # Цены, полученные уже после старта, новее дисковых
+            self._routes.setdefault(route, {}).setdefault(day, entry)
+        self._evict()
+        logger.info(f"💾 Таблица цен загружена с диска: {len(rows)} дней")
+
+    def update(self, origin: str, destination: str, offers: Iterable[dict]) -> int:
+        """Записывает минимальную цену каждого дня из ответа API. Возвращает число дней."""
+        best: Dict[str, dict] = {}
+        for offer in offers:
+            day = str(offer.get("departure_at", ""))[:10]
+            price = offer.get("price")
+            if len(day) != 10 or not price:
+                continue
+            if day not in best or float(price) < float(best[day]["price"]):
+                best[day] = offer
+        if not best:
+            return 0
+        now = time.time()
+        route = (origin, destination)
+        days = self._routes.setdefault(route, {})
+        self._routes.move_to_end(route)
+        for day, offer in best.items():
+            entry = DayPrice(int(float(offer["price"])), offer.get("airline") or "", now)
+            days[day] = entry
+            if self.store is not None:
+                self._dirty[(route, day)] = entry
+        if now - self._pruned_at >= PRUNE_INTERVAL:
+            self.prune(now)
+        self._evict()
+        return len(best)
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """Удаляет из памяти прошедшие дни и цены старше max_age. Возвращает число удалённых дней."""
+        now = time.time() if now is None else now
+        self._pruned_at = now
+        today = date.today().isoformat()
+        expired = now - self.max_age
+        removed = 0
+        for route in list(self._routes):
+            days = self._routes[route]
+            stale = [day for day, entry in days.items() if day < today or entry.seen_at < expired]
+            for day in stale:
+                del days[day]
+            removed += len(stale)
+            if not days:
+                del self._routes[route]
+        return removed
+
+    def _evict(self) -> None:
+        while len(self._routes) > self.max_routes:
+            self._routes.popitem(last=False)
+
+    def get(self, origin: str, destination: str, day: date) -> Optional[DayPrice]:
+        entry = self._routes.get((origin, destination), {}).get(day.isoformat())
+        if entry is None or entry.seen_at < time.time() - self.max_age:
+            return None
+        return entry
+
+    def cheapest(self, origin: str, destination: str, dates: Iterable[date]) -> Optional[Tuple[date, DayPrice]]:
+        """Самый дешёвый известный день окна: (дата, цена) или None."""
+        known = [(d, p) for d, p in ((d, self.get(origin, destination, d)) for d in dates) if p]
+        return min(known, key=lambda item: item[1].price) if known else None
+
+    def cheapest_round_trip(
+        self, origin: str, destination: str, dates: Iterable[date], stay
+    ) -> Optional[Tuple[date, int]]:
+        """Самая дешёвая известная пара «туда + обратно через stay»: (дата вылета, сумма)."""
+        best = None
+        for d in dates:
+            out = self.get(origin, destination, d)
+            back = self.get(destination, origin, d + stay) if out else None
+            if out and back and (best is None or out.price + back.price < best[1]):
+                best = (d, out.price + back.price)
+        return best
+
+    async def flush(self) -> int:
+        """Сбрасывает новые цены на диск в пуле потоков, не блокируя event loop."""
+        if self.store is None or not self._dirty:
+            return 0
+        batch = [(route, day, entry) for (route, day), entry in self._dirty.items()]
+        self._dirty = {}
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self.store.write, batch, date.today().isoformat())
+        except sqlite3.Error as e:
+            logger.warning(f"Не удалось сохранить таблицу цен на диск: {e}")
+            for route, day, entry in batch:
+                self._dirty.setdefault((route, day), entry)
+            return 0
+        return len(batch)
+
+    async def run_write_back(self, interval: float) -> None:
+        """Фоновая задача: периодически сохраняет таблицу на диск."""
+        while True:
+            await asyncio.sleep(interval)
+            written = await self.flush()
+            if written:
+                logger.debug(f"💾 Таблица цен: сохранено на диск {written} дней")
+
+    def __len__(self) -> int:
+        return sum(len(days) for days in self._routes.values())
@@ -0,0 +1,157 @@
+# services/quota.py
+import asyncio
+import logging
+import sqlite3
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+import database
+from config import API_CALLS_PER_HOUR, API_QUOTA_ENABLED, API_QUOTA_INTERACTIVE_SHARE, API_QUOTA_MAX_STRETCH
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER = "scheduler"
+INTERACTIVE = "interactive"
+
+# Кто делает запросы к API в текущей задаче: планировщик выставляет SCHEDULER
+# у себя, всё остальное (поиски пользователей) считается интерактивным
+api_caller: ContextVar[str] = ContextVar("api_caller", default=INTERACTIVE)
+
+HOUR = 3600
+
+
+class QuotaPlan(NamedTuple):
+    """
+    Цикл планировщика в рамках квоты: длительность (секунды), подписки,
+    которые в этом цикле проверяются только на свою дату (без окна),
+    и ожидаемое число запросов.
+    """
+    cycle_seconds: float
+    narrowed: Set[int]
+    calls: int
+
+
+def narrow_window(sub: dict) -> dict:
+    """Подписка, суженная до одной даты вылета (исходный словарь не меняется)."""
+    return dict(sub, flex_days=0, window_month=None)
+
+
+def _low_priority_first(sub: dict) -> float:
+    """Чем дальше последняя цена от порога, тем меньше шансов на уведомление."""
+    price, threshold = sub.get('last_price'), sub.get('threshold')
+    if not price or not threshold:
+        return 1.0
+    return float(price) / float(threshold)
+
+
+class QuotaAccountant:
+    """
+    Учёт запросов к API за скользящий час (отдельно планировщик и поиски
+    пользователей) и план цикла планировщика, укладывающийся в квоту.
+    Поискам пользователей всегда остаётся interactive_share квоты, а если
+    они уже расходуют больше — планировщику достаётся соответственно меньше.
+    Счётчики по минутам хранятся в БД (api_usage): бот и планировщик в разных
+    процессах (RUN_MODE=bot) видят запросы друг друга. sync() сбрасывает
+    свои запросы в БД и читает общие; used() — общие плюс ещё не сброшенные.
+    """
+
+    def __init__(self, per_hour: int, interactive_share: float = 0.2, max_stretch: float = 3.0):
+        self.per_hour = per_hour
+        self.interactive_share = interactive_share
+        self.max_stretch = max(1.0, max_stretch)
+        self._pending: Dict[Tuple[int, str], int] = {}
+        self._shared: Dict[str, int] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.per_hour > 0
+
+    def record(self, n: int = 1) -> None:
+        if not self.enabled:
+            return
+        key = (int(time.time() // 60), api_caller.get())
+        self._pending[key] = self._pending.get(key, 0) + n
+
+    def used(self, source: Optional[str] = None) -> int:
+        pending = sum(n for (_, s), n in self._pending.items() if source is None or s == source)
+        if source is not None:
+            return self._shared.get(source, 0) + pending
+        return sum(self._shared.values()) + pending
+
+    def _sync(self, pending: Dict[Tuple[int, str], int]) -> Dict[str, int]:
+        since = int(time.time() // 60) - HOUR // 60 + 1
+        if pending:
+            database.add_api_usage(pending, since)
+        return database.get_api_usage(since)
+
+    async def sync(self) -> None:
+        """Сбрасывает свои запросы в БД и обновляет общие счётчики (в пуле потоков)."""
+        if not self.enabled:
+            return
+        pending, self._pending = self._pending, {}
+        try:
+            self._shared = await asyncio.get_running_loop().run_in_executor(None, self._sync, pending)
+        except sqlite3.Error as e:
+            logger.warning(f"Не удалось синхронизировать учёт квоты API: {e}")
+            for key, n in pending.items():
+                self._pending[key] = self._pending.get(key, 0) + n
+
+    async def run_sync(self, interval: float) -> None:
+        """Фоновая задача: периодическая синхронизация счётчиков с БД."""
+        if not self.enabled:
+            return
+        while True:
+            await self.sync()
+            await asyncio.sleep(interval)
+
+    def scheduler_budget(self) -> float:
+        """Сколько запросов в час сейчас можно отдать планировщику."""
+        reserve = self.per_hour * self.interactive_share
+        return max(0.0, self.per_hour - max(reserve, self.used(INTERACTIVE)))
+
+    def has_spare(self, calls: int) -> bool:
+        """
+        Хватит ли квоты на необязательные запросы (фоновые обновления): они
+        тратят только резерв поисков пользователей и не трогают бюджет планировщика.
+        """
+        if not self.enabled:
+            return True
+        return self.used(INTERACTIVE) + calls <= self.per_hour * self.interactive_share
+
+    def plan(self, subs: List[dict], interval: float, cost: Callable[[dict], int]) -> QuotaPlan:
+        """
+        Прогноз запросов цикла и подгонка под квоту. Сначала цикл растягивается
+        (до max_stretch × interval), затем окна дат подписок с наименьшими
+        шансами на уведомление сужаются до одной даты, пока прогноз не уложится.
+        """
+        costs = {sub.get('id'): cost(sub) for sub in subs}
+        calls = sum(costs.values())
+        budget = self.scheduler_budget()
+        max_calls = budget * interval * self.max_stretch / HOUR
+
+        narrowed: Set[int] = set()
+        if calls > max_calls:
+            ordered = sorted(subs, key=lambda s: (-_low_priority_first(s), -costs[s.get('id')]))
+            for sub in ordered:
+                if calls <= max_calls:
+                    break
+                sub_id = sub.get('id')
+                saved = costs[sub_id] - cost(narrow_window(sub))
+                if saved > 0:
+                    narrowed.add(sub_id)
+                    calls -= saved
+
+        cycle = float(interval)
+        if budget > 0 and calls * HOUR / budget > cycle:
+            cycle = calls * HOUR / budget
+        if budget <= 0 or cycle > interval * self.max_stretch:
+            # Даже суженные окна не укладываются: дальше растягивать не будем,
+            # превышение покроет следующий цикл (скользящий час)
+            cycle = interval * self.max_stretch
+        return QuotaPlan(cycle, narrowed, calls)
+
+
+api_quota = QuotaAccountant(
+    API_CALLS_PER_HOUR if API_QUOTA_ENABLED else 0, API_QUOTA_INTERACTIVE_SHARE, API_QUOTA_MAX_STRETCH
+)
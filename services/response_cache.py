@@ -0,0 +1,170 @@
+# services/response_cache.py
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Ключ: (origin, destination, departure_at, limit)
+CacheKey = Tuple[str, str, str, int]
+
+
+class CacheEntry:
+    __slots__ = ("data", "fingerprint", "expires_at")
+
+    def __init__(self, data: List[dict], fingerprint: int, expires_at: float):
+        self.data = data
+        self.fingerprint = fingerprint
+        self.expires_at = expires_at
+
+
+class ResponseCacheStore:
+    """
+    Копия кэша на диске (SQLite) с временем истечения каждой записи:
+    после рестарта ещё свежие ответы снова доступны без запросов к API.
+    Методы синхронные — вызываются в пуле потоков.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _conn(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                origin TEXT NOT NULL,
+                destination TEXT NOT NULL,
+                departure_at TEXT NOT NULL,
+                lim INTEGER NOT NULL,
+                data TEXT NOT NULL,
+                fingerprint INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (origin, destination, departure_at, lim)
+            )
+        """)
+        return conn
+
+    def load_fresh(self, now: float, limit: int) -> List[Tuple[CacheKey, CacheEntry]]:
+        """Неистёкшие записи, самые свежие — последними (как в LRU-порядке кэша)."""
+        with self._conn() as conn:
+            rows = conn.execute(
+                "SELECT origin, destination, departure_at, lim, data, fingerprint, expires_at "
+                "FROM responses WHERE expires_at > ? ORDER BY expires_at DESC LIMIT ?",
+                (now, limit),
+            ).fetchall()
+        return [
+            ((o, d, dep, lim), CacheEntry(json.loads(data), fp, exp))
+            for o, d, dep, lim, data, fp, exp in reversed(rows)
+        ]
+
+    def write(self, entries: List[Tuple[CacheKey, CacheEntry]], now: float) -> None:
+        with self._conn() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO responses "
+                "(origin, destination, departure_at, lim, data, fingerprint, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (*key, json.dumps(e.data, ensure_ascii=False), e.fingerprint, e.expires_at)
+                    for key, e in entries
+                ],
+            )
+            conn.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+            conn.commit()
+
+
+class ResponseCache:
+    """
+    Кэш успешных ответов API с TTL (по wall-clock времени) и ограничением
+    размера: при переполнении вытесняются давно не использованные записи.
+    get/put работают только с памятью. С store свежие записи подгружаются
+    с диска при старте (preload, в пуле потоков), а новые ответы
+    сбрасываются на диск фоновой задачей (run_write_back).
+    """
+
+    def __init__(self, ttl: float, max_entries: int, store: Optional[ResponseCacheStore] = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.store = store
+        self._entries: "OrderedDict[CacheKey, CacheEntry]" = OrderedDict()
+        self._dirty: Dict[CacheKey, CacheEntry] = {}
+        self._loaded = store is None
+        self.hits = 0
+        self.misses = 0
+
+    async def preload(self) -> None:
+        """Подгружает свежие записи с диска в пуле потоков (один раз, при старте)."""
+        if self._loaded:
+            return
+        self._loaded = True
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            fresh = await loop.run_in_executor(None, self.store.load_fresh, time.time(), self.max_entries)
+        except (sqlite3.Error, ValueError) as e:
+            logger.warning(f"Не удалось загрузить кэш ответов с диска: {e}")
+            return
+        # Дисковые записи — в начало LRU-порядка (самые свежие из них ближе к концу);
+        # записи, полученные уже после старта, новее дисковых
+        for key, entry in reversed(fresh):
+            if key not in self._entries:
+                self._entries[key] = entry
+                self._entries.move_to_end(key, last=False)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        logger.info(
+            f"💾 Кэш ответов загружен с диска: {len(fresh)} записей "
+            f"за {(time.perf_counter() - started) * 1000:.1f} мс"
+        )
+
+    def get(self, key: CacheKey) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at < time.time():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: CacheKey, data: List[dict], fingerprint: int) -> CacheEntry:
+        entry = CacheEntry(data, fingerprint, time.time() + self.ttl)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        if self.store is not None:
+            self._dirty[key] = entry
+        return entry
+
+    async def flush(self) -> int:
+        """Сбрасывает новые записи на диск в пуле потоков, не блокируя event loop."""
+        if self.store is None or not self._dirty:
+            return 0
+        batch = list(self._dirty.items())
+        self._dirty = {}
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self.store.write, batch, time.time())
+        except sqlite3.Error as e:
+            logger.warning(f"Не удалось сохранить кэш ответов на диск: {e}")
+            # Вернём в очередь то, что не перезаписано более новыми ответами
+            for key, entry in batch:
+                self._dirty.setdefault(key, entry)
+            return 0
+        return len(batch)
+
+    async def run_write_back(self, interval: float) -> None:
+        """Фоновая задача: периодически сохраняет кэш на диск."""
+        while True:
+            await asyncio.sleep(interval)
+            written = await self.flush()
+            if written:
+                logger.debug(f"💾 Кэш ответов: сохранено на диск {written} записей")
+
+    def __len__(self) -> int:
+        return len(self._entries)
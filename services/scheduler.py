@@ -2,17 +2,40 @@
 import asyncio
 import logging
 import aiohttp
-from datetime import datetime, timedelta
+from datetime import datetime
+from typing import Optional
 from aiogram import Bot
-from database import get_all_subscriptions, set_last_notified, update_subscription_threshold
+from config import (
+    CHECK_INTERVAL_SECONDS,
+    DEFAULT_FLEX_DAYS,
+    SCHEDULER_PACING,
+    API_CALLS_PER_HOUR,
+    DIGEST_WINDOW_SECONDS,
+)
+from database import (
+    get_subscriptions_for_check,
+    mark_subscriptions_checked,
+    set_last_notified,
+    update_subscription_threshold,
+    set_price_snapshot,
+    touch_price_snapshot,
+    get_digest_users,
+)
 from services.travelpayouts import (
     search_round_trip_fixed_stay,
     search_flights_for_dates,
-    get_airline_name
+    get_airline_name,
+    api_circuit,
 )
+from services.volatility import VolatilityTracker, route_key
+from services.fetch_planner import plan_window, window_dates, describe_window
+from services.pacing import plan_cycle
+from services.digest import Alert, DigestBuffer, split_digest
+from services.metrics import metrics
+from services.log_setup import sampled, kv
+from services.quota import api_quota, api_caller, narrow_window, SCHEDULER
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
 def safe_parse_date(value):
     """Парсер, устойчивый к разным форматам дат в БД."""
     if not value or str(value).strip() in ("0", "00--", "", "None", "null", "False"):
@@ -35,22 +58,295 @@ def safe_parse_date(value):
             except: pass
             
     return None
-async def check_subscriptions_task(bot: Bot):
+
+def subscription_window(sub):
+    """Окно дат подписки: (± дней, месяц 'YYYY-MM' или None)."""
+    flex_days = sub.get('flex_days')
+    if flex_days is None:
+        flex_days = DEFAULT_FLEX_DAYS
+    return int(flex_days), sub.get('window_month') or None
+
+
+def subscription_dates(sub):
+    """Даты вылета, которые покрывает проверка подписки (без прошедших)."""
+    flex_days, window_month = subscription_window(sub)
+    return window_dates(safe_parse_date(sub.get('depart_date')), flex_days, window_month)
+
+
+def _sub_route_key(sub):
+    flex_days, window_month = subscription_window(sub)
+    depart_date = safe_parse_date(sub.get('depart_date'))
+    # Разные окна одного маршрута — разные наборы запросов к API
+    return route_key(
+        sub.get('origin'),
+        sub.get('destination'),
+        window_month or f"{depart_date}±{flex_days}",
+        safe_parse_date(sub.get('return_date')),
+    )
+
+
+def calls_per_check(sub) -> int:
+    """Сколько запросов к API стоит одна проверка подписки (планы квоты и темпа, статистика экономии)."""
+    dates = subscription_dates(sub)
+    calls = plan_window(dates).cost
+    depart_date = safe_parse_date(sub.get('depart_date'))
+    return_date = safe_parse_date(sub.get('return_date'))
+    if return_date and depart_date:
+        stay = return_date - depart_date
+        calls += plan_window([d + stay for d in dates]).cost
+    return calls
+
+
+def _evaluation_inputs(sub):
+    """Параметры подписки, от которых зависит решение об уведомлении."""
+    return (
+        sub.get('threshold') or 0,
+        sub.get('threshold_is_manual'),
+        sub.get('passengers') or 1,
+        sub.get('last_notified_price'),
+        subscription_window(sub),
+    )
+
+
+async def fetch_subscription_offers(sub, session=None):
+    """
+    Запрашивает предложения по подписке в её окне дат (± дней или весь месяц):
+    комбинации туда-обратно (при наличии даты возврата) или билеты в одну сторону.
+    """
+    depart_date = safe_parse_date(sub.get('depart_date'))
+    return_date = safe_parse_date(sub.get('return_date'))
+    passengers = sub.get('passengers') or 1
+    flex_days, window_month = subscription_window(sub)
+
+    if return_date:
+        return await search_round_trip_fixed_stay(
+            origin=sub.get('origin'),
+            destination=sub.get('destination'),
+            depart_date=depart_date,
+            return_date=return_date,
+            passengers=passengers,
+            days_flex=flex_days,
+            window_month=window_month,
+            limit=5,
+            session=session
+        )
+
+    return await search_flights_for_dates(
+        origin=sub.get('origin'),
+        destination=sub.get('destination'),
+        dates=subscription_dates(sub),
+        limit_per_day=5,
+        session=session
+    )
+
+def pick_best_offer(sub, payload):
+    """Возвращает (итоговая цена на всех пассажиров, лучшее предложение) или (0, {})."""
+    if not payload:
+        return 0, {}
+    if safe_parse_date(sub.get('return_date')):
+        best = min(payload, key=lambda x: x['total_price'])
+        return best['total_price'], best
+    best = min(payload, key=lambda x: float(x.get('price', 999999)))
+    passengers = sub.get('passengers') or 1
+    return int(float(best.get('price', 0)) * passengers), best
+
+def _offer_airline(offer) -> str:
+    return offer.get('airline') or offer.get('outbound', {}).get('airline', '')
+
+def _offer_dates(offer) -> str:
+    if 'outbound' in offer:
+        d_str = offer.get('outbound', {}).get('departure_at', '')[:10]
+        r_str = offer.get('inbound', {}).get('departure_at', '')[:10]
+        return f"{d_str} ⇄ {r_str}"
+    return f"{offer.get('departure_at', '')[:10]}"
+
+def offer_summary(offer) -> str:
+    """Краткое описание предложения для снимка цены: даты и авиакомпания."""
+    return f"{_offer_dates(offer)}, {get_airline_name(_offer_airline(offer))}"
+
+def _alert_lines(sub, found_price, offer) -> str:
+    """Строки уведомления о цене: маршрут, даты, авиакомпания, цена и цель."""
+    return (
+        f"✈️ {sub.get('origin')} → {sub.get('destination')}\n"
+        f"📅 {_offer_dates(offer)}\n"
+        f"🏢 {get_airline_name(_offer_airline(offer))}\n\n"
+        f"💰 <b>{found_price} RUB</b>\n"
+        f"🎯 Цель: {int(sub.get('threshold') or 0)} RUB"
+    )
+
+def _mark_notified(sub, found_price) -> None:
+    """Уведомление доставлено: запоминаем цену и двигаем динамический порог."""
+    sub_id = sub.get('id')
+    set_last_notified(sub_id, found_price)
+    metrics.inc("notifications.sent")
+    try:
+        if sub.get("threshold_is_manual") in (0, "0", False):
+            update_subscription_threshold(sub_id, found_price, threshold_is_manual=0)
+            logger.info(f"🔁 Sub #{sub_id}: Порог обновлён (динамический) -> {found_price}")
+    except Exception as e:
+        logger.exception(f"Ошибка обновления порога для подписки {sub_id}: {e}")
+
+async def _send_digest(bot: Bot, user_id: int, alerts, last_evaluation) -> None:
+    """
+    Отправляет накопленные уведомления одним сообщением (или несколькими —
+    если не помещаются в лимит Telegram). Каждая подписка отмечается
+    уведомлённой, только когда ушло сообщение с ней; неотправленные
+    будут оценены заново в следующем цикле.
+    """
+    header = f"🔔 <b>Цены упали! Подписок: {len(alerts)}</b>"
+    sent = 0
+    for text, included in split_digest(header, alerts):
+        try:
+            await bot.send_message(chat_id=user_id, text=text, parse_mode="HTML")
+        except Exception as e:
+            logger.error(f"Ошибка отправки дайджеста пользователю {user_id}: {e}")
+            break
+        for alert in included:
+            _mark_notified(alert.sub, alert.price)
+        sent += len(included)
+
+    for alert in alerts[sent:]:
+        last_evaluation.pop(alert.sub.get('id'), None)
+    logger.info(f"📩 Дайджест пользователю {user_id}: отправлено {sent}/{len(alerts)} уведомлений")
+
+# Как часто (в проверенных подписках) сохранять прогресс цикла в БД
+CHECKPOINT_EVERY = 10
+
+
+async def _sleep_or_stop(stop: Optional[asyncio.Event], seconds: float) -> bool:
+    """Спит seconds секунд; возвращает True, если за это время запрошена остановка."""
+    if stop is None:
+        await asyncio.sleep(seconds)
+        return False
+    try:
+        await asyncio.wait_for(stop.wait(), timeout=max(0, seconds))
+    except asyncio.TimeoutError:
+        return False
+    return True
+
+
+def _flush_checkpoint(checked: list) -> None:
+    try:
+        mark_subscriptions_checked(checked)
+    except Exception as e:
+        logger.warning(f"Не удалось сохранить прогресс цикла: {e}")
+    checked.clear()
+
+
+async def check_subscriptions_task(bot: Bot, stop: Optional[asyncio.Event] = None):
     """
     Главный цикл проверки подписок с расширенным логированием и защитой от ошибок.
+    Интервал проверки каждого маршрута подстраивается под волатильность его цены.
+    В режиме SCHEDULER_PACING проверки не идут подряд, а равномерно распределены по циклу.
+    Время проверки каждой подписки сохраняется в БД, и цикл (в т.ч. после рестарта)
+    начинается с давно не проверявшихся. По событию stop задача дожидается
+    текущей проверки, сохраняет прогресс и завершается.
+    В отдельном процессе (scheduler_main.py) вместо Bot передаётся OutboxSender:
+    уведомления попадают в очередь в БД, а отправляет их процесс бота.
     """
     logger.info("🤖 Планировщик запущен")
+    tracker = VolatilityTracker()
+    # sub_id -> ((отпечаток ответов API, параметры подписки), найденная цена)
+    last_evaluation = {}
+    loop = asyncio.get_running_loop()
+    # Проверенные, но ещё не записанные в БД подписки
+    checked = []
+    # Уведомления пользователей в режиме дайджеста, ждущие отправки
+    digests = DigestBuffer(DIGEST_WINDOW_SECONDS)
     
-    while True:
+    # Запросы этой задачи учитываются в квоте как запросы планировщика
+    api_caller.set(SCHEDULER)
+
+    while stop is None or not stop.is_set():
         try:
             async with aiohttp.ClientSession() as session:
                 logger.info("⏳ --- НАЧАЛО ЦИКЛА ПРОВЕРКИ ---")
                 
-                subs = get_all_subscriptions()
+                subs = get_subscriptions_for_check()
+                digest_users = get_digest_users()
                 if not subs:
                     logger.info("Подписок в базе данных не обнаружено.")
+
+                # Маршруты, которым пора на проверку, определяем один раз на цикл:
+                # подписки на один и тот же маршрут-дату проверяются вместе.
+                # Сроки маршрутов отсчитываются от начала цикла (часы event loop),
+                # а не от момента проверки внутри него: иначе в равномерном режиме
+                # маршрут с интервалом, равным длительности цикла, пропускал бы каждый второй.
+                cycle_started = loop.time()
+                sub_keys = {sub.get('id'): _sub_route_key(sub) for sub in subs}
+                tracker.forget_missing(sub_keys.values())
+                for stale_id in set(last_evaluation) - set(sub_keys):
+                    del last_evaluation[stale_id]
+                due_keys = {k for k in sub_keys.values() if tracker.is_due(k, cycle_started)}
+                observed_keys = set()
+                skipped_subs = 0
+                saved_calls = 0
+
+                # Равномерный режим: у каждой подписки свой слот в цикле,
+                # паузы между подписками не нужны — их заменяет ожидание слота.
+                pacing = None
+                pause = 1.5
+                due_subs = [s for s in subs if sub_keys.get(s.get('id')) in due_keys]
+
+                # Квота API: прогноз запросов цикла, при нехватке — длиннее цикл и узкие окна
+                quota_plan = None
+                if api_quota.enabled:
+                    # Запросы бота из другого процесса (RUN_MODE=bot) — из общего учёта в БД
+                    await api_quota.sync()
+                    quota_plan = api_quota.plan(due_subs, CHECK_INTERVAL_SECONDS, calls_per_check)
+                    logger.info(
+                        f"📏 Квота API: прогноз {quota_plan.calls} запросов за {int(quota_plan.cycle_seconds)}с, "
+                        f"бюджет планировщика {int(api_quota.scheduler_budget())}/ч, "
+                        f"за последний час использовано {api_quota.used()}/{api_quota.per_hour}, "
+                        f"окна сужены у {len(quota_plan.narrowed)} подписок"
+                    )
+                    due_subs = [narrow_window(s) if s.get('id') in quota_plan.narrowed else s for s in due_subs]
+
+                if SCHEDULER_PACING:
+                    if quota_plan is not None:
+                        # Длительность цикла уже подобрана под тот же API_CALLS_PER_HOUR с учётом квоты
+                        pacing = plan_cycle(due_subs, quota_plan.cycle_seconds, 0, calls_per_check)
+                    else:
+                        pacing = plan_cycle(due_subs, CHECK_INTERVAL_SECONDS, API_CALLS_PER_HOUR, calls_per_check)
+                    pause = 0
+                    # Не требующие проверки подписки — в начало, их пропуск мгновенный
+                    subs = sorted(subs, key=lambda s: pacing.offsets.get(s.get('id'), -1.0))
+                    logger.info(
+                        f"⏱️ Равномерный режим: {len(due_subs)} подписок, ~{pacing.calls} запросов "
+                        f"за {int(pacing.cycle_seconds)}с (≈{pacing.calls_per_minute:.1f} запросов/мин)"
+                    )
                 
                 for i, sub in enumerate(subs, 1):
+                    if stop is not None and stop.is_set():
+                        break
+                    if len(checked) >= CHECKPOINT_EVERY:
+                        _flush_checkpoint(checked)
+                    for user_id in digests.due_users(loop.time()):
+                        await _send_digest(bot, user_id, digests.pop(user_id), last_evaluation)
+                        metrics.set_gauge("notifications.pending", len(digests))
+
+                    key = sub_keys.get(sub.get('id'))
+                    if key not in due_keys:
+                        skipped_subs += 1
+                        saved_calls += calls_per_check(sub)
+                        continue
+
+                    if quota_plan is not None and sub.get('id') in quota_plan.narrowed:
+                        sub = narrow_window(sub)
+
+                    if pacing is not None:
+                        wait = cycle_started + pacing.offsets[sub.get('id')] - loop.time()
+                        if wait > 0 and await _sleep_or_stop(stop, wait):
+                            break
+
+                    # API «лежит» — не шлём трафик, оставшиеся подписки проверим в следующем цикле
+                    if api_circuit.is_open:
+                        logger.warning(
+                            f"🚧 API недоступно, проверка {len(subs) - i + 1} подписок отложена "
+                            f"(повтор через ~{int(api_circuit.retry_after())}с)"
+                        )
+                        break
+
                     try:
                         sub_id = sub.get('id')
                         origin = sub.get('origin')
@@ -62,7 +358,10 @@ async def check_subscriptions_task(bot: Bot):
                         return_date = safe_parse_date(sub.get('return_date'))
 
                         # Лог начала обработки подписки
-                        logger.info(f"🔎 Обработка подписки #{sub_id}: {origin} -> {destination}")
+                        logger.info(
+                            "🔎 Обработка подписки #%s: %s -> %s", sub_id, origin, destination,
+                            extra=sampled(sub=sub_id, route=f"{origin}-{destination}"),
+                        )
                         
                         # --- ИСПРАВЛЕНИЕ: Пропускаем подписку, если дата вылета невалидна ---
                         if not depart_date:
@@ -70,120 +369,154 @@ async def check_subscriptions_task(bot: Bot):
                             continue
                         # -------------------------------------------------------------------
 
-                        logger.debug(f"Sub #{sub_id} params: depart_date={depart_date}, return_date={return_date}, passengers={passengers}, stored_threshold={threshold}, threshold_flag={sub.get('threshold_is_manual')}")
-                        
-                        # Формируем диапазон дат ±7 дней
-                        search_dates = [depart_date + timedelta(days=shift) for shift in range(-7, 8)]
+                        logger.debug(
+                            "Sub #%s params: depart_date=%s, return_date=%s, passengers=%s, stored_threshold=%s, threshold_flag=%s",
+                            sub_id, depart_date, return_date, passengers, threshold, sub.get('threshold_is_manual'),
+                        )
                         
                         found_price = 0
                         best_offer_meta = {}
+                        evaluation_complete = True
 
-                        if return_date:
-                            # ПОИСК ТУДА-ОБРАТНО
-                            stay_days = (return_date - depart_date).days
-                            offers = await search_round_trip_fixed_stay(
-                                origin=origin,
-                                destination=destination,
-                                depart_date=depart_date,
-                                return_date=return_date,
-                                passengers=passengers,
-                                days_flex=7,
-                                limit=5,
-                                session=session
-                            )
-                            logger.info(f"📊 Sub #{sub_id}: Получено {len(offers)} комбинаций 'туда-обратно' от API")
+                        payload = await fetch_subscription_offers(sub, session=session)
+                        kind = "комбинаций 'туда-обратно'" if return_date else "билетов в одну сторону"
+                        logger.info(
+                            "📊 Sub #%s: Получено %d %s от API", sub_id, len(payload), kind,
+                            extra=sampled(sub=sub_id, offers=len(payload)),
+                        )
 
-                            if offers:
-                                offers.sort(key=lambda x: x['total_price'])
-                                found_price = offers[0]['total_price']
-                                best_offer_meta = offers[0]
-
-                                # Debug preview
-                                logger.debug(f"Sub #{sub_id} best_offer_meta preview: {str(best_offer_meta)[:800]}")
-                                logger.info(f"Sub #{sub_id}: Found round-trip price: {found_price}")
+                        # Ошибка запроса — это не «нет рейсов»: интервал и память оценки не трогаем
+                        if getattr(payload, "failed", False):
+                            logger.warning(f"⚠️ Sub #{sub_id}: не удалось получить данные от API ({payload.error})")
+                            await asyncio.sleep(pause)
+                            continue
 
-                        # ПОИСК В ОДНУ СТОРОНУ
-                        else:
-                            results = await search_flights_for_dates(
-                                origin=origin,
-                                destination=destination,
-                                dates=search_dates,
-                                limit_per_day=5,
-                                session=session
+                        # Ответы API и параметры подписки те же, что при прошлой проверке —
+                        # результат оценки заранее известен, пропускаем её.
+                        fingerprint = getattr(payload, "fingerprint", None)
+                        inputs = (fingerprint,) + _evaluation_inputs(sub)
+                        memo = last_evaluation.get(sub_id)
+                        if fingerprint is not None and memo and memo[0] == inputs:
+                            logger.info(
+                                "⏸️ Sub #%s: ответы API и порог не изменились, оценка пропущена", sub_id,
+                                extra=sampled(sub=sub_id),
                             )
-                            logger.info(f"📊 Sub #{sub_id}: Получено {len(results)} билетов в одну сторону от API")
+                            if key not in observed_keys:
+                                observed_keys.add(key)
+                                tracker.observe(key, memo[1], cycle_started)
+                            touch_price_snapshot(sub_id)
+                            checked.append(sub_id)
+                            metrics.inc("scheduler.checked")
+                            await asyncio.sleep(pause)
+                            continue
 
-                            if results:
-                                results.sort(key=lambda x: float(x.get('price', 999999)))
-                                raw_price = float(results[0].get('price', 0))
-                                found_price = int(raw_price * passengers)
-                                best_offer_meta = results[0]
+                        found_price, best_offer_meta = pick_best_offer(sub, payload)
+                        if found_price:
+                            # Debug preview
+                            logger.debug("Sub #%s best_offer_meta preview: %.800s", sub_id, best_offer_meta)
+                        set_price_snapshot(sub_id, found_price, offer_summary(best_offer_meta) if found_price else None)
+                        checked.append(sub_id)
+                        metrics.inc("scheduler.checked")
 
-                                # Debug preview
-                                logger.debug(f"Sub #{sub_id} best_offer_meta preview: {str(best_offer_meta)[:800]}")
-                                logger.info(f"Sub #{sub_id}: Found one-way price: {found_price} (raw: {raw_price})")
+                        if key not in observed_keys:
+                            observed_keys.add(key)
+                            interval = tracker.observe(key, found_price, cycle_started)
+                            logger.debug("Sub #%s: интервал проверки маршрута %dс", sub_id, interval)
 
                         # ЛОГ: Проверка найденной цены
                         if found_price > 0:
-                            logger.info(f"💰 Sub #{sub_id}: Лучшая цена {found_price} RUB (Ваш порог: {threshold})")
+                            logger.info(
+                                "💰 Sub #%s: Лучшая цена %s RUB (Ваш порог: %s)", sub_id, found_price, threshold,
+                                extra=sampled(sub=sub_id, price=found_price, threshold=threshold),
+                            )
                             
                             last_notified = sub.get('last_notified_price')
                             
                             # Проверка условий отправки уведомления
                             if found_price <= threshold and found_price != last_notified:
-                                logger.info(f"🎯 Условие выполнено! Отправка уведомления пользователю {sub['user_id']}")
-                                
-                                airline_name = get_airline_name(best_offer_meta.get('airline', ''))
-                                
-                                if return_date:
-                                    d_str = best_offer_meta.get('outbound', {}).get('departure_at', '')[:10]
-                                    r_str = best_offer_meta.get('inbound', {}).get('departure_at', '')[:10]
-                                    dates_str = f"{d_str} ⇄ {r_str}"
-                                else:
-                                    dates_str = f"{best_offer_meta.get('departure_at', '')[:10]}"
-
-                                text = (
-                                    f"🔔 <b>Цена упала! (±7 дней)</b>\n"
-                                    f"✈️ {origin} → {destination}\n"
-                                    f"📅 {dates_str}\n"
-                                    f"🏢 {airline_name}\n\n"
-                                    f"💰 <b>{found_price} RUB</b>\n"
-                                    f"🎯 Цель: {int(threshold)} RUB"
+                                logger.info(
+                                    "🎯 Условие выполнено! Отправка уведомления пользователю %s", sub['user_id'],
+                                    extra=kv(sub=sub_id, price=found_price, threshold=threshold),
                                 )
-                                
-                                try:
-                                    await bot.send_message(chat_id=sub['user_id'], text=text, parse_mode="HTML")
-                                    # Обновляем last_notified
-                                    set_last_notified(sub_id, found_price)
-                                    logger.info(f"📩 Сообщение отправлено в Telegram")
-
-                                    # Если порог был динамическим, обновляем его
+
+                                if sub['user_id'] in digest_users:
+                                    # Отправится вместе с другими уведомлениями пользователя
+                                    alert = Alert(sub, found_price, _alert_lines(sub, found_price, best_offer_meta))
+                                    digests.add(sub['user_id'], alert, loop.time())
+                                    metrics.set_gauge("notifications.pending", len(digests))
+                                    logger.info(f"🗂️ Sub #{sub_id}: уведомление добавлено в дайджест")
+                                else:
+                                    text = (
+                                        f"🔔 <b>Цена упала! ({describe_window(*subscription_window(sub))})</b>\n"
+                                        + _alert_lines(sub, found_price, best_offer_meta)
+                                    )
+
                                     try:
-                                        if sub.get("threshold_is_manual") in (0, "0", False):
-                                            update_subscription_threshold(sub_id, found_price, threshold_is_manual=0)
-                                            logger.info(f"🔁 Sub #{sub_id}: Порог обновлён (динамический) -> {found_price}")
+                                        await bot.send_message(chat_id=sub['user_id'], text=text, parse_mode="HTML")
+                                        # Обновляем last_notified (и динамический порог)
+                                        _mark_notified(sub, found_price)
+                                        logger.info("📩 Сообщение отправлено в Telegram", extra=kv(sub=sub_id))
                                     except Exception as e:
-                                        logger.exception(f"Ошибка обновления порога для подписки {sub_id}: {e}")
-
-                                except Exception as e:
-                                    logger.error(f"Ошибка отправки сообщения: {e}")
+                                        evaluation_complete = False
+                                        logger.error(f"Ошибка отправки сообщения: {e}")
                             else:
                                 if found_price > threshold:
-                                    logger.info(f"⏭️ Цена {found_price} выше порога {threshold}, уведомление не нужно.")
+                                    logger.info(
+                                        "⏭️ Цена %s выше порога %s, уведомление не нужно.", found_price, threshold,
+                                        extra=sampled(sub=sub_id),
+                                    )
                                 elif found_price == last_notified:
-                                    logger.info(f"⏭️ Цена {found_price} уже была сообщена ранее.")
+                                    logger.info(
+                                        "⏭️ Цена %s уже была сообщена ранее.", found_price, extra=sampled(sub=sub_id)
+                                    )
                         else:
-                            logger.info(f"🔸 Sub #{sub_id}: API не вернул ни одного билета на эти даты.")
+                            logger.info(
+                                "🔸 Sub #%s: API не вернул ни одного билета на эти даты.", sub_id,
+                                extra=sampled(sub=sub_id),
+                            )
+
+                        # Неотправленное уведомление должно повториться в следующем цикле
+                        if evaluation_complete:
+                            last_evaluation[sub_id] = (inputs, found_price)
+                        else:
+                            last_evaluation.pop(sub_id, None)
 
                     except Exception as e:
                         logger.exception(f"Критическая ошибка при обработке подписки {sub.get('id')}: {e}")
                     
                     # Маленькая пауза между подписками для стабильности
-                    await asyncio.sleep(1.5)
+                    await asyncio.sleep(pause)
+
+            # Конец цикла (или остановка) — отправляем все накопленные дайджесты
+            for user_id in digests.users():
+                await _send_digest(bot, user_id, digests.pop(user_id), last_evaluation)
+            metrics.set_gauge("notifications.pending", len(digests))
+            metrics.observe("scheduler.cycle_seconds", loop.time() - cycle_started)
+            _flush_checkpoint(checked)
+            if stop is not None and stop.is_set():
+                break
 
-            logger.info("✅ --- ЦИКЛ ЗАВЕРШЕН. Сон 10 минут ---")
-            await asyncio.sleep(600)
+            if subs:
+                logger.info(
+                    f"📉 Адаптивный интервал: пропущено {skipped_subs}/{len(subs)} подписок, "
+                    f"сэкономлено ~{saved_calls} запросов к API за цикл "
+                    f"(ожидаемая экономия {tracker.expected_savings():.0%})"
+                )
+            sleep_for = CHECK_INTERVAL_SECONDS
+            if pacing is not None:
+                # Цикл занимает ровно cycle_seconds: досыпаем остаток после последнего слота
+                sleep_for = max(0.0, cycle_started + pacing.cycle_seconds - loop.time())
+            elif quota_plan is not None:
+                # Растянутый под квоту цикл: ждём, пока не пройдёт его полная длительность
+                sleep_for = max(sleep_for, cycle_started + quota_plan.cycle_seconds - loop.time())
+            logger.info(f"✅ --- ЦИКЛ ЗАВЕРШЕН. Сон {sleep_for:.0f} с ---")
+            if await _sleep_or_stop(stop, sleep_for):
+                break
 
         except Exception as e:
+            _flush_checkpoint(checked)
             logger.exception("Ошибка в основном цикле планировщика. Перезапуск через 60с...")
-            await asyncio.sleep(60)
\ No newline at end of file
+            if await _sleep_or_stop(stop, 60):
+                break
+
+    logger.info("🛑 Планировщик остановлен, прогресс цикла сохранён")
\ No newline at end of file
@@ -0,0 +1,151 @@
+# services/search_sessions.py
+import secrets
+import time
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional
+
+from config import SEARCH_SESSION_TTL, SEARCH_SESSION_MAX_USERS, SEARCH_SESSION_MAX_OFFERS
+
+SORT_PRICE = "price"
+SORT_TIME = "time"
+SORT_AIRLINE = "airline"
+
+
+class Leg(NamedTuple):
+    origin: str
+    destination: str
+    departure_at: str
+    airline: str
+    flight_number: str
+    transfers: int
+    duration: int
+
+
+class CompactOffer(NamedTuple):
+    """Предложение в компактном виде: цена на всех пассажиров, туда и (опционально) обратно."""
+    total_price: int
+    outbound: Leg
+    inbound: Optional[Leg]
+
+    @property
+    def is_direct(self) -> bool:
+        return self.outbound.transfers == 0 and (self.inbound is None or self.inbound.transfers == 0)
+
+
+def _leg(raw: dict) -> Leg:
+    return Leg(
+        raw.get("origin", ""),
+        raw.get("destination", ""),
+        raw.get("departure_at", ""),
+        raw.get("airline", ""),
+        str(raw.get("flight_number", "")),
+        int(raw.get("transfers") or 0),
+        int(raw.get("duration_to") or raw.get("duration") or 0),
+    )
+
+
+def compact_one_way(results: List[dict], passengers: int) -> List[CompactOffer]:
+    return [
+        CompactOffer(int(float(r.get("price", 0)) * passengers), _leg(r), None)
+        for r in results
+    ]
+
+
+def compact_round_trip(offers: List[dict]) -> List[CompactOffer]:
+    return [
+        CompactOffer(int(o["total_price"]), _leg(o["outbound"]), _leg(o["inbound"]))
+        for o in offers
+    ]
+
+
+class SearchSession:
+    """
+    Результаты одного поиска. id передаётся в callback_data кнопок сообщения
+    с результатами: кнопки старого сообщения не действуют на новый поиск.
+    """
+    __slots__ = (
+        "id", "origin", "destination", "depart", "ret", "passengers",
+        "offers", "sort", "direct_only", "page", "expires_at",
+    )
+
+    def __init__(self, origin, destination, depart, ret, passengers, offers: List[CompactOffer]):
+        self.id = secrets.token_hex(4)
+        self.origin = origin
+        self.destination = destination
+        self.depart = depart
+        self.ret = ret
+        self.passengers = passengers
+        self.offers = offers[:SEARCH_SESSION_MAX_OFFERS]
+        self.sort = SORT_PRICE
+        self.direct_only = False
+        self.page = 0
+        self.expires_at = 0.0
+
+    def view(self) -> List[CompactOffer]:
+        """Предложения с учётом текущих сортировки и фильтра."""
+        offers = [o for o in self.offers if o.is_direct] if self.direct_only else list(self.offers)
+        if self.sort == SORT_TIME:
+            offers.sort(key=lambda o: (o.outbound.departure_at, o.total_price))
+        elif self.sort == SORT_AIRLINE:
+            offers.sort(key=lambda o: (o.outbound.airline, o.total_price))
+        else:
+            offers.sort(key=lambda o: o.total_price)
+        return offers
+
+    def page_of(self, page_size: int):
+        """Возвращает (предложения текущей страницы, всего страниц); номер страницы поджимается в границы."""
+        offers = self.view()
+        pages = max(1, (len(offers) + page_size - 1) // page_size)
+        self.page = min(max(self.page, 0), pages - 1)
+        start = self.page * page_size
+        return offers[start:start + page_size], pages
+
+
+class SearchSessionStore:
+    """
+    Результаты последнего поиска каждого пользователя: живут ttl секунд,
+    хранится не больше max_users сессий (вытесняются давно не использованные).
+    """
+
+    def __init__(self, ttl: float = SEARCH_SESSION_TTL, max_users: int = SEARCH_SESSION_MAX_USERS):
+        self.ttl = ttl
+        self.max_users = max_users
+        self._sessions: "OrderedDict[int, SearchSession]" = OrderedDict()
+
+    def put(self, user_id: int, session: SearchSession) -> None:
+        self._purge_expired()
+        session.expires_at = time.monotonic() + self.ttl
+        self._sessions[user_id] = session
+        self._sessions.move_to_end(user_id)
+        while len(self._sessions) > self.max_users:
+            self._sessions.popitem(last=False)
+
+    def get(self, user_id: int, session_id: Optional[str] = None) -> Optional[SearchSession]:
+        """Сессия пользователя; с session_id — только если это она (иначе None)."""
+        session = self._sessions.get(user_id)
+        if session is None or (session_id is not None and session.id != session_id):
+            return None
+        if session.expires_at < time.monotonic():
+            del self._sessions[user_id]
+            return None
+        session.expires_at = time.monotonic() + self.ttl
+        self._sessions.move_to_end(user_id)
+        return session
+
+    def drop(self, user_id: int) -> None:
+        self._sessions.pop(user_id, None)
+
+    def _purge_expired(self) -> None:
+        now = time.monotonic()
+        # Порядок — по последнему использованию, поэтому истёкшие сессии в начале
+        while self._sessions:
+            user_id, session = next(iter(self._sessions.items()))
+            if session.expires_at >= now:
+                break
+            del self._sessions[user_id]
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+search_sessions = SearchSessionStore()
@@ -0,0 +1,75 @@
+# services/search_tasks.py
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Hashable, NamedTuple, Optional, TypeVar
+
+from config import SEARCH_DEBOUNCE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class InFlightSearch(NamedTuple):
+    key: Hashable
+    task: asyncio.Task
+    started_at: float
+
+
+class SearchTaskRegistry:
+    """
+    Текущий поиск каждого пользователя. Новый поиск отменяет предыдущий
+    (вместе со всеми его запросами к API), повторное нажатие с теми же
+    параметрами в течение debounce секунд не запускает второй поиск.
+    """
+
+    def __init__(self, debounce: float = SEARCH_DEBOUNCE_SECONDS):
+        self.debounce = debounce
+        self._running: Dict[int, InFlightSearch] = {}
+
+    def is_duplicate(self, user_id: int, key: Hashable) -> bool:
+        """Тот же поиск уже идёт и начат недавно — повторное нажатие можно игнорировать."""
+        current = self._running.get(user_id)
+        return (
+            current is not None
+            and not current.task.done()
+            and current.key == key
+            and time.monotonic() - current.started_at < self.debounce
+        )
+
+    def cancel(self, user_id: int) -> bool:
+        current = self._running.pop(user_id, None)
+        if current is None or current.task.done():
+            return False
+        current.task.cancel()
+        logger.info(f"🛑 Поиск пользователя {user_id} отменён")
+        return True
+
+    async def run(self, user_id: int, key: Hashable, factory: Callable[[], Awaitable[T]]) -> Optional[T]:
+        """
+        Запускает поиск пользователя, отменив предыдущий. Возвращает результат
+        или None, если поиск отменён более новым поиском или cancel().
+        """
+        self.cancel(user_id)
+        task = asyncio.ensure_future(factory())
+        entry = InFlightSearch(key, task, time.monotonic())
+        self._running[user_id] = entry
+        try:
+            # wait не пробрасывает отмену самой задачи — её различаем ниже
+            await asyncio.wait({task})
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        finally:
+            if self._running.get(user_id) is entry:
+                del self._running[user_id]
+        if task.cancelled():
+            return None
+        return task.result()
+
+    def __len__(self) -> int:
+        return len(self._running)
+
+
+search_tasks = SearchTaskRegistry()
@@ -1,16 +1,60 @@
 # services/travelpayouts.py
 import aiohttp
 import asyncio
+import json
 import logging
+import random
+import time
+import zlib
 from datetime import date, datetime, timedelta
-from typing import List, Dict, Union, Optional
+from typing import AsyncIterator, List, Dict, Tuple, Union, Optional
 
-from config import TRAVELPAYOUTS_TOKEN
+from config import (
+    TRAVELPAYOUTS_API_URL,
+    TRAVELPAYOUTS_TOKEN,
+    API_TIMEOUT_SECONDS,
+    API_MAX_RETRIES,
+    API_BACKOFF_BASE,
+    API_BACKOFF_MAX,
+    API_CIRCUIT_FAILURE_THRESHOLD,
+    API_CIRCUIT_RESET_SECONDS,
+    RESPONSE_CACHE_TTL,
+    RESPONSE_CACHE_MAX,
+    RESPONSE_CACHE_DB,
+    PRICE_TABLE_DB,
+    PRICE_TABLE_MAX_AGE_HOURS,
+    PRICE_TABLE_MAX_ROUTES,
+    PRICE_HISTORY_DAYS,
+    ANYWHERE_CONCURRENCY,
+    API_CASSETTE_MODE,
+    API_CASSETTE_PATH,
+    API_CASSETTE_LATENCY,
+    MONTH_REFETCH_MAX_DAYS,
+)
+from services.circuit_breaker import CircuitBreaker
+from services.response_cache import ResponseCache, ResponseCacheStore
+from services.price_table import PriceTable, PriceTableStore
+from services.fetch_planner import plan_window, month_limit, window_dates
+from services.iata import resolve_airline
+from services.cassette import Cassette
+from services.metrics import metrics
+from services.quota import api_quota
+from services.log_setup import sampled
 
 # Настраиваем отдельный логгер для API запросов
 logger = logging.getLogger(__name__)
 
-API_URL = "https://api.travelpayouts.com/aviasales/v3/prices_for_dates"
+API_URL = TRAVELPAYOUTS_API_URL
+
+# Статусы, при которых запрос имеет смысл повторить
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# Общий для бота и планировщика предохранитель: при «падении» API перестаём его нагружать
+api_circuit = CircuitBreaker(
+    "travelpayouts",
+    failure_threshold=API_CIRCUIT_FAILURE_THRESHOLD,
+    reset_timeout=API_CIRCUIT_RESET_SECONDS,
+)
 
 AIRLINE_NAMES = {
     "SU": "Аэрофлот", "DP": "Победа", "S7": "S7 Airlines", "U6": "Уральские авиалинии",
@@ -20,8 +64,74 @@ AIRLINE_NAMES = {
     "DV": "SCAT", "J2": "AZAL",
 }
 
+# Кэш ответов API, общий для всех видов поиска
+response_cache = ResponseCache(
+    ttl=RESPONSE_CACHE_TTL,
+    max_entries=RESPONSE_CACHE_MAX,
+    store=ResponseCacheStore(RESPONSE_CACHE_DB) if RESPONSE_CACHE_DB else None,
+)
+
+# Минимальные цены по маршруту и дню из всех ответов API (мгновенный предпросмотр поиска)
+price_table = PriceTable(
+    max_age=PRICE_TABLE_MAX_AGE_HOURS * 3600,
+    max_routes=PRICE_TABLE_MAX_ROUTES,
+    store=PriceTableStore(PRICE_TABLE_DB, PRICE_HISTORY_DAYS) if PRICE_TABLE_DB else None,
+)
+
+# Кассета для записи/воспроизведения ответов API (None — работаем с живым API)
+cassette = Cassette(API_CASSETTE_PATH, API_CASSETTE_MODE) if API_CASSETTE_MODE else None
+
+# Отпечатки последних ответов API: (origin, destination, date, limit) -> crc32 тела
+_response_fingerprints: Dict[tuple, int] = {}
+_FINGERPRINTS_MAX = 50000
+
+class SearchResult(list):
+    """
+    Список рейсов (или комбинаций туда-обратно) с отпечатком ответов API.
+    unchanged — все ответы, из которых он собран, совпали с предыдущими;
+    fingerprint — общий отпечаток ответов (None, если какой-то запрос не удался);
+    error — причина неудачи хотя бы одного запроса (None, если все прошли).
+    """
+
+    def __init__(
+        self,
+        items=(),
+        unchanged: bool = False,
+        fingerprint: Optional[int] = None,
+        error: Optional[str] = None,
+    ):
+        super().__init__(items)
+        self.unchanged = unchanged
+        self.fingerprint = fingerprint
+        self.error = error
+
+    @property
+    def failed(self) -> bool:
+        """Данных нет из-за ошибки запроса, а не потому что рейсов не нашлось."""
+        return self.error is not None and not self
+
+def _first_error(parts: List[SearchResult]) -> Optional[str]:
+    return next((p.error for p in parts if p.error), None)
+
+def _combine_fingerprints(parts: List[SearchResult]) -> Optional[int]:
+    fingerprints = [p.fingerprint for p in parts]
+    if not fingerprints or None in fingerprints:
+        return None
+    return zlib.crc32(",".join(map(str, fingerprints)).encode())
+
+def _remember_fingerprint(key: tuple, fingerprint: int) -> bool:
+    """Сохраняет отпечаток ответа и возвращает True, если он не изменился."""
+    previous = _response_fingerprints.pop(key, None)
+    if len(_response_fingerprints) >= _FINGERPRINTS_MAX:
+        _response_fingerprints.pop(next(iter(_response_fingerprints)))
+    _response_fingerprints[key] = fingerprint
+    return previous == fingerprint
+
 def get_airline_name(iata_code: str) -> str:
-    return AIRLINE_NAMES.get(iata_code, iata_code)
+    if iata_code in AIRLINE_NAMES:
+        return AIRLINE_NAMES[iata_code]
+    airline = resolve_airline(iata_code) if iata_code else None
+    return airline.name_ru if airline else iata_code
 
 def _to_date(d: Union[date, datetime, str]) -> date:
     if isinstance(d, datetime):
@@ -30,50 +140,132 @@ def _to_date(d: Union[date, datetime, str]) -> date:
         return d
     return datetime.strptime(d, "%Y-%m-%d").date()
 
+def _backoff_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    """Экспоненциальная задержка с полным джиттером; Retry-After от API имеет приоритет."""
+    cap = min(API_BACKOFF_MAX, API_BACKOFF_BASE * (2 ** attempt))
+    delay = random.uniform(0, cap)
+    if retry_after and retry_after.isdigit():
+        delay = max(delay, min(float(retry_after), API_BACKOFF_MAX))
+    return delay
+
+def _accept_body(cache_key: tuple, body: bytes) -> SearchResult:
+    """Разбирает тело успешного ответа: отпечаток, кэш, список рейсов."""
+    fingerprint = zlib.crc32(body)
+    unchanged = _remember_fingerprint(cache_key, fingerprint)
+    data = json.loads(body)
+    # ВАЖНО: Логируем сколько записей реально пришло
+    raw_data = data.get("data", [])
+    response_cache.put(cache_key, raw_data, fingerprint)
+    price_table.update(cache_key[0], cache_key[1], raw_data)
+    logger.info(
+        "📥 Ответ API: получено рейсов: %d", len(raw_data),
+        extra=sampled(route=f"{cache_key[0]}-{cache_key[1]}", departure_at=cache_key[2], offers=len(raw_data)),
+    )
+
+    # Если нужно увидеть структуру первого рейса (для отладки парсинга):
+    if raw_data:
+        logger.debug("📋 Пример данных первого рейса: %s", raw_data[0])
+    return SearchResult(raw_data, unchanged=unchanged, fingerprint=fingerprint)
+
+async def _replay(cache_key: tuple) -> SearchResult:
+    """Ответ из кассеты вместо запроса к API (с записанной или нулевой задержкой)."""
+    recording = cassette.lookup(cache_key)
+    if recording is None:
+        logger.warning(f"📼 Нет записи в кассете для {cache_key}")
+        return SearchResult(error="cassette_miss")
+    if API_CASSETTE_LATENCY == "recorded" and recording.elapsed > 0:
+        await asyncio.sleep(recording.elapsed)
+    return _accept_body(cache_key, recording.body)
+
 async def _fetch(
     session: aiohttp.ClientSession,
     origin: str,
     destination: str,
     d: Union[date, datetime, str],
     limit: int = 10,
-) -> List[dict]:
-    if isinstance(d, (str, datetime)):
+) -> SearchResult:
+    """Запрос цен на дату (date/'YYYY-MM-DD') или на весь месяц ('YYYY-MM')."""
+    if isinstance(d, str) and len(d) == 7:
+        departure_at = d
+    else:
         d = _to_date(d)
+        departure_at = d.strftime("%Y-%m-%d")
+
+    cache_key = (origin, destination, departure_at, limit)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return SearchResult(cached.data, unchanged=True, fingerprint=cached.fingerprint)
+
+    if cassette is not None and cassette.replaying:
+        return await _replay(cache_key)
 
     params = {
         "origin": origin,
         "destination": destination,
-        "departure_at": d.strftime("%Y-%m-%d"),
+        "departure_at": departure_at,
         "currency": "rub",
         "limit": str(limit),
         "token": TRAVELPAYOUTS_TOKEN,
         "one_way": "true",
     }
 
-    try:
-        async with session.get(API_URL, params=params) as r:
-            # Логируем полный URL (без токена для безопасности, либо с ним для полной проверки)
-            logger.info(f"🔍 Запрос: {origin}->{destination} на {d} | URL: {r.url}")
-            
-            if r.status == 200:
-                data = await r.json()
-                # ВАЖНО: Логируем сколько записей реально пришло
-                raw_data = data.get("data", [])
-                logger.info(f"📥 Ответ API: получено рейсов: {len(raw_data)}")
-                
-                # Если нужно увидеть структуру первого рейса (для отладки парсинга):
-                if raw_data:
-                    logger.debug(f"📋 Пример данных первого рейса: {raw_data[0]}")
-                
-                return raw_data
-            
-            text = await r.text()
-            logger.error(f"❌ Ошибка API {r.status}: {text}")
-            return []
-            
-    except Exception as e:
-        logger.exception(f"💥 Сетевая ошибка: {e}")
-        return []
+    if not api_circuit.allow_request():
+        logger.warning(f"🚧 Запрос {origin}->{destination} на {d} пропущен: API недоступно (circuit open)")
+        return SearchResult(error="circuit_open")
+
+    timeout = aiohttp.ClientTimeout(total=API_TIMEOUT_SECONDS)
+    error = None
+    for attempt in range(API_MAX_RETRIES + 1):
+        retry_after = None
+        started = time.perf_counter()
+        metrics.inc("api.calls")
+        api_quota.record()
+        metrics.add_gauge("api.in_flight", 1)
+        try:
+            async with session.get(API_URL, params=params, timeout=timeout) as r:
+                # Без URL: в нём токен API
+                logger.info(
+                    "🔍 Запрос: %s->%s на %s | HTTP %d", origin, destination, departure_at, r.status,
+                    extra=sampled(route=f"{origin}-{destination}", departure_at=departure_at,
+                                  status=r.status, attempt=attempt),
+                )
+
+                if r.status == 200:
+                    body = await r.read()
+                    result = _accept_body(cache_key, body)
+                    if cassette is not None and cassette.recording:
+                        await cassette.record(cache_key, body, time.perf_counter() - started)
+                    api_circuit.record_success()
+                    return result
+
+                text = await r.text()
+                logger.error(f"❌ Ошибка API {r.status}: {text}")
+                metrics.inc("api.errors")
+                error = f"http_{r.status}"
+                if r.status not in RETRYABLE_STATUSES:
+                    # Ошибка запроса (например, неверный код IATA) — API при этом исправно
+                    api_circuit.record_success()
+                    return SearchResult(error=error)
+                retry_after = r.headers.get("Retry-After")
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            error = "timeout" if isinstance(e, asyncio.TimeoutError) else "network"
+            metrics.inc("api.errors")
+            logger.warning(f"💥 Сетевая ошибка ({origin}->{destination} на {d}, попытка {attempt + 1}): {e!r}")
+        except Exception as e:
+            metrics.inc("api.errors")
+            logger.exception(f"💥 Ошибка обработки ответа API: {e}")
+            api_circuit.record_failure()
+            return SearchResult(error="bad_response")
+        finally:
+            metrics.add_gauge("api.in_flight", -1)
+
+        if attempt == API_MAX_RETRIES or not api_circuit.allow_request():
+            break
+        await asyncio.sleep(_backoff_delay(attempt, retry_after))
+
+    api_circuit.record_failure()
+    return SearchResult(error=error)
 
 async def search_flights_for_dates(
     origin: str,
@@ -81,7 +273,7 @@ async def search_flights_for_dates(
     dates: List[Union[date, datetime, str]],
     limit_per_day: int = 10,
     session: Optional[aiohttp.ClientSession] = None
-) -> List[dict]:
+) -> SearchResult:
     if session:
         return await _execute_search(session, origin, destination, dates, limit_per_day)
     else:
@@ -94,17 +286,44 @@ async def _execute_search(
     destination: str,
     dates: List[Union[date, datetime, str]],
     limit_per_day: int
-) -> List[dict]:
-    # Используем asyncio.gather для параллельных запросов по всем датам (±7 дней)
+) -> SearchResult:
+    # Планировщик решает, какие даты запрашивать по дням, а какие — одним запросом на месяц
+    plan = plan_window([_to_date(d) for d in dates])
+    month_limits = {month: month_limit(limit_per_day, len(plan.window_days(month))) for month in plan.months}
     tasks = [
         _fetch(session, origin, destination, d, limit_per_day) 
-        for d in dates
+        for d in plan.day_dates
     ]
+    tasks += [_fetch(session, origin, destination, month, month_limits[month]) for month in plan.months]
+    # Используем asyncio.gather для параллельных запросов
     responses = await asyncio.gather(*tasks)
     
     results = []
-    for resp in responses:
+    for resp in responses[:len(plan.day_dates)]:
         results.extend(resp)
+    # Месячный ответ содержит весь месяц — оставляем только даты окна
+    missing: List[date] = []
+    for month, resp in zip(plan.months, responses[len(plan.day_dates):]):
+        in_window = [r for r in resp if r.get("departure_at", "")[:10] in plan.window]
+        results.extend(in_window)
+        if len(resp) >= month_limits[month]:
+            # Ответ обрезан лимитом: дни окна без вариантов добираем подневными запросами
+            # (не больше MONTH_REFETCH_MAX_DAYS — столько заложено в оценку плана)
+            covered = {r.get("departure_at", "")[:10] for r in in_window}
+            uncovered = [w for w in plan.window_days(month) if w not in covered]
+            if len(uncovered) > MONTH_REFETCH_MAX_DAYS:
+                logger.info(
+                    "Месячный ответ %s->%s %s обрезан: добираем %d из %d дней без вариантов",
+                    origin, destination, month, MONTH_REFETCH_MAX_DAYS, len(uncovered),
+                )
+            missing += [_to_date(w) for w in uncovered[:MONTH_REFETCH_MAX_DAYS]]
+    if missing:
+        refetched = await asyncio.gather(
+            *(_fetch(session, origin, destination, d, limit_per_day) for d in missing)
+        )
+        for resp in refetched:
+            results.extend(resp)
+        responses += refetched
 
     valid_results = [
         r for r in results
@@ -112,7 +331,51 @@ async def _execute_search(
     ]
 
     valid_results.sort(key=lambda x: float(x.get("price", 1e12)))
-    return valid_results
+    unchanged = bool(responses) and all(resp.unchanged for resp in responses)
+    return SearchResult(
+        valid_results,
+        unchanged=unchanged,
+        fingerprint=_combine_fingerprints(responses),
+        error=_first_error(responses),
+    )
+
+async def search_anywhere(
+    origin: str,
+    month: str,
+    destinations: List[str],
+    *,
+    limit_per_destination: int = 3,
+    concurrency: int = ANYWHERE_CONCURRENCY,
+    session: Optional[aiohttp.ClientSession] = None
+) -> AsyncIterator[Tuple[str, SearchResult]]:
+    """
+    Поиск «куда угодно»: по одному запросу на месяц (YYYY-MM) для каждого направления,
+    не больше concurrency запросов одновременно. Отдаёт (направление, результат)
+    по мере готовности — в порядке ответов API, а не списка.
+    """
+    candidates = [d for d in dict.fromkeys(destinations) if d and d != origin]
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(dest: str, s: aiohttp.ClientSession):
+        async with semaphore:
+            return dest, await _fetch(s, origin, dest, month, limit_per_destination)
+
+    async def run(s: aiohttp.ClientSession):
+        tasks = [asyncio.create_task(one(dest, s)) for dest in candidates]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    if session:
+        async for item in run(session):
+            yield item
+    else:
+        async with aiohttp.ClientSession() as local_session:
+            async for item in run(local_session):
+                yield item
 
 async def search_round_trip_fixed_stay(
     origin: str,
@@ -121,28 +384,24 @@ async def search_round_trip_fixed_stay(
     return_date: Union[date, datetime, str],
     *,
     days_flex: int = 7,
+    window_month: Optional[str] = None,
     passengers: int = 1,
     limit: int = 5,
     session: Optional[aiohttp.ClientSession] = None
-) -> List[Dict]:
+) -> SearchResult:
     """
-    Ищет билеты туда-обратно с сохранением интервала (stay_days) в диапазоне ±days_flex от depart_date.
+    Ищет билеты туда-обратно с сохранением интервала (stay_days) в диапазоне ±days_flex от depart_date
+    (или с вылетом в любой день месяца window_month, 'YYYY-MM').
     """
     d_date = _to_date(depart_date)
     r_date = _to_date(return_date)
     stay_days = (r_date - d_date).days
     
-    # Генерируем даты вылета: [Anchor-7 ... Anchor+7]
-    depart_dates = [
-        d_date + timedelta(days=i) 
-        for i in range(-days_flex, days_flex + 1)
-    ]
-    # Фильтруем прошлое
-    today = datetime.now().date()
-    depart_dates = [d for d in depart_dates if d >= today]
+    # Генерируем даты вылета: [Anchor-N ... Anchor+N] или весь месяц, без прошедших дат
+    depart_dates = window_dates(d_date, days_flex, window_month, today=datetime.now().date())
 
     if not depart_dates:
-        return []
+        return SearchResult()
     
     # Даты возврата жестко привязаны к дате вылета через stay_days
     # (если вылет сдвинулся на +1 день, возврат тоже сдвигается на +1 день)
@@ -198,7 +457,12 @@ async def search_round_trip_fixed_stay(
                 })
         
         combinations.sort(key=lambda x: x["total_price"])
-        return combinations[:limit]
+        return SearchResult(
+            combinations[:limit],
+            unchanged=outbound_res.unchanged and inbound_res.unchanged,
+            fingerprint=_combine_fingerprints([outbound_res, inbound_res]),
+            error=_first_error([outbound_res, inbound_res]),
+        )
     finally:
         if is_local:
             await session.close()
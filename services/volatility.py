@@ -0,0 +1,117 @@
+# services/volatility.py
+import time
+from typing import Dict, Optional, Tuple
+
+from config import ROUTE_CHECK_INTERVAL_MIN, ROUTE_CHECK_INTERVAL_MAX
+
+# Ключ маршрута: (origin, destination, depart_date, return_date)
+RouteKey = Tuple[str, str, str, str]
+
+# Во сколько раз сокращаем/увеличиваем интервал при изменении/стабильности цены
+SHRINK_FACTOR = 0.5
+GROW_FACTOR = 1.5
+# Сглаживание доли изменений цены (EMA)
+CHANGE_RATE_ALPHA = 0.3
+# Запас при сравнении со сроком: таймер event loop может сработать чуть раньше
+DUE_SLACK = 0.01
+
+
+def route_key(origin, destination, depart_date, return_date) -> RouteKey:
+    return (
+        str(origin or ""),
+        str(destination or ""),
+        str(depart_date or ""),
+        str(return_date or ""),
+    )
+
+
+class _RouteStats:
+    __slots__ = ("last_price", "interval", "next_due", "checks", "changes", "change_rate")
+
+    def __init__(self, interval: float):
+        self.last_price: Optional[int] = None
+        self.interval = interval
+        self.next_due = 0.0
+        self.checks = 0
+        self.changes = 0
+        self.change_rate = 1.0
+
+
+class VolatilityTracker:
+    """
+    Следит за тем, как часто меняется лучшая цена маршрута-даты, и подбирает
+    для него интервал проверки в пределах [min_interval, max_interval]:
+    цена изменилась — интервал сокращается, цена стоит на месте — растёт.
+    """
+
+    def __init__(
+        self,
+        min_interval: float = ROUTE_CHECK_INTERVAL_MIN,
+        max_interval: float = ROUTE_CHECK_INTERVAL_MAX,
+    ):
+        self.min_interval = float(min_interval)
+        self.max_interval = float(max(max_interval, min_interval))
+        self._stats: Dict[RouteKey, _RouteStats] = {}
+
+    def is_due(self, key: RouteKey, now: Optional[float] = None) -> bool:
+        stats = self._stats.get(key)
+        if stats is None:
+            return True
+        now = time.time() if now is None else now
+        return now + DUE_SLACK >= stats.next_due
+
+    def interval_for(self, key: RouteKey) -> float:
+        stats = self._stats.get(key)
+        return stats.interval if stats else self.min_interval
+
+    def observe(self, key: RouteKey, price: Optional[int], now: Optional[float] = None) -> float:
+        """
+        Учитывает результат проверки и возвращает новый интервал маршрута.
+        Пустой ответ API (price=None/0) интервал не меняет. Следующий срок
+        отсчитывается от now — планировщик передаёт начало цикла, в котором
+        маршрут проверен, а не момент самой проверки.
+        """
+        now = time.time() if now is None else now
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = _RouteStats(self.min_interval)
+            self._stats[key] = stats
+
+        stats.checks += 1
+        if price:
+            price = int(price)
+            changed = stats.last_price is not None and price != stats.last_price
+            if stats.last_price is not None:
+                stats.change_rate = (
+                    CHANGE_RATE_ALPHA * (1.0 if changed else 0.0)
+                    + (1 - CHANGE_RATE_ALPHA) * stats.change_rate
+                )
+            if changed:
+                stats.changes += 1
+                stats.interval = max(self.min_interval, stats.interval * SHRINK_FACTOR)
+            elif stats.last_price is not None:
+                stats.interval = min(self.max_interval, stats.interval * GROW_FACTOR)
+            stats.last_price = price
+
+        stats.next_due = now + stats.interval
+        return stats.interval
+
+    def forget_missing(self, active_keys) -> None:
+        """Удаляет статистику маршрутов, на которые больше нет подписок."""
+        active = set(active_keys)
+        for key in list(self._stats):
+            if key not in active:
+                del self._stats[key]
+
+    def expected_savings(self) -> float:
+        """
+        Ожидаемая доля сэкономленных проверок относительно проверки каждого
+        маршрута с минимальным интервалом (0.0 … 1.0).
+        """
+        if not self._stats:
+            return 0.0
+        ratio = sum(self.min_interval / s.interval for s in self._stats.values())
+        return 1.0 - ratio / len(self._stats)
+
+    def __len__(self) -> int:
+        return len(self._stats)
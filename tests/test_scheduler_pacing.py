@@ -0,0 +1,70 @@
+# tests/test_scheduler_pacing.py
+import asyncio
+import os
+
+import pytest
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("aiogram")
+os.environ.setdefault("BOT_TOKEN", "test")
+os.environ.setdefault("TRAVELPAYOUTS_TOKEN", "test")
+
+from services import scheduler  # noqa: E402
+from services.pacing import stable_offset  # noqa: E402
+from services.volatility import VolatilityTracker  # noqa: E402
+
+CYCLE_SECONDS = 0.4
+
+
+class _Session:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def test_min_interval_route_checked_in_every_paced_cycle(monkeypatch):
+    # Слот ближе к концу цикла: проверка сильно позже начала цикла
+    sub_id = next(i for i in range(1, 1000) if stable_offset(i) > 0.8)
+    sub = {
+        "id": sub_id, "user_id": 1, "origin": "MOW", "destination": "LED",
+        "depart_date": "2030-01-10", "return_date": None, "passengers": 1,
+        "threshold": 1, "flex_days": 0, "window_month": None, "last_notified_price": None,
+    }
+    cycles = []
+    checks = []
+    stop = asyncio.Event()
+
+    def get_subscriptions_for_check():
+        cycles.append(len(cycles) + 1)
+        return [dict(sub)]
+
+    async def fetch_subscription_offers(sub, session=None):
+        checks.append(cycles[-1])
+        if len(checks) == 2:
+            stop.set()
+        return [{"price": 5000 + len(checks)}]
+
+    monkeypatch.setattr(scheduler, "SCHEDULER_PACING", True)
+    monkeypatch.setattr(scheduler, "CHECK_INTERVAL_SECONDS", CYCLE_SECONDS)
+    monkeypatch.setattr(scheduler, "API_CALLS_PER_HOUR", 0)
+    monkeypatch.setattr(scheduler.api_quota, "per_hour", 0)
+    monkeypatch.setattr(
+        scheduler, "VolatilityTracker",
+        lambda: VolatilityTracker(min_interval=CYCLE_SECONDS, max_interval=CYCLE_SECONDS * 10),
+    )
+    monkeypatch.setattr(scheduler.aiohttp, "ClientSession", _Session)
+    monkeypatch.setattr(scheduler, "get_subscriptions_for_check", get_subscriptions_for_check)
+    monkeypatch.setattr(scheduler, "get_digest_users", lambda: set())
+    monkeypatch.setattr(scheduler, "fetch_subscription_offers", fetch_subscription_offers)
+    monkeypatch.setattr(scheduler, "offer_summary", lambda offer: "")
+    monkeypatch.setattr(scheduler, "set_price_snapshot", lambda *args: None)
+    monkeypatch.setattr(scheduler, "touch_price_snapshot", lambda *args: None)
+    monkeypatch.setattr(scheduler, "mark_subscriptions_checked", lambda ids: None)
+
+    async def run():
+        await asyncio.wait_for(scheduler.check_subscriptions_task(None, stop), timeout=5)
+
+    asyncio.run(run())
+    assert checks == [1, 2]
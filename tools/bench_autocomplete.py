@@ -0,0 +1,40 @@
+# tools/bench_autocomplete.py
+"""
+Замер сборки префиксного индекса и задержки подсказок.
+Запуск из корня проекта: python -m tools.bench_autocomplete
+"""
+import statistics
+import time
+
+from services.iata import load_reference
+from services.autocomplete import PrefixIndex
+
+QUERIES = ["Моск", "dub", "санкт", "ist", "Петер", "new", "Ба", "l", "Дуб", "tok"]
+
+
+def main(rounds: int = 2000):
+    started = time.perf_counter()
+    reference = load_reference()
+    loaded = time.perf_counter()
+    index = PrefixIndex(reference)
+    built = time.perf_counter()
+    print(f"load reference: {(loaded - started) * 1000:.2f} ms")
+    print(f"build index:    {(built - loaded) * 1000:.2f} ms ({len(index)} keys)")
+
+    samples = []
+    for i in range(rounds):
+        q = QUERIES[i % len(QUERIES)]
+        t0 = time.perf_counter()
+        index.search(q)
+        samples.append((time.perf_counter() - t0) * 1_000_000)
+    samples.sort()
+    print(
+        f"search: median {statistics.median(samples):.1f} µs, "
+        f"p99 {samples[int(len(samples) * 0.99) - 1]:.1f} µs, max {samples[-1]:.1f} µs"
+    )
+    for q in QUERIES[:3]:
+        print(q, "->", [f"{loc.name_ru} ({loc.code})" for loc in index.search(q)])
+
+
+if __name__ == "__main__":
+    main()
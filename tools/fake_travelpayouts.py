@@ -0,0 +1,96 @@
+# tools/fake_travelpayouts.py
+"""
+Локальный фейковый Travelpayouts (prices_for_dates) для нагрузочных тестов.
+Цены детерминированы: зависят только от маршрута и даты.
+Запуск из корня проекта: python -m tools.fake_travelpayouts --port 8765 --latency 0.05
+Бот направляется на него через TRAVELPAYOUTS_API_URL=http://127.0.0.1:8765/aviasales/v3/prices_for_dates
+"""
+import argparse
+import asyncio
+import calendar
+import random
+import zlib
+from datetime import date
+
+from aiohttp import web
+
+API_PATH = "/aviasales/v3/prices_for_dates"
+AIRLINES = ["SU", "DP", "S7", "U6", "UT", "WZ"]
+
+
+def _days(departure_at: str):
+    """Даты ответа: сама дата или все дни месяца для 'YYYY-MM'."""
+    if len(departure_at) == 7:
+        year, month = int(departure_at[:4]), int(departure_at[5:7])
+        return [date(year, month, d) for d in range(1, calendar.monthrange(year, month)[1] + 1)]
+    return [date.fromisoformat(departure_at[:10])]
+
+
+def fake_offers(origin: str, destination: str, departure_at: str, limit: int):
+    offers = []
+    for day in _days(departure_at):
+        rnd = random.Random(zlib.crc32(f"{origin}{destination}{day}".encode()))
+        for _ in range(3):
+            hour, minute = rnd.randrange(24), rnd.choice((0, 15, 30, 45))
+            airline = rnd.choice(AIRLINES)
+            offers.append({
+                "origin": origin,
+                "destination": destination,
+                "origin_airport": origin,
+                "destination_airport": destination,
+                "price": rnd.randrange(3000, 40000, 100),
+                "airline": airline,
+                "flight_number": str(rnd.randrange(100, 9999)),
+                "departure_at": f"{day.isoformat()}T{hour:02d}:{minute:02d}:00+03:00",
+                "transfers": rnd.choice((0, 0, 1, 2)),
+                "return_transfers": 0,
+                "duration": rnd.randrange(60, 900),
+                "duration_to": rnd.randrange(60, 900),
+                "link": f"/search/{origin}{day:%d%m}{destination}1",
+            })
+    offers.sort(key=lambda o: o["price"])
+    return offers[:limit]
+
+
+def create_app(latency: float = 0.0, error_rate: float = 0.0) -> web.Application:
+    """latency — задержка ответа (секунды), error_rate — доля ответов 503."""
+    app = web.Application()
+    stats = app["stats"] = {"requests": 0, "errors": 0}
+
+    async def prices_for_dates(request: web.Request) -> web.Response:
+        stats["requests"] += 1
+        if latency:
+            await asyncio.sleep(latency)
+        if error_rate and random.random() < error_rate:
+            stats["errors"] += 1
+            return web.json_response({"success": False, "error": "fake overload"}, status=503)
+        q = request.query
+        data = fake_offers(
+            q.get("origin", ""), q.get("destination", ""), q.get("departure_at", ""), int(q.get("limit", "10"))
+        )
+        return web.json_response({"success": True, "data": data, "currency": "rub"})
+
+    app.router.add_get(API_PATH, prices_for_dates)
+    return app
+
+
+async def start_server(host: str = "127.0.0.1", port: int = 8765, latency: float = 0.0,
+                       error_rate: float = 0.0) -> web.AppRunner:
+    runner = web.AppRunner(create_app(latency, error_rate))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    web.run_app(create_app(args.latency, args.error_rate), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
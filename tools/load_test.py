@@ -0,0 +1,276 @@
+# tools/load_test.py
+"""
+Нагрузочный тест обработчиков бота: N одновременных пользователей проходят
+сценарий поиск → подписка → редактирование. Синтетические апдейты подаются
+прямо в Dispatcher, Bot API заменён фейковой сессией, Travelpayouts —
+локальным фейковым сервером (tools/fake_travelpayouts.py).
+
+Запуск из корня проекта: python -m tools.load_test --users 500
+Отчёт: p50/p95/p99 задержки обработчиков по шагам, задержка event loop,
+рост памяти на пользователя.
+"""
+import argparse
+import asyncio
+import os
+import resource
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+FAKE_API_PORT = int(os.getenv("FAKE_API_PORT", "8765"))
+
+# Окружение задаётся до импорта config: токены-заглушки, фейковый API, кэш без диска
+os.environ.setdefault("BOT_TOKEN", "42:LOADTEST")
+os.environ.setdefault("TRAVELPAYOUTS_TOKEN", "loadtest")
+os.environ.setdefault(
+    "TRAVELPAYOUTS_API_URL", f"http://127.0.0.1:{FAKE_API_PORT}/aviasales/v3/prices_for_dates"
+)
+os.environ.setdefault("RESPONSE_CACHE_DB", "")
+os.environ.setdefault("PRICE_TABLE_DB", "")
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.base import BaseSession
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import InlineKeyboardMarkup, Message, Update
+from aiogram_calendar import SimpleCalendarCallback
+from aiogram_calendar.schemas import SimpleCalAct
+
+import database
+from tools.fake_travelpayouts import start_server
+
+BOT_ID = 42
+ROUTES = [("MOW", "LED"), ("MOW", "AER"), ("LED", "KZN"), ("MOW", "IST"), ("SVX", "MOW"), ("OVB", "DXB")]
+
+
+def _rss_kb() -> int:
+    """Текущий RSS процесса (КБ); без /proc — пиковый RSS."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _percentile(samples, q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+class FakeSession(BaseSession):
+    """
+    Сессия Bot API без сети: на каждый метод отвечает сразу, ответы-сообщения
+    собираются из параметров метода. Запоминает последние inline-клавиатуры
+    каждого чата — по ним виртуальный пользователь «нажимает» кнопки.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.calls = defaultdict(int)
+        self.keyboards = defaultdict(list)
+        self._message_ids = defaultdict(int)
+
+    async def make_request(self, bot, method, timeout=None):
+        name = type(method).__name__
+        self.calls[name] += 1
+        if getattr(method, "__returning__", None) is bool:
+            return True
+
+        chat_id = getattr(method, "chat_id", None) or 0
+        markup = getattr(method, "reply_markup", None)
+        if isinstance(markup, InlineKeyboardMarkup):
+            keyboards = self.keyboards[chat_id]
+            keyboards.append(markup)
+            del keyboards[:-5]
+        self._message_ids[chat_id] += 1
+        return Message.model_validate(
+            {
+                "message_id": getattr(method, "message_id", None) or self._message_ids[chat_id],
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": {"id": BOT_ID, "is_bot": True, "first_name": "bot"},
+                "text": getattr(method, "text", None) or "",
+            },
+            context={"bot": bot},
+        )
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self):
+        pass
+
+    def find_button(self, chat_id: int, prefix: str):
+        """callback_data последней показанной кнопки, начинающейся с prefix."""
+        for markup in reversed(self.keyboards[chat_id]):
+            for row in markup.inline_keyboard:
+                for button in row:
+                    if button.callback_data and button.callback_data.startswith(prefix):
+                        return button.callback_data
+        return None
+
+
+class VirtualUser:
+    def __init__(self, user_id: int, bot: Bot, dp: Dispatcher, session: FakeSession, latencies):
+        self.user_id = user_id
+        self.bot = bot
+        self.dp = dp
+        self.session = session
+        self.latencies = latencies
+        self._update_id = user_id * 1000
+
+    def _user(self):
+        return {"id": self.user_id, "is_bot": False, "first_name": f"user{self.user_id}"}
+
+    def _chat(self):
+        return {"id": self.user_id, "type": "private"}
+
+    async def _feed(self, step: str, payload: dict) -> None:
+        self._update_id += 1
+        update = Update.model_validate({"update_id": self._update_id, **payload}, context={"bot": self.bot})
+        started = time.perf_counter()
+        await self.dp.feed_update(self.bot, update)
+        self.latencies[step].append((time.perf_counter() - started) * 1000)
+
+    async def send_text(self, step: str, text: str) -> None:
+        await self._feed(step, {"message": {
+            "message_id": self._update_id, "date": int(time.time()),
+            "chat": self._chat(), "from": self._user(), "text": text,
+        }})
+
+    async def press(self, step: str, data: str) -> None:
+        await self._feed(step, {"callback_query": {
+            "id": str(self._update_id), "from": self._user(), "chat_instance": str(self.user_id),
+            "data": data,
+            "message": {
+                "message_id": 1, "date": int(time.time()),
+                "chat": self._chat(), "from": {"id": BOT_ID, "is_bot": True, "first_name": "bot"},
+                "text": "...",
+            },
+        }})
+
+    async def press_found(self, step: str, prefix: str) -> bool:
+        data = self.session.find_button(self.user_id, prefix)
+        if data is None:
+            self.latencies[f"{step} (нет кнопки)"].append(0.0)
+            return False
+        await self.press(step, data)
+        return True
+
+    @staticmethod
+    def _day(d: date) -> str:
+        return SimpleCalendarCallback(act=SimpleCalAct.day, year=d.year, month=d.month, day=d.day).pack()
+
+    async def run(self) -> None:
+        origin, destination = ROUTES[self.user_id % len(ROUTES)]
+        round_trip = self.user_id % 2 == 0
+        depart = date.today() + timedelta(days=20 + self.user_id % 40)
+
+        await self.send_text("/start", "/start")
+        await self.press("start_search", "start_search")
+        await self.send_text("origin", origin)
+        await self.send_text("destination", destination)
+        await self.send_text("passengers", str(1 + self.user_id % 3))
+        await self.press("trip_type", "trip_round" if round_trip else "trip_one_way")
+        await self.press("depart_date", self._day(depart))
+        if round_trip:
+            await self.press("return_date", self._day(depart + timedelta(days=7)))
+        await self.press_found("results_sort", "sr:sort:time")
+
+        if not await self.press_found("subscribe", "sub:"):
+            return
+        if not await self.press_found("threshold", "set_threshold_use:"):
+            return
+        await self.press("my_subs", "my_subs")
+        if await self.press_found("edit_sub", "edit_sub:"):
+            await self.press_found("sub_window", "sub_window:")
+
+
+async def _lag_monitor(samples, stop: asyncio.Event, interval: float = 0.01) -> None:
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, (loop.time() - expected) * 1000))
+
+
+async def run(users: int, ramp: float, api_latency: float) -> None:
+    db_dir = tempfile.mkdtemp(prefix="loadtest_")
+    database.DB_NAME = os.path.join(db_dir, "subscriptions.db")
+    database.init_db()
+
+    # Роутеры импортируются после подмены БД
+    from handlers.start import router as start_router
+    from handlers.search import router as search_router
+    from handlers.subscription import router as sub_router
+    from services.autocomplete import build_index
+
+    build_index()
+    api_runner = await start_server(port=FAKE_API_PORT, latency=api_latency)
+
+    session = FakeSession()
+    bot = Bot(token=os.environ["BOT_TOKEN"], session=session)
+    dp = Dispatcher(storage=MemoryStorage())
+    dp.include_router(start_router)
+    dp.include_router(search_router)
+    dp.include_router(sub_router)
+
+    latencies = defaultdict(list)
+    lag = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(_lag_monitor(lag, stop))
+
+    rss_before = _rss_kb()
+    started = time.perf_counter()
+
+    async def one(i: int):
+        if ramp:
+            await asyncio.sleep(ramp * i / users)
+        try:
+            await VirtualUser(1_000_000 + i, bot, dp, session, latencies).run()
+        except Exception as e:
+            latencies["ошибки сценария"].append(0.0)
+            print(f"user {i}: {e!r}")
+
+    await asyncio.gather(*(one(i) for i in range(users)))
+    elapsed = time.perf_counter() - started
+    rss_after = _rss_kb()
+    stop.set()
+    await monitor
+    await api_runner.cleanup()
+
+    print(f"\nПользователей: {users}, время: {elapsed:.1f} с, фейковый API: "
+          f"{api_runner.app['stats']['requests']} запросов")
+    print(f"{'шаг':<28}{'n':>6}{'p50 мс':>10}{'p95 мс':>10}{'p99 мс':>10}")
+    all_samples = []
+    for step, samples in latencies.items():
+        all_samples.extend(samples)
+        print(f"{step:<28}{len(samples):>6}{_percentile(samples, 0.5):>10.1f}"
+              f"{_percentile(samples, 0.95):>10.1f}{_percentile(samples, 0.99):>10.1f}")
+    print(f"{'ВСЕГО':<28}{len(all_samples):>6}{_percentile(all_samples, 0.5):>10.1f}"
+          f"{_percentile(all_samples, 0.95):>10.1f}{_percentile(all_samples, 0.99):>10.1f}")
+    if lag:
+        print(f"\nЗадержка event loop: p50 {statistics.median(lag):.1f} мс, "
+              f"p99 {_percentile(lag, 0.99):.1f} мс, max {max(lag):.1f} мс")
+    print(f"Память: RSS {rss_before} → {rss_after} КБ, "
+          f"~{(rss_after - rss_before) / max(1, users):.1f} КБ на пользователя")
+    print(f"Вызовы Bot API: {dict(session.calls)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--ramp", type=float, default=0.0, help="растянуть старт пользователей на N секунд")
+    parser.add_argument("--api-latency", type=float, default=0.05, help="задержка фейкового API, с")
+    args = parser.parse_args()
+    asyncio.run(run(args.users, args.ramp, args.api_latency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+# tools/log_bench.py
+"""
+Сколько времени цикла планировщика уходит на логирование: прежняя схема
+(DEBUG у планировщика, f-строки, запись в файл в вызывающем потоке) против
+LOG_MODE=structured. Факторы включаются по одному, чтобы был виден вклад
+каждого: уровень INFO, ленивые аргументы, сэмплирование, запись в отдельном
+потоке. Воспроизводит записи лога одной проверки подписки: запросы к API
+по окну дат, разбор ответа, оценку цены.
+
+Запуск из корня проекта: python -m tools.log_bench --subs 2000 --requests 8
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+from typing import Optional
+
+from services.log_setup import LOG_FORMAT, SampleFilter, sampled, setup_logging
+
+TOKEN = "0123456789abcdef0123456789abcdef"
+OFFER = {
+    "origin": "MOW", "destination": "LED", "price": 4321, "airline": "SU", "flight_number": "1234",
+    "departure_at": "2026-12-01T10:00:00+03:00", "transfers": 0, "duration": 95,
+    "link": "/search/MOW0112LED1?t=SU17649000001764905700000095MOWLED_0f3a2b1c_4321",
+}
+
+
+def _reset_logging(level: int) -> None:
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.setLevel(level)
+
+
+def legacy_cycle(log: logging.Logger, subs: int, requests: int) -> None:
+    """Записи лога в том виде, как их писали планировщик и _fetch до LOG_MODE."""
+    for sub_id in range(subs):
+        log.info(f"🔎 Обработка подписки #{sub_id}: MOW -> LED")
+        log.debug(f"Sub #{sub_id} params: depart_date=2026-12-01, return_date=None, passengers=1, "
+                  f"stored_threshold=5000, threshold_flag=1")
+        for day in range(requests):
+            url = f"https://api.travelpayouts.com/aviasales/v3/prices_for_dates?origin=MOW&destination=LED" \
+                  f"&departure_at=2026-12-0{day % 9 + 1}&token={TOKEN}"
+            log.info(f"🔍 Запрос: MOW->LED на 2026-12-0{day % 9 + 1} | URL: {url}")
+            log.info("📥 Ответ API: получено рейсов: 5")
+            log.debug(f"📋 Пример данных первого рейса: {OFFER}")
+        offers = [OFFER] * 5
+        log.info(f"📊 Sub #{sub_id}: Получено {len(offers)} билетов в одну сторону от API")
+        log.debug(f"Sub #{sub_id} best_offer_meta preview: {str(OFFER)[:800]}")
+        log.info(f"Sub #{sub_id}: Found price: 4321")
+        log.debug(f"Sub #{sub_id}: интервал проверки маршрута 600с")
+        log.info(f"💰 Sub #{sub_id}: Лучшая цена 4321 RUB (Ваш порог: 5000)")
+        log.info("⏭️ Цена 4321 выше порога 5000, уведомление не нужно.")
+
+
+def structured_cycle(log: logging.Logger, subs: int, requests: int) -> None:
+    """Те же записи в нынешнем виде (ленивые аргументы, sampled)."""
+    for sub_id in range(subs):
+        log.info("🔎 Обработка подписки #%s: %s -> %s", sub_id, "MOW", "LED",
+                 extra=sampled(sub=sub_id, route="MOW-LED"))
+        log.debug("Sub #%s params: depart_date=%s, return_date=%s, passengers=%s, stored_threshold=%s, "
+                  "threshold_flag=%s", sub_id, "2026-12-01", None, 1, 5000, 1)
+        for day in range(requests):
+            departure_at = f"2026-12-0{day % 9 + 1}"
+            log.info("🔍 Запрос: %s->%s на %s | HTTP %d", "MOW", "LED", departure_at, 200,
+                     extra=sampled(route="MOW-LED", departure_at=departure_at, status=200, attempt=0))
+            log.info("📥 Ответ API: получено рейсов: %d", 5,
+                     extra=sampled(route="MOW-LED", departure_at=departure_at, offers=5))
+            log.debug("📋 Пример данных первого рейса: %s", OFFER)
+        log.info("📊 Sub #%s: Получено %d %s от API", sub_id, 5, "билетов в одну сторону",
+                 extra=sampled(sub=sub_id, offers=5))
+        log.debug("Sub #%s best_offer_meta preview: %.800s", sub_id, OFFER)
+        log.debug("Sub #%s: интервал проверки маршрута %dс", sub_id, 600)
+        log.info("💰 Sub #%s: Лучшая цена %s RUB (Ваш порог: %s)", sub_id, 4321, 5000,
+                 extra=sampled(sub=sub_id, price=4321, threshold=5000))
+        log.info("⏭️ Цена %s выше порога %s, уведомление не нужно.", 4321, 5000, extra=sampled(sub=sub_id))
+
+
+def _timed(fn, *args) -> float:
+    started = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - started
+
+
+def _file_handler(path: str, sample_rate: Optional[float] = None) -> logging.Handler:
+    """Запись в файл в вызывающем потоке (как LOG_MODE=text), при sample_rate — с сэмплированием."""
+    handler = logging.FileHandler(path, encoding="utf-8")
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    if sample_rate is not None:
+        handler.addFilter(SampleFilter(sample_rate))
+    return handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subs", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=8, help="запросов к API на подписку")
+    parser.add_argument("--sample-rate", type=float, default=0.01)
+    args = parser.parse_args()
+    workdir = tempfile.mkdtemp(prefix="log_bench_")
+    log = logging.getLogger("services.scheduler")
+
+    # Каждая строка добавляет к предыдущей ровно один фактор
+    steps = (
+        ("прежний (DEBUG)", legacy_cycle, logging.DEBUG, None),
+        ("уровень INFO", legacy_cycle, logging.INFO, None),
+        ("ленивые аргументы", structured_cycle, logging.INFO, None),
+        ("сэмплирование", structured_cycle, logging.INFO, args.sample_rate),
+        ("отдельный поток", structured_cycle, logging.INFO, "structured"),
+    )
+    results = []
+    for step, (name, cycle, level, sampling) in enumerate(steps):
+        path = os.path.join(workdir, f"step{step}.log")
+        _reset_logging(logging.INFO)
+        listener = None
+        if sampling == "structured":
+            # Полный LOG_MODE=structured: в поток планировщика попадает только постановка в очередь
+            listener = setup_logging("structured", "INFO", args.sample_rate, path, secrets=(TOKEN,))
+        else:
+            logging.getLogger().addHandler(_file_handler(path, sampling))
+        # Прежняя схема: basicConfig INFO + принудительный DEBUG у логгера планировщика
+        log.setLevel(level)
+        seconds = _timed(cycle, log, args.subs, args.requests)
+        log.setLevel(logging.NOTSET)
+        if listener is not None:
+            listener.stop()
+        _reset_logging(logging.INFO)
+        results.append((name, seconds, path))
+
+    print(f"Подписок: {args.subs}, запросов на подписку: {args.requests}, доля сэмплирования: {args.sample_rate}")
+    previous = None
+    for name, seconds, path in results:
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        gain = f"×{previous / seconds:.1f} к предыдущей" if previous else ""
+        print(f"{name:<20} {seconds * 1000:>9.1f} мс на цикл, "
+              f"{seconds / args.subs * 1e6:>7.1f} мкс на подписку, лог {size / 1024:>6.0f} КБ  {gain}")
+        previous = seconds
+    print(f"Итого: ×{results[0][1] / results[-1][1]:.1f}")
+
+
+if __name__ == "__main__":
+    main()
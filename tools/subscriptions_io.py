@@ -0,0 +1,185 @@
+# tools/subscriptions_io.py
+"""
+Массовый импорт/экспорт подписок в CSV и JSON Lines (перенос между
+инстансами, наполнение тестовых окружений).
+
+Запуск из корня проекта:
+  python -m tools.subscriptions_io export subs.csv
+  python -m tools.subscriptions_io export subs.jsonl --db other.db
+  python -m tools.subscriptions_io import subs.jsonl [--dry-run]
+
+Формат определяется по расширению файла (.csv / .jsonl), либо --format.
+Поля: user_id, origin, destination, depart_date, return_date, passengers,
+threshold, threshold_is_manual, flex_days, window_month. Экспорт читает
+таблицу курсором пачками, импорт пишет executemany пачками по --batch строк.
+Строки с ошибками (в т.ч. битый JSON) пропускаются и выводятся в отчёте.
+Повторный импорт безопасен: подписка, у которой совпадают все поля, кроме
+threshold и threshold_is_manual, с уже сохранённой (или с предыдущей
+строкой файла), не добавляется.
+"""
+import argparse
+import csv
+import json
+import sys
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+import database
+from config import DEFAULT_FLEX_DAYS
+from database import SUBSCRIPTION_FIELDS, normalize_subscription
+from services.iata import is_code_format
+
+FORMATS = ("csv", "jsonl")
+MAX_REPORTED_ERRORS = 20
+# Поля, по которым импортируемая подписка считается уже существующей
+DEDUPE_FIELDS = tuple(f for f in SUBSCRIPTION_FIELDS if f not in ("threshold", "threshold_is_manual"))
+
+
+def _detect_format(path: str, explicit: Optional[str] = None) -> str:
+    if explicit:
+        return explicit
+    for fmt in FORMATS:
+        if path.lower().endswith(f".{fmt}"):
+            return fmt
+    raise SystemExit(f"Не удалось определить формат файла {path}: укажите --format csv|jsonl")
+
+
+def _read_rows(f, fmt: str) -> Iterator[Tuple[int, object]]:
+    """
+    (номер строки файла, запись) — по одной, файл целиком в память не читается.
+    Для JSONL запись — ещё не разобранная строка (разбирает _as_dict).
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_num, line in enumerate(f, 1):
+        if line.strip():
+            yield line_num, line
+
+
+def _as_dict(raw) -> Dict:
+    row = json.loads(raw) if isinstance(raw, str) else raw
+    if not isinstance(row, dict):
+        raise ValueError("запись должна быть объектом JSON")
+    return row
+
+
+def _dedupe_key(values: tuple) -> tuple:
+    fields = dict(zip(SUBSCRIPTION_FIELDS, values))
+    return tuple(fields[f] for f in DEDUPE_FIELDS)
+
+
+def _empty(value) -> bool:
+    return value is None or str(value).strip() in ("", "None", "null")
+
+
+def validate_row(row: Dict) -> tuple:
+    """Строка файла → значения для INSERT с той же нормализацией, что в add_subscription."""
+    missing = [f for f in ("user_id", "origin", "destination", "depart_date") if _empty(row.get(f))]
+    if missing:
+        raise ValueError(f"нет обязательных полей: {', '.join(missing)}")
+    for field in ("origin", "destination"):
+        if not is_code_format(str(row[field])):
+            raise ValueError(f"{field}: ожидается код IATA из трёх букв, получено {row[field]!r}")
+    values = normalize_subscription(
+        user_id=int(row["user_id"]),
+        origin=str(row["origin"]).strip().upper(),
+        destination=str(row["destination"]).strip().upper(),
+        depart_date=str(row["depart_date"]).strip(),
+        return_date=None if _empty(row.get("return_date")) else str(row["return_date"]),
+        passengers=row.get("passengers") or 1,
+        threshold=None if _empty(row.get("threshold")) else float(row["threshold"]),
+        threshold_is_manual=1 if _empty(row.get("threshold_is_manual")) else int(float(row["threshold_is_manual"])),
+        flex_days=DEFAULT_FLEX_DAYS if _empty(row.get("flex_days")) else row["flex_days"],
+        window_month=None if _empty(row.get("window_month")) else str(row["window_month"]),
+    )
+    fields = dict(zip(SUBSCRIPTION_FIELDS, values))
+    # Даты в том виде, в каком их разбирает планировщик
+    datetime.strptime(fields["depart_date"], "%Y-%m-%d")
+    if fields["return_date"]:
+        datetime.strptime(fields["return_date"], "%Y-%m-%d")
+    if fields["window_month"]:
+        datetime.strptime(fields["window_month"], "%Y-%m")
+    return values
+
+
+def import_file(path: str, fmt: str, batch_size: int, dry_run: bool) -> None:
+    errors: List[str] = []
+    total = 0
+    duplicates = 0
+    seen: Set[tuple] = {_dedupe_key(tuple(row[f] for f in SUBSCRIPTION_FIELDS))
+                        for row in database.iter_subscriptions(batch_size)}
+
+    def valid_rows():
+        nonlocal total, duplicates
+        with open(path, newline="", encoding="utf-8") as f:
+            for line_num, raw in _read_rows(f, fmt):
+                total += 1
+                try:
+                    values = validate_row(_as_dict(raw))
+                except (ValueError, TypeError, KeyError) as e:
+                    errors.append(f"строка {line_num}: {e}")
+                    continue
+                key = _dedupe_key(values)
+                if key in seen:
+                    duplicates += 1
+                    continue
+                seen.add(key)
+                yield values
+
+    if dry_run:
+        accepted = sum(1 for _ in valid_rows())
+    else:
+        accepted = database.add_subscriptions_bulk(valid_rows(), batch_size)
+
+    for message in errors[:MAX_REPORTED_ERRORS]:
+        print(f"⚠️ {message}", file=sys.stderr)
+    if len(errors) > MAX_REPORTED_ERRORS:
+        print(f"⚠️ … и ещё {len(errors) - MAX_REPORTED_ERRORS} ошибок", file=sys.stderr)
+    action = "проверено" if dry_run else "импортировано"
+    print(f"Строк: {total}, {action}: {accepted}, уже есть: {duplicates}, пропущено с ошибками: {len(errors)}")
+
+
+def export_file(path: str, fmt: str, fetch_size: int) -> None:
+    out = sys.stdout if path == "-" else open(path, "w", newline="", encoding="utf-8")
+    count = 0
+    try:
+        if fmt == "csv":
+            writer = csv.writer(out)
+            writer.writerow(SUBSCRIPTION_FIELDS)
+            for row in database.iter_subscriptions(fetch_size):
+                writer.writerow(["" if row[f] is None else row[f] for f in SUBSCRIPTION_FIELDS])
+                count += 1
+        else:
+            for row in database.iter_subscriptions(fetch_size):
+                out.write(json.dumps(row, ensure_ascii=False) + "\n")
+                count += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"Экспортировано подписок: {count}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("import", "export"))
+    parser.add_argument("path", help="файл (для экспорта '-' — stdout)")
+    parser.add_argument("--format", choices=FORMATS)
+    parser.add_argument("--db", default=database.DB_NAME, help="файл БД подписок")
+    parser.add_argument("--batch", type=int, default=5000, help="строк на транзакцию / на чтение курсором")
+    parser.add_argument("--dry-run", action="store_true", help="только проверить файл импорта")
+    args = parser.parse_args()
+
+    database.DB_NAME = args.db
+    database.init_db()
+    if args.command == "import":
+        import_file(args.path, _detect_format(args.path, args.format), args.batch, args.dry_run)
+    else:
+        fmt = args.format or ("jsonl" if args.path == "-" else _detect_format(args.path))
+        export_file(args.path, fmt, args.batch)
+
+
+if __name__ == "__main__":
+    main()
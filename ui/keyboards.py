@@ -18,19 +18,57 @@ def start_inline_menu():
         ]
     )
 
-def navigation_menu():
+ANYWHERE_BUTTON = "🌍 Куда угодно"
+
+MONTHS_RU = [
+    "Январь", "Февраль", "Март", "Апрель", "Май", "Июнь",
+    "Июль", "Август", "Сентябрь", "Октябрь", "Ноябрь", "Декабрь",
+]
+
+def navigation_menu(anywhere=False):
     """
     Меню навигации (Reply) во время поиска.
     Появляется под строкой ввода текста.
+    anywhere=True — на шаге выбора направления добавляет кнопку «Куда угодно».
     """
+    keyboard = [
+        [KeyboardButton(text="⬅️ Назад"), KeyboardButton(text="🏠 В начало")]
+    ]
+    if anywhere:
+        keyboard.insert(0, [KeyboardButton(text=ANYWHERE_BUTTON)])
     return ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="⬅️ Назад"), KeyboardButton(text="🏠 В начало")]
-        ],
+        keyboard=keyboard,
         resize_keyboard=True,
         persistent=True
     )
 
+def anywhere_month_keyboard(today, months=6):
+    """Выбор месяца для поиска «куда угодно»: callback_data anywhere:<YYYY-MM>"""
+    buttons = []
+    year, month = today.year, today.month
+    row = []
+    for _ in range(months):
+        row.append(InlineKeyboardButton(
+            text=f"{MONTHS_RU[month - 1]} {year}",
+            callback_data=f"anywhere:{year:04d}-{month:02d}"
+        ))
+        if len(row) == 2:
+            buttons.append(row)
+            row = []
+        month += 1
+        if month > 12:
+            month, year = 1, year + 1
+    if row:
+        buttons.append(row)
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+def anywhere_results_keyboard(ranking):
+    """ranking: [(code, name, price)] -> кнопки выбора направления (anywhere_pick:<IATA>)"""
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=f"{name} — от {price} RUB", callback_data=f"anywhere_pick:{code}")]
+        for code, name, price in ranking
+    ])
+
 def trip_type_keyboard():
     return InlineKeyboardMarkup(
         inline_keyboard=[
@@ -41,9 +79,11 @@ def trip_type_keyboard():
         ]
     )
 
-def search_results_keyboard(origin, dest, depart, ret, passengers, current_price):
+def search_results_keyboard(origin, dest, depart, ret, passengers, current_price, view=None, session_id=None):
     """
-    Формат callback_data: sub:<price>:<origin>:<dest>:<departYYYYMMDD>:<retYYYYMMDD or 0>:<passengers>
+    Формат callback_data: sub:<price>:<origin>:<dest>:<departYYYYMMDD>:<retYYYYMMDD or 0>:<passengers>[:<session_id>]
+    view — состояние сессии результатов (sort, direct_only, page, pages): добавляет
+    кнопки сортировки, фильтра и листания (callback_data: sr:<действие>[:<аргумент>]:<session_id>).
     """
     d_val = depart
     d_str = str(d_val).replace("-", "") if d_val not in (None, "0") else "0"
@@ -64,16 +104,36 @@ def search_results_keyboard(origin, dest, depart, ret, passengers, current_price
 
     price_str = int(current_price) if (current_price is not None) else 0
     cb_data = f"sub:{price_str}:{origin}:{dest}:{d_str}:{r_str}:{pax_val}"
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [InlineKeyboardButton(text="🔔 Подписаться на цену", callback_data=cb_data)]
-        ]
-    )
+    sid = f":{session_id}" if session_id else ""
+    cb_data += sid
+    buttons = []
+    if view:
+        def mark(active, text):
+            return f"✅ {text}" if active else text
 
-def threshold_options_keyboard(current_price, origin, dest, depart, ret, passengers):
+        buttons.append([
+            InlineKeyboardButton(text=mark(view["sort"] == "price", "💰 Цена"), callback_data=f"sr:sort:price{sid}"),
+            InlineKeyboardButton(text=mark(view["sort"] == "time", "🕒 Время"), callback_data=f"sr:sort:time{sid}"),
+            InlineKeyboardButton(text=mark(view["sort"] == "airline", "🏢 Авиакомпания"), callback_data=f"sr:sort:airline{sid}"),
+        ])
+        buttons.append([
+            InlineKeyboardButton(text=mark(view["direct_only"], "✈️ Только прямые"), callback_data=f"sr:direct{sid}")
+        ])
+        if view["pages"] > 1:
+            page = view["page"]
+            buttons.append([
+                InlineKeyboardButton(text="⬅️", callback_data=f"sr:page:{page - 1}{sid}"),
+                InlineKeyboardButton(text=f"{page + 1}/{view['pages']}", callback_data="sr:noop"),
+                InlineKeyboardButton(text="➡️", callback_data=f"sr:page:{page + 1}{sid}"),
+            ])
+    buttons.append([InlineKeyboardButton(text="🔔 Подписаться на цену", callback_data=cb_data)])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+def threshold_options_keyboard(current_price, origin, dest, depart, ret, passengers, suggestions=()):
     """
     Всегда передаём даты в компактном формате YYYYMMDD или '0' для отсутствия return.
     Это унифицирует парсинг в handlers/subscription.py.
+    suggestions — [(подпись, цена)] из аналитики цен: по кнопке на каждую.
     """
     # нормализуем вход (depart/ret могут быть date/str/'0'/None)
     def compact(d):
@@ -94,6 +154,9 @@ def threshold_options_keyboard(current_price, origin, dest, depart, ret, passeng
     buttons = [
         [InlineKeyboardButton(text=f"Использовать текущую цену: {int(current_price)} RUB", callback_data=cb_use)]
     ]
+    for label, price in suggestions:
+        cb_pick = f"set_threshold_pick:{int(price)}:{origin}:{dest}:{d_comp}:{r_comp}:{int(passengers)}"
+        buttons.append([InlineKeyboardButton(text=f"{label}: {int(price)} RUB", callback_data=cb_pick)])
 
     # Если даты вылета нет (d_comp == "0") — не показываем кнопку "Ввести цену вручную"
     # вместо этого даём пользователю возможность повторить поиск / выбрать даты заново.
@@ -107,7 +170,12 @@ def threshold_options_keyboard(current_price, origin, dest, depart, ret, passeng
     kb = InlineKeyboardMarkup(inline_keyboard=buttons)
     return kb
 
-def subscriptions_keyboard(subscriptions):
+def subscriptions_keyboard(subscriptions, has_prev=False, has_next=False, digest=False):
+    """
+    Страница списка подписок. Навигация по ключу:
+    subs_page:prev:<id первой на странице> / subs_page:next:<id последней>.
+    digest — текущий режим уведомлений пользователя (кнопка-переключатель).
+    """
     buttons = []
     for sub in subscriptions:
         d_date = sub['depart_date']
@@ -125,7 +193,37 @@ def subscriptions_keyboard(subscriptions):
             InlineKeyboardButton(text=f"✏️ {text}", callback_data=f"edit_sub:{sub['id']}"),
             InlineKeyboardButton(text=f"❌", callback_data=f"del_sub:{sub['id']}")
         ])
-    
+
+    nav = []
+    if has_prev and subscriptions:
+        nav.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"subs_page:prev:{subscriptions[0]['id']}"))
+    if has_next and subscriptions:
+        nav.append(InlineKeyboardButton(text="Вперёд ➡️", callback_data=f"subs_page:next:{subscriptions[-1]['id']}"))
+    if nav:
+        buttons.append(nav)
+
+    mode = "дайджестом" if digest else "по одному"
+    buttons.append([InlineKeyboardButton(text=f"📬 Уведомления: {mode}", callback_data="toggle_digest")])
     buttons.append([InlineKeyboardButton(text="🔙 Закрыть список", callback_data="close_subs_list")])
     kb = InlineKeyboardMarkup(inline_keyboard=buttons)
-    return kb
\ No newline at end of file
+    return kb
+
+def location_suggestions_keyboard(locations, field, confirm_code=None):
+    """
+    Кнопки автодополнения города/аэропорта.
+    field: 'origin' | 'destination'; callback_data: ac:<field>:<IATA>
+    confirm_code — код не из справочника: последней кнопкой его можно подтвердить.
+    """
+    buttons = []
+    for loc in locations:
+        icon = "🏙" if loc.kind == "C" else "🛬"
+        buttons.append([InlineKeyboardButton(
+            text=f"{icon} {loc.name_ru} ({loc.code})",
+            callback_data=f"ac:{field}:{loc.code}"
+        )])
+    if confirm_code:
+        buttons.append([InlineKeyboardButton(
+            text=f"✅ Да, именно {confirm_code}",
+            callback_data=f"ac:{field}:{confirm_code}"
+        )])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)